@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""直接读取天凤 mjlog 压缩归档（.gz / .zip / .tar / .tar.gz），无需先解压到磁盘。"""
+import gzip
+import io
+import os
+import sys
+import tarfile
+import traceback
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from xml_parser import GameFilter, parse_tenhou_xml_to_mjai
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+# 单个牌谱文件可能带有的扩展名，按从长到短的顺序剥离
+MEMBER_SUFFIXES = (".mjlog.gz", ".xml.gz", ".mjlog", ".xml", ".gz")
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz")
+
+
+def log_id_from_name(name: str) -> str:
+    """从归档成员名中提取牌谱ID（去掉目录与扩展名）。"""
+    base = os.path.basename(name)
+    for suffix in MEMBER_SUFFIXES:
+        if base.endswith(suffix):
+            return base[:-len(suffix)]
+    return base
+
+
+def is_log_member(name: str) -> bool:
+    """判断归档成员是否为牌谱文件。"""
+    base = os.path.basename(name)
+    return bool(base) and base.endswith(MEMBER_SUFFIXES)
+
+
+def read_log_stream(stream: IO[bytes]) -> str:
+    """从（可能经过 gzip 压缩的）字节流中读取牌谱 XML 文本。"""
+    if not hasattr(stream, "peek"):
+        stream = io.BufferedReader(stream)
+    # 天凤的 .mjlog 实际就是 gzip 压缩的 XML，这里按魔数判断而不是按扩展名
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        with gzip.GzipFile(fileobj=stream) as gz:
+            return gz.read().decode("utf-8")
+    return stream.read().decode("utf-8")
+
+
+def _iter_members(path: str) -> Iterator[Tuple[str, Callable[[], IO[bytes]]]]:
+    """
+    按顺序产出归档中的牌谱成员 (成员名, 打开函数)。
+
+    tar 为流式读取，打开函数必须在取下一个成员之前调用。
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not is_log_member(info.filename):
+                    continue
+                yield info.filename, partial(zf.open, info)
+    elif path.endswith(TAR_SUFFIXES):
+        # "r|*" 为流式模式，不会对整个 tar 做随机访问
+        with tarfile.open(path, "r|*") as tf:
+            for info in tf:
+                if not info.isfile() or not is_log_member(info.name):
+                    continue
+                yield info.name, partial(tf.extractfile, info)
+    else:
+        yield path, partial(open, path, "rb")
+
+
+def iter_archive_logs(path: str) -> Iterator[Tuple[str, str]]:
+    """按顺序流式读取归档中的每个牌谱，产出 (log_id, xml_content)。"""
+    for name, open_member in _iter_members(path):
+        with open_member() as member:
+            yield log_id_from_name(name), read_log_stream(member)
+
+
+def iter_corpus(paths: Iterable[str]) -> Iterator[str]:
+    """展开目录，产出所有牌谱文件或归档路径。"""
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                for filename in sorted(filenames):
+                    if is_log_member(filename) or filename.endswith((".zip",) + TAR_SUFFIXES):
+                        yield os.path.join(dirpath, filename)
+        else:
+            yield path
+
+
+# --- 进程池工作函数（需为模块级函数以便 pickle） ---
+
+def _convert_zip_member(path: str, name: str,
+                        game_filter: Optional[GameFilter]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """在工作进程中直接打开 zip 并解析指定成员。"""
+    log_id = log_id_from_name(name)
+    with zipfile.ZipFile(path) as zf, zf.open(name) as member:
+        return log_id, parse_tenhou_xml_to_mjai(read_log_stream(member), log_id, game_filter)
+
+
+def _convert_member_bytes(name: str, data: bytes,
+                          game_filter: Optional[GameFilter]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """在工作进程中解压并解析一段成员字节。"""
+    log_id = log_id_from_name(name)
+    return log_id, parse_tenhou_xml_to_mjai(read_log_stream(io.BytesIO(data)), log_id, game_filter)
+
+
+def _iter_tar_member_bytes(path: str) -> Iterator[Tuple[str, bytes]]:
+    """流式遍历 tar 成员，产出 (成员名, 原始字节)。"""
+    with tarfile.open(path, "r|*") as tf:
+        for info in tf:
+            if not info.isfile() or not is_log_member(info.name):
+                continue
+            member = tf.extractfile(info)
+            if member is not None:
+                yield info.name, member.read()
+
+
+def convert_archive(path: str, max_workers: Optional[int] = None,
+                    max_pending: Optional[int] = None,
+                    game_filter: Optional[GameFilter] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    并行解析归档中的全部牌谱，按归档内顺序产出 (log_id, logs)。
+
+    zip 可随机访问，工作进程自行打开归档读取成员；tar 只能顺序读取，
+    由主进程逐个读出成员（仍为压缩态的单局字节）再交给工作进程解压解析。
+    同一时刻最多只有 max_pending 个成员在途，内存占用与归档大小无关。
+
+    Args:
+        path (str): 归档路径（.zip / .tar / .tar.gz / .tgz / .gz / .mjlog / .xml）。
+        max_workers (Optional[int]): 工作进程数，默认为 CPU 核数。
+        max_pending (Optional[int]): 在途任务上限，默认为工作进程数的两倍。
+        game_filter (Optional[GameFilter]): 头部过滤条件，不满足的牌谱不会出现在结果中。
+
+    Returns:
+        Iterator[Tuple[str, Dict[str, Any]]]: 牌谱ID与解析结果。
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            names = [info.filename for info in zf.infolist()
+                     if not info.is_dir() and is_log_member(info.filename)]
+        tasks = ((name, _convert_zip_member, (path, name, game_filter)) for name in names)
+    elif path.endswith(TAR_SUFFIXES):
+        tasks = ((name, _convert_member_bytes, (name, data, game_filter))
+                 for name, data in _iter_tar_member_bytes(path))
+    else:
+        for log_id, xml_content in iter_archive_logs(path):
+            logs = parse_tenhou_xml_to_mjai(xml_content, log_id, game_filter)
+            if logs is not None:
+                yield log_id, logs
+        return
+
+    workers = max_workers or os.cpu_count() or 1
+    limit = max_pending or workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: deque = deque()
+        for name, func, args in tasks:
+            pending.append((name, executor.submit(func, *args)))
+            if len(pending) >= limit:
+                result = collect_result(*pending.popleft())
+                if result is not None:
+                    yield result
+        while pending:
+            result = collect_result(*pending.popleft())
+            if result is not None:
+                yield result
+
+
+# 输入本身的问题：XML 损坏、编码或读取 / 解压错误，以及属性值异常（如 hai0="1,2,x"）
+INPUT_ERRORS = (ET.ParseError, UnicodeDecodeError, OSError, EOFError, ValueError)
+# 单个牌谱转换失败时视为跳过的异常。缺失的属性、越界的 m 等也会以 KeyError / IndexError / TypeError
+# 出现，但这几类同样可能是转换器自身的缺陷，report_failure 会为它们打印完整的调用栈
+CONVERT_ERRORS = INPUT_ERRORS + (KeyError, IndexError, TypeError)
+
+
+def report_failure(label: Any, error: BaseException) -> None:
+    """打印跳过某个牌谱的原因；不属于 INPUT_ERRORS 的异常附带调用栈，以免转换器缺陷被当作坏牌谱埋没。"""
+    print(f"解析失败 {label}: {type(error).__name__}: {error}", file=sys.stderr)
+    if not isinstance(error, INPUT_ERRORS):
+        traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
+
+
+def collect_result(label: Any, future, errors: Any = CONVERT_ERRORS) -> Optional[Tuple[Any, ...]]:
+    """
+    取回单个牌谱的转换结果，批量任务中的一个坏牌谱只会被跳过而不会中止整批。
+
+    Args:
+        label (Any): 出错时打印的牌谱标识（ID、归档成员名或偏移）。
+        future: 结果为 (键, 结果, ...) 的 Future。
+        errors (Any): 视为该牌谱失败的异常类型，默认为 CONVERT_ERRORS。
+
+    Returns:
+        Optional[Tuple[Any, ...]]: Future 的结果；转换失败或结果第二项为 None（被过滤）时返回 None。
+    """
+    try:
+        result = future.result()
+    except errors as e:
+        report_failure(label, e)
+        return None
+    return result if result[1] is not None else None
+
+
+def iter_corpus_results(paths: Iterable[str], func: Callable[[str, str], Any],
+                        errors: Any = CONVERT_ERRORS) -> Iterator[Tuple[str, Any]]:
+    """
+    对语料中的每个牌谱调用 func(log_id, xml_content)，依次产出 (log_id, 返回值)。
+
+    读取、解压或转换单个牌谱时出错只跳过该牌谱并打印原因；归档本身无法继续读取时
+    （如截断的 tar.gz）跳过该归档的剩余部分。
+
+    Args:
+        paths (Iterable[str]): 牌谱文件、归档或目录。
+        func (Callable[[str, str], Any]): 处理单个牌谱的函数。
+        errors (Any): 视为该牌谱失败的异常类型，默认为 CONVERT_ERRORS。
+
+    Returns:
+        Iterator[Tuple[str, Any]]: 处理成功的牌谱ID与 func 的返回值。
+    """
+    for path in iter_corpus(paths):
+        members = _iter_members(path)
+        while True:
+            try:
+                name, open_member = next(members)
+            except StopIteration:
+                break
+            except errors as e:
+                print(f"读取失败 {path}: {type(e).__name__}: {e}", file=sys.stderr)
+                break
+            log_id = log_id_from_name(name)
+            try:
+                with open_member() as member:
+                    result = func(log_id, read_log_stream(member))
+            except errors as e:
+                report_failure(log_id, e)
+                continue
+            yield log_id, result
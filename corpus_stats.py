@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""单遍流式的牌谱语料统计：和了率、放铳率、立直率、副露率、平均顺位与役种频率。"""
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import unquote
+
+from tenhou_merged import TenhouEvent
+from xml_parser import YAKU_MAP, EventSink, dispatch_events
+from archive_reader import iter_corpus, iter_corpus_results
+
+
+# 每名玩家的计数器布局（定长数组中的下标）
+GAMES = 0
+KYOKU = 1
+AGARI = 2
+TSUMO = 3
+DEAL_IN = 4
+RIICHI = 5
+CALL = 6
+PLACE_SUM = 7
+PLACE1 = 8  # PLACE1..PLACE1+3 依次为 1~4 位次数
+AGARI_POINTS = 12
+YAKU_BASE = 13
+YAKU_COUNT = max(YAKU_MAP) + 1
+COUNTER_SIZE = YAKU_BASE + YAKU_COUNT
+
+CALL_TYPES = ("chi", "pon", "daiminkan")
+
+
+def _new_counters() -> array:
+    return array('q', bytes(8 * COUNTER_SIZE))
+
+
+class CorpusStats(EventSink):
+    """
+    订阅 bridge 产出的 mjai 消息与 AGARI/RYUUKYOKU 属性，逐局累加到定长的玩家计数器。
+
+    不保留任何单局日志；多个进程的结果可以通过 merge 合并。
+    """
+
+    def __init__(self):
+        self.players: Dict[str, array] = {}
+        self.start_game()
+
+    def start_game(self, log_id: str = "") -> None:
+        """开始统计一个新牌谱，清空座位与单局状态。"""
+        self._seats: List[Optional[array]] = [None] * 4
+        self._called = [False] * 4
+        self._dealt_in = [False] * 4
+
+    def _counters(self, name: str) -> array:
+        counters = self.players.get(name)
+        if counters is None:
+            counters = self.players[name] = _new_counters()
+        return counters
+
+    # --- 事件订阅 ---
+
+    def feed(self, tenhou_event: TenhouEvent, mjai_messages: List[Dict[str, Any]]) -> None:
+        """处理一个天凤事件及其对应的 mjai 消息。"""
+        tag = tenhou_event["tag"]
+        if tag == "UN":
+            self._on_un(tenhou_event)
+        elif tag == "AGARI":
+            self._on_agari(tenhou_event)
+
+        for mjai_message in mjai_messages:
+            msg_type = mjai_message.get("type")
+            if msg_type == "start_kyoku":
+                self._called = [False] * 4
+                self._dealt_in = [False] * 4
+                for counters in self._seats:
+                    if counters is not None:
+                        counters[KYOKU] += 1
+            elif msg_type == "reach_accepted":
+                self._add(mjai_message["actor"], RIICHI)
+            elif msg_type in CALL_TYPES:
+                actor = mjai_message["actor"]
+                if not self._called[actor]:
+                    self._called[actor] = True
+                    self._add(actor, CALL)
+
+        if "owari" in tenhou_event:
+            self._on_owari(tenhou_event.floats("owari"))
+
+    def _add(self, seat: int, index: int, value: int = 1) -> None:
+        counters = self._seats[seat]
+        if counters is not None:
+            counters[index] += value
+
+    def _on_un(self, tenhou_event: TenhouEvent) -> None:
+        # 断线重连时 UN 会再次出现，只在第一次出现时登记
+        if any(counters is not None for counters in self._seats):
+            return
+        for i in range(4):
+            name = unquote(tenhou_event.get(f"n{i}", ""))
+            if name:
+                self._seats[i] = self._counters(name)
+                self._seats[i][GAMES] += 1
+
+    def _on_agari(self, tenhou_event: TenhouEvent) -> None:
+        who = tenhou_event.get_int("who")
+        from_who = tenhou_event.get_int("fromWho")
+        self._add(who, AGARI)
+        if who == from_who:
+            self._add(who, TSUMO)
+        elif not self._dealt_in[from_who]:
+            # 一炮多响只算一次放铳
+            self._dealt_in[from_who] = True
+            self._add(from_who, DEAL_IN)
+
+        ten = tenhou_event.ints("ten")
+        if ten:
+            self._add(who, AGARI_POINTS, ten[1])
+
+        values = tenhou_event.ints("yaku")
+        for i in range(0, len(values) - 1, 2):
+            yaku_id = values[i]
+            # 宝牌类役种以 0 飜出现时不计入
+            if 0 <= yaku_id < YAKU_COUNT and values[i + 1] > 0:
+                self._add(who, YAKU_BASE + yaku_id)
+        for yaku_id in tenhou_event.ints("yakuman"):
+            if 0 <= yaku_id < YAKU_COUNT:
+                self._add(who, YAKU_BASE + yaku_id)
+
+    def _on_owari(self, owari: Tuple[float, ...]) -> None:
+        points = owari[0::2]
+        seats = [i for i in range(len(points)) if self._seats[i] is not None]
+        # 同分时座次靠前者位次靠前
+        ranking = sorted(seats, key=lambda i: (-points[i], i))
+        for place, seat in enumerate(ranking):
+            self._add(seat, PLACE_SUM, place + 1)
+            self._add(seat, PLACE1 + place)
+        self.start_game()
+
+    # --- 汇总 ---
+
+    def merge(self, other: 'CorpusStats') -> None:
+        """把另一个统计对象（通常来自其他进程）的计数累加进来。"""
+        for name, counters in other.players.items():
+            mine = self._counters(name)
+            for i in range(COUNTER_SIZE):
+                mine[i] += counters[i]
+
+    def report(self, min_games: int = 1) -> Dict[str, Dict[str, Any]]:
+        """生成每名玩家的比率统计。"""
+        result = {}
+        for name, c in self.players.items():
+            if c[GAMES] < min_games:
+                continue
+            kyoku = c[KYOKU] or 1
+            placed = sum(c[PLACE1:PLACE1 + 4]) or 1
+            result[name] = {
+                "games": c[GAMES],
+                "kyoku": c[KYOKU],
+                "agari_rate": c[AGARI] / kyoku,
+                "tsumo_rate": c[TSUMO] / (c[AGARI] or 1),
+                "deal_in_rate": c[DEAL_IN] / kyoku,
+                "riichi_rate": c[RIICHI] / kyoku,
+                "call_rate": c[CALL] / kyoku,
+                "average_agari": c[AGARI_POINTS] / (c[AGARI] or 1),
+                "average_placement": c[PLACE_SUM] / placed,
+                "placements": list(c[PLACE1:PLACE1 + 4]),
+                "yaku": {YAKU_MAP[i]: c[YAKU_BASE + i]
+                         for i in range(YAKU_COUNT) if i in YAKU_MAP and c[YAKU_BASE + i]},
+            }
+        return result
+
+
+def collect_game_stats(xml_content: Union[str, bytes], stats: CorpusStats) -> None:
+    """对单个牌谱做一遍流式统计，不生成 tenhou.net/6 日志。"""
+    dispatch_events(xml_content, [stats])
+
+
+def _game_stats(log_id: str, xml_content: str) -> CorpusStats:
+    # 每个牌谱先统计到单独的对象，完整解析后才合并，中途失败的牌谱不会留下部分计数
+    stats = CorpusStats()
+    collect_game_stats(xml_content, stats)
+    return stats
+
+
+def _collect_files(paths: List[str]) -> CorpusStats:
+    """工作进程：统计一批文件（或归档），返回局部结果。"""
+    stats = CorpusStats()
+    for _, game in iter_corpus_results(paths, _game_stats):
+        stats.merge(game)
+    return stats
+
+
+def collect_corpus_stats(paths: Iterable[str], max_workers: Optional[int] = None,
+                         batch_size: int = 256) -> CorpusStats:
+    """
+    并行统计整个语料，每个工作进程只回传一份计数器。
+
+    Args:
+        paths (Iterable[str]): 牌谱文件、归档或目录。
+        max_workers (Optional[int]): 工作进程数，为 1 时在当前进程内运行。
+        batch_size (int): 每个任务处理的文件数。
+
+    Returns:
+        CorpusStats: 合并后的统计结果。
+    """
+    files = list(iter_corpus(paths))
+    batches = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+    total = CorpusStats()
+    if max_workers == 1:
+        for batch in batches:
+            total.merge(_collect_files(batch))
+        return total
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        for partial in executor.map(_collect_files, batches):
+            total.merge(partial)
+    return total
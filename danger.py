@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""四家手牌同步回放的放铳分析：为每一打标注听牌的对手、是否打中其待牌以及是否放铳。"""
+import argparse
+import time
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from archive_reader import iter_corpus_results
+from shanten import WaitTracker
+from tenhou_merged import decode_meld, to_34_array
+
+
+# 北抜き（三麻拔北）的副露编码
+NUKIDORA = 0x20
+
+
+class DiscardTag:
+    """
+    一次打牌的标注。除 seat / tile / tsumogiri 外均为以绝对座位为位的掩码（第 i 位对应座位 i）。
+
+    tenpai: 打牌时已听牌的对手；hits: 打出的牌在其待牌中的对手；
+    riichi: 已立直的对手；ron: 实际荣和这张牌的对手（一炮多响时可能有多位）。
+    hits 不含振听与无役的判断，因此 ron 总是 hits 的子集，反之不一定。
+    """
+    __slots__ = ('seat', 'tile', 'tsumogiri', 'tenpai', 'hits', 'riichi', 'ron')
+
+    def __init__(self, seat: int, tile: int, tsumogiri: bool, tenpai: int, hits: int, riichi: int):
+        self.seat = seat
+        self.tile = tile
+        self.tsumogiri = tsumogiri
+        self.tenpai = tenpai
+        self.hits = hits
+        self.riichi = riichi
+        self.ron = 0
+
+    def __repr__(self) -> str:
+        return (f"DiscardTag(seat={self.seat}, tile={self.tile}, tsumogiri={self.tsumogiri}, "
+                f"tenpai={self.tenpai:04b}, hits={self.hits:04b}, riichi={self.riichi:04b}, ron={self.ron:04b})")
+
+
+class DangerAnalyzer:
+    """
+    逐个读取牌谱 XML 元素，同时跟踪四家手牌（34 种牌的张数）。
+
+    每家的待牌由 WaitTracker 增量维护：只有该家手牌回到 3k+1 张且内容确实变化时才重算，
+    其他家打牌时直接查集合，不对每一打从头调用 isrh。
+    """
+
+    def __init__(self):
+        self.kyoku: List[List[DiscardTag]] = []
+        self.trackers: List[Optional[WaitTracker]] = [None] * 4
+        self.riichi = 0
+        self.last_draw: List[Optional[int]] = [None] * 4
+        self.last_discard: Optional[DiscardTag] = None
+        self.recomputed = 0
+
+    def feed(self, element: ET.Element) -> None:
+        """处理一个 XML 元素。"""
+        tag = element.tag
+        if tag[0] in "TUVW" and tag[1:].isdigit():
+            seat = ord(tag[0]) - ord('T')
+            tile = int(tag[1:])
+            self.last_draw[seat] = tile
+            if self.trackers[seat] is not None:
+                self.trackers[seat].add(tile // 4)
+        elif tag[0] in "DEFG" and tag[1:].isdigit():
+            self._on_discard(ord(tag[0]) - ord('D'), int(tag[1:]))
+        elif tag == "N":
+            self._on_meld(int(element.attrib["who"]), int(element.attrib["m"]))
+        elif tag == "INIT":
+            self._on_init(element.attrib)
+        elif tag == "REACH" and element.attrib.get("step") == "2":
+            self.riichi |= 1 << int(element.attrib["who"])
+        elif tag == "AGARI":
+            who = int(element.attrib["who"])
+            from_who = int(element.attrib["fromWho"])
+            # 抢杠时最后一个动作是加杠而不是打牌，last_discard 已被清空
+            if who != from_who and self.last_discard is not None and self.last_discard.seat == from_who:
+                self.last_discard.ron |= 1 << who
+
+    def _on_init(self, attrib: Dict[str, str]) -> None:
+        self.kyoku.append([])
+        self.riichi = 0
+        self.last_draw = [None] * 4
+        self.last_discard = None
+        for seat in range(4):
+            hai = attrib.get(f"hai{seat}", "")
+            # 三麻的空座位没有配牌
+            self.trackers[seat] = WaitTracker(to_34_array([int(s) for s in hai.split(',')])) if hai else None
+
+    def _on_discard(self, seat: int, tile: int) -> None:
+        tile34 = tile // 4
+        tenpai = hits = 0
+        for other, tracker in enumerate(self.trackers):
+            if other == seat or tracker is None or not tracker.waits:
+                continue
+            tenpai |= 1 << other
+            if tile34 in tracker.waits:
+                hits |= 1 << other
+        record = DiscardTag(seat, tile, tile == self.last_draw[seat], tenpai, hits, self.riichi & ~(1 << seat))
+        self.kyoku[-1].append(record)
+        self.last_discard = record
+        self.last_draw[seat] = None
+
+        tracker = self.trackers[seat]
+        if tracker is not None:
+            tracker.remove(tile34)
+            self.recomputed += tracker.settle()
+
+    def _on_meld(self, seat: int, m: int) -> None:
+        self.last_discard = None
+        tracker = self.trackers[seat]
+        if tracker is None:
+            return
+        if (m & 0x3F) == NUKIDORA:
+            tracker.remove((m >> 8) // 4)
+            self.recomputed += tracker.settle()
+            return
+        meld = decode_meld(m)
+        for index in meld.exposed:
+            tracker.remove(index // 4)
+        # 杠后手牌回到 3k+1 张（随后摸岭上牌）；吃碰后还要打一张，待牌到打牌时再更新
+        if meld.meld_type not in ("chi", "pon"):
+            self.recomputed += tracker.settle()
+
+
+def analyze_game(xml_content: Union[str, bytes]) -> List[List[DiscardTag]]:
+    """
+    分析一个牌谱。
+
+    Args:
+        xml_content (Union[str, bytes]): 牌谱 XML。
+
+    Returns:
+        List[List[DiscardTag]]: 每局按顺序的打牌标注。
+    """
+    analyzer = DangerAnalyzer()
+    for element in ET.fromstring(xml_content):
+        analyzer.feed(element)
+    return analyzer.kyoku
+
+
+# 统计项
+COUNTER_KEYS = ("games", "discards", "facing_tenpai", "facing_riichi", "hits", "hits_riichi", "deal_ins")
+
+
+def summarize(kyoku: Iterable[List[DiscardTag]], totals: Dict[str, int]) -> None:
+    """把一个牌谱的标注累加到计数字典。"""
+    totals["games"] += 1
+    for discards in kyoku:
+        for record in discards:
+            totals["discards"] += 1
+            if record.tenpai:
+                totals["facing_tenpai"] += 1
+            if record.riichi:
+                totals["facing_riichi"] += 1
+            if record.hits:
+                totals["hits"] += 1
+                if record.hits & record.riichi:
+                    totals["hits_riichi"] += 1
+            if record.ron:
+                totals["deal_ins"] += 1
+
+
+def analyze_corpus(paths: Iterable[str]) -> Dict[str, Any]:
+    """对语料中的每个牌谱做放铳分析，返回计数与耗时。"""
+    totals = dict.fromkeys(COUNTER_KEYS, 0)
+    start = time.perf_counter()
+    for _, kyoku in iter_corpus_results(paths, lambda log_id, xml_content: analyze_game(xml_content)):
+        summarize(kyoku, totals)
+    elapsed = time.perf_counter() - start
+    report: Dict[str, Any] = dict(totals)
+    report["seconds"] = elapsed
+    report["ms_per_game"] = elapsed * 1000 / max(totals["games"], 1)
+    return report
+
+
+def main() -> None:
+    """命令行入口。"""
+    parser = argparse.ArgumentParser(description="天凤牌谱放铳与危险牌分析")
+    parser.add_argument("paths", nargs="+", help="牌谱文件、归档或目录")
+    args = parser.parse_args()
+
+    report = analyze_corpus(args.paths)
+    discards = max(report["discards"], 1)
+    print(f"牌谱 {report['games']}，打牌 {report['discards']}，每局 {report['ms_per_game']:.1f}ms")
+    print(f"面对听牌者 {report['facing_tenpai'] / discards:.1%}，面对立直 {report['facing_riichi'] / discards:.1%}")
+    print(f"打中待牌 {report['hits']}（其中立直者 {report['hits_riichi']}），实际放铳 {report['deal_ins']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""可断点续传的批量牌谱下载任务。"""
+import argparse
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import requests
+
+from xml_parser import DOWNLOAD_BASE_URL, extract_log_id, get_headers
+
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+# 触发降速的状态码
+THROTTLE_STATUS = {429, 503}
+# 其余可重试的状态码（服务端临时错误）
+RETRY_STATUS = {500, 502, 504}
+
+
+def normalize_log_id(item: str) -> Optional[str]:
+    """接受牌谱URL或裸的牌谱ID，统一返回牌谱ID。"""
+    item = item.strip()
+    if not item:
+        return None
+    if "://" in item or item.startswith("?"):
+        return extract_log_id(item)
+    return item
+
+
+class DownloadJournal:
+    """只追加的进度日志，每行一条 JSON 记录，同一ID以最后一条为准。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        torn = self._load() if os.path.exists(path) else False
+        self._file = open(path, 'a', encoding='utf-8')
+        if torn:
+            # 先结束崩溃留下的半行，新记录不会与它拼在一起
+            self._file.write("\n")
+
+    def _load(self) -> bool:
+        """读入已有记录，返回文件末尾是否为没有换行的半行。"""
+        line = ""
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 崩溃时可能留下半行，忽略即可
+                    continue
+                self.entries[entry["id"]] = entry
+        return bool(line) and not line.endswith("\n")
+
+    def _append(self, log_id: str, state: str, attempts: int = 0, reason: str = "") -> None:
+        entry = {"id": log_id, "state": state, "attempts": attempts, "ts": round(time.time(), 3)}
+        if reason:
+            entry["reason"] = reason
+        self.entries[log_id] = entry
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record(self, log_id: str, state: str, attempts: int = 0, reason: str = "") -> None:
+        """追加一条状态记录并立即落盘。"""
+        self._append(log_id, state, attempts, reason)
+        self._sync()
+
+    def register(self, log_ids: Iterable[str]) -> int:
+        """
+        把日志中还没有的ID登记为 pending，全部写完后只落盘一次。
+
+        Returns:
+            int: 新登记的ID数。
+        """
+        added = 0
+        for log_id in log_ids:
+            if log_id not in self.entries:
+                self._append(log_id, PENDING)
+                added += 1
+        if added:
+            self._sync()
+        return added
+
+    def state(self, log_id: str) -> Optional[str]:
+        entry = self.entries.get(log_id)
+        return entry["state"] if entry else None
+
+    def attempts(self, log_id: str) -> int:
+        entry = self.entries.get(log_id)
+        return entry["attempts"] if entry else 0
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class TokenBucket:
+    """令牌桶限速器，收到 429/503 时按比例降速，成功后逐步恢复。可由多个线程共享。"""
+
+    def __init__(self, rate: float, capacity: float = 1.0, min_rate: float = 0.05,
+                 backoff: float = 0.5, recovery: float = 0.05):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.backoff = backoff
+        self.recovery = recovery
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> None:
+        """阻塞直到取得一个令牌。"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    self._refill()
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            # 在锁外等待，其他线程可以同时降速或恢复
+            time.sleep(wait)
+
+    def slow_down(self, retry_after: Optional[float] = None) -> None:
+        """乘性降速，并在服务端给出 Retry-After 时暂停相应时长。"""
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * self.backoff)
+            self.tokens = 0.0
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def speed_up(self) -> None:
+        """加性恢复，最多回到初始速率。"""
+        with self._lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.recovery)
+
+
+def retry_after(response: requests.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _save_atomic(path: str, data: bytes) -> None:
+    """先写临时文件再改名，崩溃时不会留下半个牌谱。"""
+    tmp_path = path + ".part"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def run_download_job(items: Optional[Iterable[str]], journal_path: str, out_dir: str,
+                     rate: float = 1.0, burst: float = 1.0, max_attempts: int = 5,
+                     base_url: str = DOWNLOAD_BASE_URL, timeout: float = 10,
+                     session: Optional[requests.Session] = None) -> Dict[str, int]:
+    """
+    批量下载牌谱 XML，进度写入只追加的日志，重启后从中断处继续。
+
+    Args:
+        items (Optional[Iterable[str]]): 牌谱URL或ID；为 None 时只续跑日志中未完成的ID。
+        journal_path (str): 进度日志路径。
+        out_dir (str): XML 保存目录，文件名为 `<log_id>.xml`。
+        rate (float): 每秒请求数上限。
+        burst (float): 令牌桶容量。
+        max_attempts (int): 单个ID的最大尝试次数（跨重启累计，429/503 限流不计入）。
+        base_url (str): 下载地址，可指向本地测试服务器。
+        timeout (float): 单次请求超时秒数。
+        session (Optional[requests.Session]): 复用的 HTTP 会话。
+
+    Returns:
+        Dict[str, int]: 本次运行后 done / failed / skipped 的数量。
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    journal = DownloadJournal(journal_path)
+    bucket = TokenBucket(rate, burst)
+    session = session or requests.Session()
+    summary = {DONE: 0, FAILED: 0, "skipped": 0}
+
+    try:
+        # 新ID先登记为 pending，日志本身即为完整的任务清单
+        if items is not None:
+            journal.register(log_id for log_id in map(normalize_log_id, items) if log_id)
+
+        queue: List[str] = []
+        for log_id, entry in journal.entries.items():
+            if entry["state"] == DONE or entry["attempts"] >= max_attempts:
+                summary["skipped"] += 1
+            else:
+                queue.append(log_id)
+
+        for log_id in queue:
+            attempts = journal.attempts(log_id)
+            referer = f"http://tenhou.net/0/?log={log_id}"
+            while True:
+                bucket.acquire()
+                reason = ""
+                retry = False
+                try:
+                    response = session.get(f"{base_url}?{log_id}", headers=get_headers(referer),
+                                           timeout=timeout)
+                except requests.RequestException as e:
+                    reason = f"{type(e).__name__}: {e}"
+                    retry = True
+                else:
+                    if response.status_code in THROTTLE_STATUS:
+                        # 限流只降低速率后重试，不计入尝试次数，也不改变日志中的状态
+                        bucket.slow_down(retry_after(response))
+                        continue
+                    if response.status_code == 200 and response.content:
+                        _save_atomic(os.path.join(out_dir, f"{log_id}.xml"), response.content)
+                        journal.record(log_id, DONE, attempts + 1)
+                        bucket.speed_up()
+                        summary[DONE] += 1
+                        break
+                    reason = f"HTTP {response.status_code}"
+                    if response.status_code in RETRY_STATUS:
+                        retry = True
+                    elif response.status_code == 200:
+                        reason = "空响应"
+                        retry = True
+
+                attempts += 1
+                if not retry:
+                    # 404 等永久错误不再重试，直接记满次数
+                    attempts = max(attempts, max_attempts)
+                journal.record(log_id, FAILED, attempts, reason)
+                if attempts >= max_attempts:
+                    print(f"下载失败 {log_id}: {reason}")
+                    summary[FAILED] += 1
+                    break
+    finally:
+        journal.close()
+    return summary
+
+
+def main() -> None:
+    """命令行入口。"""
+    parser = argparse.ArgumentParser(description="可断点续传的天凤牌谱批量下载")
+    parser.add_argument("journal", help="进度日志路径")
+    parser.add_argument("out_dir", help="XML 保存目录")
+    parser.add_argument("--ids", help="每行一个牌谱URL或ID的文件；省略时续跑日志中未完成的任务")
+    parser.add_argument("--rate", type=float, default=1.0, help="每秒请求数上限")
+    parser.add_argument("--burst", type=float, default=1.0, help="令牌桶容量")
+    parser.add_argument("--max-attempts", type=int, default=5, help="单个ID的最大尝试次数")
+    parser.add_argument("--base-url", default=DOWNLOAD_BASE_URL, help="下载地址")
+    args = parser.parse_args()
+
+    items = None
+    if args.ids:
+        with open(args.ids, encoding='utf-8') as f:
+            items = [line for line in f if line.strip()]
+    summary = run_download_job(items, args.journal, args.out_dir, rate=args.rate, burst=args.burst,
+                               max_attempts=args.max_attempts, base_url=args.base_url)
+    print(f"完成 {summary[DONE]}，失败 {summary[FAILED]}，跳过 {summary['skipped']}。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+参考实现与候选实现的差分等价校验工具。
+
+校验基准是改动前生成的 golden 输出：
+    python equivalence.py xml_parser 语料... --write-golden golden/   # 改写前运行一次
+    python equivalence.py xml_parser 语料... --golden golden/         # 每次改动后校验
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from xml_parser import parse_tenhou_xml_to_mjai
+from archive_reader import iter_archive_logs, iter_corpus
+
+
+Converter = Callable[[str, str], Dict[str, Any]]
+
+# 单局日志中各列的含义，用于输出可读的差异位置
+KYOKU_FIELDS: List[str] = [
+    "场次", "点数", "宝牌指示牌", "里宝牌指示牌",
+    "玩家0手牌", "玩家0摸牌", "玩家0打牌",
+    "玩家1手牌", "玩家1摸牌", "玩家1打牌",
+    "玩家2手牌", "玩家2摸牌", "玩家2打牌",
+    "玩家3手牌", "玩家3摸牌", "玩家3打牌",
+    "结果",
+]
+
+# 差异附近保留的上下文元素数
+CONTEXT = 2
+
+
+def _dumps(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def _same(a: Any, b: Any) -> bool:
+    """比较两个标量，区分 1 与 1.0、True 与 1 等序列化结果不同的值。"""
+    return type(a) is type(b) and a == b
+
+
+def _first_diff_path(expected: Any, actual: Any, path: Tuple[Any, ...] = ()) -> Optional[Tuple[Any, ...]]:
+    """深度优先查找第一个不同的位置，返回访问路径。"""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        for key in list(expected) + [k for k in actual if k not in expected]:
+            if key not in expected or key not in actual:
+                return path + (key,)
+            sub = _first_diff_path(expected[key], actual[key], path + (key,))
+            if sub is not None:
+                return sub
+        if list(expected) != list(actual):
+            return path
+        return None
+    if isinstance(expected, list) and isinstance(actual, list):
+        for i, (e, a) in enumerate(zip(expected, actual)):
+            sub = _first_diff_path(e, a, path + (i,))
+            if sub is not None:
+                return sub
+        if len(expected) != len(actual):
+            return path + (min(len(expected), len(actual)),)
+        return None
+    return None if _same(expected, actual) else path
+
+
+def _lookup(data: Any, path: Iterable[Any]) -> Any:
+    for key in path:
+        data = data[key]
+    return data
+
+
+def _window(container: Any, index: Any) -> Any:
+    """取差异位置附近的片段，越界时返回缺失标记。"""
+    if isinstance(container, list) and isinstance(index, int):
+        start = max(0, index - CONTEXT)
+        return {"from": start, "items": container[start:index + CONTEXT + 1]}
+    if isinstance(container, dict):
+        return container.get(index, "<missing>")
+    return container
+
+
+def first_difference(expected: Dict[str, Any], actual: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    找出两份 tenhou.net/6 牌谱中的第一个差异。
+
+    Args:
+        expected (Dict[str, Any]): 参考实现的输出。
+        actual (Dict[str, Any]): 候选实现的输出。
+
+    Returns:
+        Optional[Dict[str, Any]]: 无差异时为 None，否则包含小局序号、列名、
+            访问路径以及差异位置附近的最小片段。
+    """
+    if _dumps(expected) == _dumps(actual):
+        return None
+    path = _first_diff_path(expected, actual)
+    if path is None:
+        # 结构相同但序列化不同（如键顺序），整体报告
+        return {"kyoku": None, "field": None, "path": [], "expected": None, "actual": None}
+
+    diff: Dict[str, Any] = {"kyoku": None, "field": None, "path": list(path)}
+    if len(path) >= 2 and path[0] == "log":
+        diff["kyoku"] = path[1]
+        kyoku_log = expected["log"][path[1]] if path[1] < len(expected["log"]) else None
+        if kyoku_log is not None:
+            diff["seed"] = kyoku_log[0]
+        if len(path) >= 3 and isinstance(path[2], int) and path[2] < len(KYOKU_FIELDS):
+            diff["field"] = KYOKU_FIELDS[path[2]]
+    parent, last = path[:-1], path[-1] if path else None
+    try:
+        diff["expected"] = _window(_lookup(expected, parent), last) if path else None
+    except (KeyError, IndexError, TypeError):
+        diff["expected"] = "<missing>"
+    try:
+        diff["actual"] = _window(_lookup(actual, parent), last) if path else None
+    except (KeyError, IndexError, TypeError):
+        diff["actual"] = "<missing>"
+    return diff
+
+
+def _load_golden(golden_dir: str, log_id: str) -> Dict[str, Any]:
+    with open(os.path.join(golden_dir, f"{log_id}.json"), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_game(xml_content: str, log_id: str, candidate: Converter,
+                 reference: Optional[Converter] = None,
+                 golden_dir: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    对单个牌谱运行候选实现，与 golden 输出（或参考实现）比较，返回第一个差异（无差异时为 None）。
+
+    参考输出无法取得（golden 缺失、参考实现抛出异常）或候选实现抛出异常时，
+    返回带 "error" 的差异记录而不是中止整批校验。
+    """
+    if golden_dir is None and reference is None:
+        raise ValueError("需要 golden_dir 或 reference 之一")
+    try:
+        expected = _load_golden(golden_dir, log_id) if golden_dir else reference(xml_content, log_id)
+    except Exception as e:
+        return {"log_id": log_id, "kyoku": None, "field": None, "path": [],
+                "error": f"参考输出 {type(e).__name__}: {e}"}
+    try:
+        actual = candidate(xml_content, log_id)
+    except Exception as e:
+        return {"log_id": log_id, "kyoku": None, "field": None, "path": [],
+                "error": f"{type(e).__name__}: {e}"}
+    diff = first_difference(expected, actual)
+    if diff is not None:
+        diff["log_id"] = log_id
+    return diff
+
+
+def _iter_games(paths: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    for path in iter_corpus(paths):
+        yield from iter_archive_logs(path)
+
+
+def _map_games(func: Callable[..., Any], paths: Iterable[str], args: Tuple[Any, ...],
+               max_workers: Optional[int]) -> Iterator[Any]:
+    """
+    以牌谱为单位并行执行 func(xml_content, log_id, *args)，按语料顺序产出结果。
+
+    与 archive_reader.convert_archive 相同，任务按归档成员而不是按文件划分，
+    整个语料打包在一个大归档中时也能用满所有核；在途任务数有上限。
+    """
+    if max_workers == 1:
+        for log_id, xml_content in _iter_games(paths):
+            yield func(xml_content, log_id, *args)
+        return
+    limit = (max_workers or os.cpu_count() or 1) * 4
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending: deque = deque()
+        for log_id, xml_content in _iter_games(paths):
+            pending.append(executor.submit(func, xml_content, log_id, *args))
+            if len(pending) >= limit:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def run_equivalence(paths: Iterable[str], candidate: Converter,
+                    reference: Optional[Converter] = None,
+                    golden_dir: Optional[str] = None,
+                    max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    在语料上并行比较候选实现与 golden 输出（或参考实现）。
+
+    golden 输出由 write_golden 在改动前生成，是重写转换器时的校验基准；
+    reference 只适用于新旧实现并存的情形，两者都未指定时抛出 ValueError。
+    candidate 与 reference 需为模块级函数，以便传递给工作进程。
+
+    Args:
+        paths (Iterable[str]): 牌谱文件、归档或目录。
+        candidate (Converter): 候选实现，签名同 parse_tenhou_xml_to_mjai。
+        reference (Optional[Converter]): 参考实现。
+        golden_dir (Optional[str]): 预先生成的参考输出目录，优先于 reference。
+        max_workers (Optional[int]): 工作进程数，为 1 时在当前进程内运行。
+
+    Returns:
+        Dict[str, Any]: {"games": 牌谱数, "diffs": 每个不一致牌谱的第一个差异}。
+    """
+    if golden_dir is None and reference is None:
+        raise ValueError("需要 golden_dir 或 reference 之一")
+    games = 0
+    diffs: List[Dict[str, Any]] = []
+    for diff in _map_games(compare_game, paths, (candidate, reference, golden_dir), max_workers):
+        games += 1
+        if diff is not None:
+            diffs.append(diff)
+    return {"games": games, "diffs": diffs}
+
+
+def _snapshot_game(xml_content: str, log_id: str, converter: Converter, golden_dir: str) -> Optional[str]:
+    """工作进程：写出一个牌谱的 golden 输出，失败时返回原因。"""
+    try:
+        data = _dumps(converter(xml_content, log_id)).encode('utf-8')
+    except Exception as e:
+        return f"{log_id}: {type(e).__name__}: {e}"
+    path = os.path.join(golden_dir, f"{log_id}.json")
+    tmp_path = path + ".part"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return None
+
+
+def write_golden(paths: Iterable[str], golden_dir: str,
+                 converter: Converter = parse_tenhou_xml_to_mjai,
+                 max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    用当前（已确认正确的）转换器为语料生成 golden 输出 `<log_id>.json`。
+
+    应在改写转换器之前运行一次，之后的每次改动都用 run_equivalence(golden_dir=...) 校验。
+
+    Returns:
+        Dict[str, Any]: {"games": 写出的牌谱数, "errors": 转换失败的牌谱及原因}。
+    """
+    os.makedirs(golden_dir, exist_ok=True)
+    games = 0
+    errors: List[str] = []
+    for error in _map_games(_snapshot_game, paths, (converter, golden_dir), max_workers):
+        if error is None:
+            games += 1
+        else:
+            errors.append(error)
+    return {"games": games, "errors": errors}
+
+
+def resolve_converter(spec: str) -> Converter:
+    """把 `模块:函数` 形式的字符串解析为转换函数。"""
+    module_name, _, func_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), func_name or "parse_tenhou_xml_to_mjai")
+
+
+def main() -> None:
+    """命令行入口。"""
+    parser = argparse.ArgumentParser(
+        description="转换器差分等价校验",
+        epilog="改写转换器前先用 --write-golden 生成基准，之后每次改动用 --golden 校验。")
+    parser.add_argument("converter", help="被校验（或用于生成基准）的实现，格式为 模块[:函数]")
+    parser.add_argument("paths", nargs="+", help="牌谱文件、归档或目录")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--golden", metavar="目录", help="与该目录中的 golden 输出比较")
+    mode.add_argument("--write-golden", metavar="目录", help="用 converter 生成 golden 输出到该目录")
+    mode.add_argument("--reference", metavar="模块[:函数]", help="与另一个实现直接比较（新旧实现并存时）")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数，默认为 CPU 核数")
+    args = parser.parse_args()
+
+    converter = resolve_converter(args.converter)
+    if args.write_golden:
+        result = write_golden(args.paths, args.write_golden, converter, max_workers=args.workers)
+        for error in result["errors"]:
+            print(f"转换失败 {error}")
+        print(f"已写出 {result['games']} 个 golden 输出到 {args.write_golden}。")
+        sys.exit(1 if result["errors"] else 0)
+
+    reference = resolve_converter(args.reference) if args.reference else None
+    report = run_equivalence(args.paths, converter, reference, args.golden, max_workers=args.workers)
+    for diff in report["diffs"]:
+        print(_dumps(diff))
+    print(f"共校验 {report['games']} 个牌谱，{len(report['diffs'])} 个不一致。")
+    sys.exit(1 if report["diffs"] else 0)
+
+
+if __name__ == "__main__":
+    main()
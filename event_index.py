@@ -0,0 +1,503 @@
+# -*- coding: utf-8 -*-
+"""牌谱语料的倒排索引：按役种、和了类型与打点、流局类型、副露、立直巡目、玩家检索小局。"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from urllib.parse import unquote
+
+from archive_reader import iter_corpus, iter_corpus_results
+from tenhou_merged import TenhouEvent
+from xml_parser import EventSink, dispatch_events
+
+
+MAGIC = b"THIX"
+VERSION = 1
+# 文件头：魔数、版本、元数据长度
+_HEADER = struct.Struct("<4sBI")
+# 每个跳表块中的文档数
+BLOCK_SIZE = 128
+# 块内差值宽度（字节）到 array / memoryview 类型码
+WIDTH_CODES = {1: 'B', 2: 'H', 4: 'I'}
+
+# AGARI 的 ten 第三项（满贯种类）
+LIMIT_NAMES = {1: "mangan", 2: "haneman", 3: "baiman", 4: "sanbaiman", 5: "yakuman"}
+MELD_TYPES = ("chi", "pon", "daiminkan", "ankan", "kakan")
+# 没有 type 属性的流局为荒牌流局
+EXHAUSTIVE_DRAW = "exhaustive"
+
+Hit = Tuple[str, int]
+
+
+def seat_term(seat: int, term: str) -> str:
+    """限定到某个座位的词项，例如 "s2|riichi"。"""
+    return f"s{seat}|{term}"
+
+
+def date_terms(log_id: str) -> List[str]:
+    """从形如 2025120632gm-... 的牌谱ID中取出年份与年月词项。"""
+    if len(log_id) >= 8 and log_id[:8].isdigit():
+        return [f"year:{log_id[:4]}", f"month:{log_id[:6]}"]
+    return []
+
+
+# --- 建立索引 ---
+
+class EventIndexer(EventSink):
+    """
+    订阅 bridge 产出的事件，为每一局（全局递增的小局编号）记录词项。
+
+    与 CorpusStats 相同，只消费 (天凤事件, mjai 消息)，不依赖 tenhou.net/6 日志。
+    词项分两类：全局词项（"yaku:3"）与座位词项（"s0|riichi"），
+    后者用于“同一名玩家既立直又放铳”这类查询。
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, array] = {}
+        self.games: List[str] = []
+        # kyoku_starts[i] 为第 i 个牌谱的第一个小局编号，最后一项为小局总数
+        self.kyoku_starts = array('I', [0])
+        self.rounds = 0
+        self._game_terms: List[str] = []
+        self._seat_names: List[str] = []
+        self._discards = [0] * 4
+
+    def start_game(self, log_id: str = "") -> None:
+        """开始索引一个新牌谱。"""
+        self.games.append(log_id)
+        self.kyoku_starts.append(self.rounds)
+        self._game_terms = date_terms(log_id)
+        self._seat_names = []
+
+    def _add(self, term: str) -> None:
+        round_id = self.rounds - 1
+        if round_id < self.kyoku_starts[-2]:
+            # 第一局开始之前没有可归属的小局
+            return
+        postings = self.postings.get(term)
+        if postings is None:
+            postings = self.postings[term] = array('I')
+        # 同一局内同一词项只记一次，列表天然有序
+        if not postings or postings[-1] != round_id:
+            postings.append(round_id)
+
+    def _add_seat(self, seat: int, term: str) -> None:
+        self._add(term)
+        self._add(seat_term(seat, term))
+
+    def feed(self, tenhou_event: TenhouEvent, mjai_messages: List[Dict[str, Any]]) -> None:
+        """处理一个天凤事件及其对应的 mjai 消息。"""
+        tag = tenhou_event["tag"]
+        if tag == "UN" and not self._seat_names:
+            self._seat_names = [unquote(tenhou_event.get(f"n{i}", "")) for i in range(4)]
+        elif tag == "AGARI":
+            self._on_agari(tenhou_event)
+        elif tag == "RYUUKYOKU":
+            self._add("ryuukyoku")
+            self._add(f"ryuukyoku:{tenhou_event.get('type', EXHAUSTIVE_DRAW)}")
+
+        for mjai_message in mjai_messages:
+            msg_type = mjai_message.get("type")
+            if msg_type == "start_kyoku":
+                self._on_start_kyoku()
+            elif msg_type == "dahai":
+                self._discards[mjai_message["actor"]] += 1
+            elif msg_type == "reach":
+                actor = mjai_message["actor"]
+                self._add_seat(actor, "riichi")
+                # 立直宣言牌是该玩家的第几次打牌
+                self._add_seat(actor, f"riichi_turn:{self._discards[actor] + 1}")
+            elif msg_type in MELD_TYPES:
+                self._add_seat(mjai_message["actor"], f"meld:{msg_type}")
+
+    def _on_start_kyoku(self) -> None:
+        self.rounds += 1
+        self.kyoku_starts[-1] = self.rounds
+        self._discards = [0] * 4
+        for term in self._game_terms:
+            self._add(term)
+        for seat, name in enumerate(self._seat_names):
+            if name:
+                self._add_seat(seat, f"player:{name}")
+
+    def _on_agari(self, tenhou_event: TenhouEvent) -> None:
+        who = tenhou_event.get_int("who")
+        from_who = tenhou_event.get_int("fromWho")
+        self._add_seat(who, "agari")
+        if who == from_who:
+            self._add_seat(who, "agari:tsumo")
+        else:
+            self._add_seat(who, "agari:ron")
+            self._add_seat(from_who, "deal_in")
+
+        ten = tenhou_event.ints("ten")
+        if len(ten) >= 3 and ten[2] in LIMIT_NAMES:
+            self._add_seat(who, f"value:{LIMIT_NAMES[ten[2]]}")
+
+        han = 0
+        values = tenhou_event.ints("yaku")
+        for i in range(0, len(values) - 1, 2):
+            if values[i + 1] > 0:
+                han += values[i + 1]
+                self._add_seat(who, f"yaku:{values[i]}")
+        yakuman = tenhou_event.ints("yakuman")
+        if yakuman:
+            for yaku_id in yakuman:
+                self._add_seat(who, f"yaku:{yaku_id}")
+        elif han:
+            self._add_seat(who, f"han:{han}")
+
+    def merge(self, other: 'EventIndexer') -> None:
+        """把另一个索引器（通常来自其他进程）接在当前索引之后，小局编号整体平移。"""
+        base = self.rounds
+        self.games.extend(other.games)
+        # 当前的最后一项（小局总数）正好是对方第一个牌谱的起点
+        self.kyoku_starts.extend(base + start for start in other.kyoku_starts[1:])
+        self.rounds = base + other.rounds
+        for term, postings in other.postings.items():
+            mine = self.postings.get(term)
+            if mine is None:
+                mine = self.postings[term] = array('I')
+            mine.extend(round_id + base for round_id in postings)
+
+    def write(self, path: str) -> None:
+        """写出索引文件：元数据 JSON、小局起点表、牌谱ID表与压缩的倒排列表。"""
+        names = bytearray()
+        name_offsets = array('I', [0])
+        for log_id in self.games:
+            names += log_id.encode('utf-8')
+            name_offsets.append(len(names))
+        names += b'\0' * (-len(names) % 4)
+
+        blob = bytearray()
+        terms: Dict[str, List[int]] = {}
+        for term in sorted(self.postings):
+            postings = self.postings[term]
+            # 每个列表从 4 字节边界开始，跳表可直接 cast 为整数视图
+            blob += b'\0' * (-len(blob) % 4)
+            terms[term] = [len(blob), len(postings)]
+            encode_postings(blob, postings)
+
+        sections = [self.kyoku_starts.tobytes(), name_offsets.tobytes(), bytes(names), bytes(blob)]
+        meta = {"games": len(self.games), "rounds": self.rounds, "terms": terms,
+                "sections": [len(section) for section in sections]}
+        meta_bytes = json.dumps(meta, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        # 元数据后补齐到 4 字节，方便把整数表直接映射为 memoryview
+        meta_bytes += b' ' * (-(_HEADER.size + len(meta_bytes)) % 4)
+
+        tmp_path = path + ".part"
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(meta_bytes)))
+            f.write(meta_bytes)
+            for section in sections:
+                f.write(section)
+        os.replace(tmp_path, path)
+
+
+def _delta_width(largest: int) -> int:
+    if largest < 0x100:
+        return 1
+    if largest < 0x10000:
+        return 2
+    return 4
+
+
+def encode_postings(out: bytearray, postings: Sequence[int]) -> None:
+    """
+    把有序的小局编号写成分块的差分编码。
+
+    布局（起点由调用方对齐到 4 字节，本机字节序）：文档数、块数、各块首个编号、各块结束偏移，随后是各块内容。
+    块内是首个编号之后的差值，按块内最大差值选用 1/2/4 字节定宽存储（首字节为宽度），
+    解码时可以直接 cast 成整数视图再累加，跳表可以定位到单个块而不解码前面的块。
+    """
+    firsts = array('I')
+    ends = array('I')
+    data = bytearray()
+    for start in range(0, len(postings), BLOCK_SIZE):
+        chunk = postings[start:start + BLOCK_SIZE]
+        deltas = [b - a for a, b in zip(chunk, chunk[1:])]
+        width = _delta_width(max(deltas, default=0))
+        firsts.append(chunk[0])
+        data.append(width)
+        data += array(WIDTH_CODES[width], deltas).tobytes()
+        ends.append(len(data))
+    out += array('I', [len(postings), len(firsts)]).tobytes()
+    out += firsts.tobytes()
+    out += ends.tobytes()
+    out += data
+
+
+def _game_index(log_id: str, xml_content: Union[str, bytes]) -> EventIndexer:
+    game = EventIndexer()
+    dispatch_events(xml_content, [game], log_id)
+    return game
+
+
+def index_game(xml_content: Union[str, bytes], log_id: str, indexer: EventIndexer) -> None:
+    """
+    对单个牌谱做一遍流式索引。
+
+    先索引到单独的索引器，完整解析后才接到 indexer 之后；中途出错的牌谱
+    不会在 indexer 中留下牌谱ID或部分倒排项。
+    """
+    indexer.merge(_game_index(log_id, xml_content))
+
+
+def _index_files(paths: List[str]) -> EventIndexer:
+    """工作进程：索引一批文件（或归档），返回局部索引。"""
+    indexer = EventIndexer()
+    for _, game in iter_corpus_results(paths, _game_index):
+        indexer.merge(game)
+    return indexer
+
+
+def build_index(paths: Iterable[str], out_path: str, max_workers: Optional[int] = None,
+                batch_size: int = 256) -> EventIndexer:
+    """
+    并行索引整个语料并写出索引文件。
+
+    Args:
+        paths (Iterable[str]): 牌谱文件、归档或目录。
+        out_path (str): 索引文件路径。
+        max_workers (Optional[int]): 工作进程数，为 1 时在当前进程内运行。
+        batch_size (int): 每个任务处理的文件数。
+
+    Returns:
+        EventIndexer: 合并后的索引。
+    """
+    files = list(iter_corpus(paths))
+    batches = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+    total = EventIndexer()
+    if max_workers == 1:
+        for batch in batches:
+            total.merge(_index_files(batch))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            # map 保持批次顺序，小局编号与文件顺序一致
+            for partial in executor.map(_index_files, batches):
+                total.merge(partial)
+    total.write(out_path)
+    return total
+
+
+# --- 查询 ---
+
+class PostingList:
+    """映射在索引文件上的单个倒排列表，跳表零拷贝读取，块按需解码。"""
+
+    def __init__(self, buf: memoryview, offset: int):
+        self.buf = buf
+        self.count, block_count = buf[offset:offset + 8].cast('I')
+        pos = offset + 8
+        self.firsts = buf[pos:pos + 4 * block_count].cast('I')
+        pos += 4 * block_count
+        self.ends = buf[pos:pos + 4 * block_count].cast('I')
+        self.data = pos + 4 * block_count
+        self._cached_block = -1
+        self._cached: List[int] = []
+
+    def __len__(self) -> int:
+        return self.count
+
+    def block(self, index: int) -> List[int]:
+        """解码第 index 块，最近一次解码的块会被缓存。"""
+        if index != self._cached_block:
+            start = self.data + (self.ends[index - 1] if index else 0)
+            end = self.data + self.ends[index]
+            deltas = self.buf[start + 1:end].cast(WIDTH_CODES[self.buf[start]])
+            self._cached = list(accumulate(deltas, initial=self.firsts[index]))
+            self._cached_block = index
+        return self._cached
+
+    def decode(self) -> List[int]:
+        """解码整个列表。"""
+        values: List[int] = []
+        for index in range(len(self.firsts)):
+            values += self.block(index)
+        return values
+
+    def filter(self, candidates: List[int]) -> List[int]:
+        """保留有序候选中出现在本列表里的编号。"""
+        firsts = self.firsts
+        block_count = len(firsts)
+        result = []
+        members: Any = ()
+        # 下一块的首个编号；候选越过它时才需要重新定位
+        boundary = -1
+        for round_id in candidates:
+            if round_id >= boundary:
+                index = bisect_right(firsts, round_id) - 1
+                if index < 0:
+                    members = ()
+                    boundary = firsts[0] if block_count else sys.maxsize
+                    continue
+                members = set(self.block(index))
+                boundary = firsts[index + 1] if index + 1 < block_count else sys.maxsize
+            if round_id in members:
+                result.append(round_id)
+        return result
+
+
+def intersect(lists: List[PostingList], candidates: Optional[List[int]] = None) -> List[int]:
+    """
+    求多个倒排列表（以及可选的有序候选）的交集。
+
+    只完整解码最短的列表，其余列表按候选编号经跳表定位，每个块最多解码一次，
+    命中少时解码量与最短列表的长度成正比，而与语料规模无关。
+    """
+    lists = sorted(lists, key=len)
+    if candidates is None:
+        if not lists:
+            return []
+        candidates = lists[0].decode()
+        lists = lists[1:]
+    for other in lists:
+        if not candidates:
+            break
+        candidates = other.filter(candidates)
+    return candidates
+
+
+class EventIndex:
+    """只读打开索引文件，所有表都直接映射在文件上。"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._map)
+        magic, version, meta_length = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"不是受支持的索引文件: {path}")
+        pos = _HEADER.size
+        meta = json.loads(bytes(buf[pos:pos + meta_length]))
+        pos += meta_length
+        sections = []
+        for length in meta["sections"]:
+            sections.append(buf[pos:pos + length])
+            pos += length
+        self.game_count: int = meta["games"]
+        self.round_count: int = meta["rounds"]
+        self.terms: Dict[str, List[int]] = meta["terms"]
+        self.kyoku_starts = sections[0].cast('I')
+        self._name_offsets = sections[1].cast('I')
+        self._names = sections[2]
+        self._postings = sections[3]
+
+    def close(self) -> None:
+        """释放所有视图后关闭映射；之后不应再使用由本索引得到的 PostingList。"""
+        for view in (self.kyoku_starts, self._name_offsets, self._names, self._postings):
+            view.release()
+        self._map.close()
+
+    def __enter__(self) -> 'EventIndex':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def game_id(self, game: int) -> str:
+        return bytes(self._names[self._name_offsets[game]:self._name_offsets[game + 1]]).decode('utf-8')
+
+    def locate(self, round_id: int) -> Hit:
+        """小局编号 → (牌谱ID, 该牌谱中的小局序号)。"""
+        game = bisect_right(self.kyoku_starts, round_id) - 1
+        return self.game_id(game), round_id - self.kyoku_starts[game]
+
+    def postings(self, term: str) -> Optional[PostingList]:
+        entry = self.terms.get(term)
+        return PostingList(self._postings, entry[0]) if entry else None
+
+    def term_list(self, prefix: str = "") -> Dict[str, int]:
+        """列出词项及其文档数，可按前缀过滤。"""
+        return {term: entry[1] for term, entry in self.terms.items() if term.startswith(prefix)}
+
+    def match(self, terms: Sequence[str] = (), seat_terms: Sequence[str] = ()) -> List[int]:
+        """
+        返回满足条件的小局编号。
+
+        Args:
+            terms (Sequence[str]): 全局词项，全部满足。
+            seat_terms (Sequence[str]): 需要由同一座位同时满足的词项，例如 ("riichi", "deal_in")。
+
+        Returns:
+            List[int]: 升序的小局编号。
+        """
+        if not seat_terms:
+            return self._match_all(terms)
+        # 全局词项只求一次交集；每个座位从全局结果与座位词项中较短的一方出发
+        base = self._match_all(terms) if terms else None
+        base_set = set(base) if base is not None else None
+        hits = set()
+        for seat in range(4):
+            lists = [self.postings(seat_term(seat, term)) for term in seat_terms]
+            if None in lists:
+                continue
+            if base is not None and len(base) <= min(len(postings) for postings in lists):
+                hits.update(intersect(lists, base))
+            else:
+                seat_hits = intersect(lists)
+                hits.update(seat_hits if base_set is None else base_set.intersection(seat_hits))
+        return sorted(hits)
+
+    def _match_all(self, terms: Sequence[str], candidates: Optional[List[int]] = None) -> List[int]:
+        lists = []
+        for term in terms:
+            postings = self.postings(term)
+            if postings is None:
+                return []
+            lists.append(postings)
+        if not lists and candidates is None:
+            return list(range(self.round_count))
+        return intersect(lists, candidates)
+
+    def search(self, terms: Sequence[str] = (), seat_terms: Sequence[str] = (),
+               limit: Optional[int] = None) -> List[Hit]:
+        """与 match 相同的条件，返回 (牌谱ID, 小局序号)，不打开任何牌谱。"""
+        round_ids = self.match(terms, seat_terms)
+        if limit is not None:
+            round_ids = round_ids[:limit]
+        return [self.locate(round_id) for round_id in round_ids]
+
+
+def main() -> None:
+    """命令行入口：build 建立索引，query 检索。"""
+    parser = argparse.ArgumentParser(description="牌谱事件倒排索引")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="索引牌谱文件、归档或目录")
+    build.add_argument("index", help="索引文件路径")
+    build.add_argument("paths", nargs="+", help="牌谱文件、归档或目录")
+    build.add_argument("--workers", type=int, default=None, help="工作进程数")
+    query = commands.add_parser("query", help="检索小局")
+    query.add_argument("index", help="索引文件路径")
+    query.add_argument("terms", nargs="*", help="全局词项，例如 yaku:3 year:2025")
+    query.add_argument("--seat", action="append", default=[], help="需同一座位满足的词项，可重复")
+    query.add_argument("--limit", type=int, default=20, help="最多输出的命中数")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        indexer = build_index(args.paths, args.index, max_workers=args.workers)
+        print(f"牌谱 {len(indexer.games)}，小局 {indexer.rounds}，词项 {len(indexer.postings)}，"
+              f"耗时 {time.perf_counter() - start:.2f}s")
+        return
+
+    with EventIndex(args.index) as index:
+        start = time.perf_counter()
+        round_ids = index.match(args.terms, args.seat)
+        elapsed = (time.perf_counter() - start) * 1e3
+        for round_id in round_ids[:args.limit]:
+            log_id, kyoku = index.locate(round_id)
+            print(f"{log_id}\t{kyoku}")
+        print(f"命中 {len(round_ids)}，查询 {elapsed:.2f}ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
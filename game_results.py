@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""只取对局结果的快速模式：跳过摸打与副露事件，输出供段位 / 排行统计使用的精简记录。"""
+import argparse
+import json
+import sys
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from archive_reader import iter_corpus_results
+from tenhou_merged import TenhouEvent
+from xml_parser import GameFilter, TenhouSink, dispatch_elements, kyoku_header, match_header
+
+
+# 结果模式只分发这些元素；T/U/V/W、D/E/F/G、N 以及 REACH、DORA 等都不会进入 bridge
+RESULT_TAGS = frozenset({"GO", "UN", "TAIKYOKU", "INIT", "AGARI", "RYUUKYOKU"})
+
+
+class ResultSink(TenhouSink):
+    """
+    复用 TenhouSink 的头部、局首与和了 / 流局处理，只保留结果相关的字段。
+
+    每局记录为 [[场次, 本场, 供托], [局首点数], 和了信息]，与完整转换结果中
+    log[i][0]、log[i][1]、log[i][16] 相同；"sc" 与完整转换结果的 "sc" 相同。
+    """
+
+    def feed(self, tenhou_event: TenhouEvent, mjai_messages: List[Dict[str, Any]]) -> None:
+        self._feed_event(tenhou_event)
+        for mjai_message in mjai_messages:
+            msg_type = mjai_message.get("type") if mjai_message else None
+            if msg_type == "start_kyoku":
+                # 只需局首信息与和了信息两列，不解码配牌也不复制整条消息
+                self.tenhou_log = [[] for _ in range(17)]
+                self.tenhou_log[0] = kyoku_header(mjai_message)
+                self.tenhou_log[1] = list(mjai_message["scores"])
+            elif msg_type in self.END_TYPES and self.tenhou_log is not None:
+                self._close_kyoku()
+
+    def finish_game(self) -> Dict[str, Any]:
+        record = {key: value for key, value in self.logs.items() if key != "log"}
+        record["rounds"] = [[log_entry[0], log_entry[1], log_entry[16]] for log_entry in self.tenhou_logs]
+        return record
+
+
+def iter_result_elements(root: Iterable[ET.Element]) -> Iterator[ET.Element]:
+    """只产出结果模式需要的元素，其余元素不构造事件字典也不经过 bridge。"""
+    return (element for element in root if element.tag in RESULT_TAGS)
+
+
+def summarize_game(xml_content: Union[str, bytes], log_id: str = "",
+                   game_filter: Optional[GameFilter] = None) -> Optional[Dict[str, Any]]:
+    """
+    解析一个牌谱的对局结果。
+
+    Args:
+        xml_content (Union[str, bytes]): 牌谱 XML。
+        log_id (str): 牌谱ID。
+        game_filter (Optional[GameFilter]): 头部过滤条件，不满足时返回 None。
+
+    Returns:
+        Optional[Dict[str, Any]]: 头部字段（name、dan、rate、rule、sc 等）与各局结果 "rounds"。
+    """
+    if game_filter is not None and not match_header(xml_content, game_filter):
+        return None
+    root = ET.fromstring(xml_content)
+    return dispatch_elements(iter_result_elements(root), [ResultSink()], log_id)[0]
+
+
+def iter_results(paths: Iterable[str], game_filter: Optional[GameFilter] = None) -> Iterator[Dict[str, Any]]:
+    """遍历语料中的每个牌谱，依次产出结果记录；读取或解析失败的牌谱会被跳过。"""
+    results = iter_corpus_results(paths, lambda log_id, xml_content: summarize_game(xml_content, log_id, game_filter))
+    for _, record in results:
+        if record is not None:
+            yield record
+
+
+def main() -> None:
+    """命令行入口：把语料的对局结果写成 JSON Lines。"""
+    parser = argparse.ArgumentParser(description="只提取天凤牌谱的对局结果（JSON Lines）")
+    parser.add_argument("paths", nargs="+", help="牌谱文件、归档或目录")
+    parser.add_argument("-o", "--output", help="输出文件，默认为标准输出")
+    args = parser.parse_args()
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for record in iter_results(args.paths):
+            out.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
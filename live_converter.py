@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""推送式增量转换器：逐个接收天凤事件，实时维护 tenhou.net/6 视图。"""
+import statistics
+import sys
+import time
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List, Optional, Tuple
+
+from tenhou_merged import TenhouBridge, TenhouEvent, decode_meld
+from xml_parser import (
+    MELD_COLUMNS, mahjong_to_number, header_updates,
+    _handle_start_kyoku, _handle_tsumo, _handle_reach, _handle_dora,
+    _handle_agari, _handle_ryuukyoku, _append_call,
+)
+
+
+# 各玩家在单局日志中的摸牌 / 打牌列
+DRAW_COLUMNS = (5, 8, 11, 14)
+DISCARD_COLUMNS = (6, 9, 12, 15)
+RESULT_COLUMN = 16
+
+# 消息类型到 (处理函数, 受影响的列) 的映射；列由 actor 决定
+MESSAGE_HANDLERS = {
+    "tsumo": (_handle_tsumo, (DRAW_COLUMNS,)),
+    "reach": (_handle_reach, (DISCARD_COLUMNS,)),
+}
+
+Delta = Tuple[Any, ...]
+
+
+class LiveConverter:
+    """
+    增量维护一场对局的 tenhou.net/6 数据，每个事件的处理为均摊 O(1)。
+
+    feed() 返回本次事件产生的增量：
+        ("header", 键, 值)            头部字段变化
+        ("kyoku", 局序号, 单局日志)    新的一局开始
+        ("set", 局序号, 列, 位置, 值)  单局某列的某个位置被追加（位置等于原长度）或改写
+        ("result", 局序号, 结果)       第 16 列（和了 / 流局信息）被替换
+    """
+
+    def __init__(self, log_id: str = ""):
+        self.header: Dict[str, Any] = {
+            "ver": 2.3,
+            "ref": log_id,
+            "ratingc": "PF4",
+            "title": ["", ""],
+            "name": None,
+            "rule": {
+                "disp": "",
+                "aka53": 1,
+                "aka52": 1,
+                "aka51": 1
+            },
+            "lobby": 0,
+            "dan": [],
+            "rate": [],
+            "sx": [],
+            "sc": [],
+        }
+        self.bridge = TenhouBridge()
+        self.kyoku_logs: List[List[Any]] = []
+        self.current: Optional[List[Any]] = None
+        self.events = 0
+        # 各玩家本局是否已立直，替代 _handle_dahai 中对整列的字符串扫描
+        self._riichi = [False] * 4
+
+    # --- 输入 ---
+
+    def feed_element(self, element: ET.Element) -> List[Delta]:
+        """接收一个 XML 元素。"""
+        return self.feed(element.tag, element.attrib)
+
+    def feed(self, tag: str, attributes: Dict[str, str]) -> List[Delta]:
+        """接收一个天凤事件，返回增量列表。"""
+        self.events += 1
+        tenhou_event = TenhouEvent({"tag": tag, **attributes})
+        deltas: List[Delta] = []
+
+        if tag == "INIT":
+            tenhou_event["hai"] = tenhou_event.get("hai0", "")
+        elif tag == "AGARI":
+            index, target = self._result_target()
+            _handle_agari(tenhou_event, self.current, self.kyoku_logs)
+            if target is not None:
+                deltas.append(("result", index, list(target[RESULT_COLUMN])))
+        elif tag == "RYUUKYOKU":
+            _handle_ryuukyoku(tenhou_event, self.current)
+            if self.current is not None:
+                deltas.append(("result", len(self.kyoku_logs), list(self.current[RESULT_COLUMN])))
+
+        # 头部字段与 TenhouSink 共用同一份更新逻辑
+        for key, value in header_updates(tenhou_event, self.header["rule"]):
+            self.header[key] = value
+            deltas.append(("header", key, value))
+
+        mjai_messages = self.bridge.parse_event(tenhou_event)
+        for mjai_message in mjai_messages or []:
+            if mjai_message:
+                self._apply(mjai_message, tenhou_event, deltas)
+        return deltas
+
+    def _result_target(self) -> Tuple[int, Optional[List[Any]]]:
+        """AGARI 写入的目标局：当前局，或一炮多响时的上一局；与 _handle_agari 的判断一致，没有目标时为 None。"""
+        if self.current is not None:
+            return len(self.kyoku_logs), self.current
+        if self.kyoku_logs and self.kyoku_logs[-1][RESULT_COLUMN] and self.kyoku_logs[-1][RESULT_COLUMN][0] == "和了":
+            return len(self.kyoku_logs) - 1, self.kyoku_logs[-1]
+        return -1, None
+
+    def _apply(self, mjai_message: Dict[str, Any], tenhou_event: TenhouEvent, deltas: List[Delta]) -> None:
+        msg_type = mjai_message["type"]
+        if msg_type == "start_kyoku":
+            self.current = _handle_start_kyoku(mjai_message, tenhou_event)
+            self._riichi = [False] * 4
+            deltas.append(("kyoku", len(self.kyoku_logs), [list(column) for column in self.current]))
+            return
+        log = self.current
+        if log is None:
+            return
+        index = len(self.kyoku_logs)
+        if msg_type in ("end_kyoku", "end_game", "ryukyoku"):
+            self.kyoku_logs.append(log)
+            self.current = None
+        elif msg_type == "dahai":
+            column = DISCARD_COLUMNS[mjai_message["actor"]]
+            self._track(deltas, index, log, column, self._dahai, mjai_message, log)
+        elif msg_type == "dora":
+            self._track(deltas, index, log, 2, _handle_dora, mjai_message, log)
+        elif msg_type in MELD_COLUMNS and tenhou_event["tag"] == "N":
+            # 与 TenhouSink 相同，副露字符串直接取自解码表
+            actor = mjai_message["actor"]
+            to_draw, to_discard = MELD_COLUMNS[msg_type]
+            columns = [DRAW_COLUMNS[actor]] * to_draw + [DISCARD_COLUMNS[actor]] * to_discard
+            call = decode_meld(tenhou_event.get_int("m")).call
+            self._track(deltas, index, log, columns, _append_call, mjai_message, call, log)
+        elif msg_type in MESSAGE_HANDLERS:
+            handler, column_sets = MESSAGE_HANDLERS[msg_type]
+            actor = mjai_message["actor"]
+            if msg_type == "reach":
+                self._riichi[actor] = True
+            columns = [column_set[actor] for column_set in column_sets]
+            self._track(deltas, index, log, columns, handler, mjai_message, log)
+
+    def _track(self, deltas: List[Delta], index: int, log: List[Any], columns: Any, handler, *args) -> None:
+        """调用处理函数，并只比较受影响列的末尾来生成增量。"""
+        if isinstance(columns, int):
+            columns = (columns,)
+        before = [(len(log[c]), log[c][-1] if log[c] else None) for c in columns]
+        handler(*args)
+        for c, (old_len, old_last) in zip(columns, before):
+            column = log[c]
+            if old_len and column[old_len - 1] != old_last:
+                deltas.append(("set", index, c, old_len - 1, column[old_len - 1]))
+            for pos in range(old_len, len(column)):
+                deltas.append(("set", index, c, pos, column[pos]))
+
+    def _dahai(self, mjai_message: Dict[str, Any], tenhou_log: List[Any]) -> None:
+        """与 _handle_dahai 等价，但用立直标志代替对整列的扫描。"""
+        actor = mjai_message["actor"]
+        discards = tenhou_log[DISCARD_COLUMNS[actor]]
+        draws = tenhou_log[DRAW_COLUMNS[actor]]
+        pai_num = mahjong_to_number[mjai_message["pai"]]
+        tsumogiri = mjai_message.get("tsumogiri", False)
+
+        # 如果摸牌记录的最后是鸣牌（字符串），则不是模切
+        if draws and isinstance(draws[-1], str):
+            tsumogiri = False
+
+        if discards and discards[-1] == 'r':
+            discards[-1] += '60' if tsumogiri else str(pai_num)
+        elif self._riichi[actor]:
+            discards.append(60)
+        else:
+            discards.append(60 if tsumogiri else pai_num)
+
+    # --- 输出 ---
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        返回当前完整视图（包含进行中的一局）。
+
+        已结束的局直接共享引用，只复制进行中的一局与可能被一炮多响追加的上一局结果，
+        开销与局数成正比而与事件数无关。
+        """
+        logs = dict(self.header)
+        logs["rule"] = dict(self.header["rule"])
+        kyoku_logs = list(self.kyoku_logs)
+        if kyoku_logs:
+            last = list(kyoku_logs[-1])
+            last[RESULT_COLUMN] = list(last[RESULT_COLUMN])
+            kyoku_logs[-1] = last
+        if self.current is not None:
+            kyoku_logs.append([list(column) for column in self.current])
+        logs["log"] = kyoku_logs
+        return logs
+
+    def result(self) -> Dict[str, Any]:
+        """返回与 parse_tenhou_xml_to_mjai 相同格式的结果（不含进行中的一局）。"""
+        logs = dict(self.header)
+        logs["log"] = self.kyoku_logs
+        return logs
+
+
+def convert_incrementally(xml_content: str, log_id: str = "") -> Dict[str, Any]:
+    """用增量转换器逐事件转换整个牌谱，结果与 parse_tenhou_xml_to_mjai 一致。"""
+    converter = LiveConverter(log_id)
+    for element in ET.fromstring(xml_content):
+        converter.feed_element(element)
+    return converter.result()
+
+
+def benchmark_latency(xml_contents: List[str]) -> Dict[str, float]:
+    """测量每个事件的 feed 延迟（微秒）。"""
+    samples: List[float] = []
+    timer = time.perf_counter
+    for xml_content in xml_contents:
+        converter = LiveConverter()
+        for element in ET.fromstring(xml_content):
+            start = timer()
+            converter.feed(element.tag, element.attrib)
+            samples.append((timer() - start) * 1e6)
+    samples.sort()
+    return {
+        "events": len(samples),
+        "mean_us": statistics.fmean(samples) if samples else 0.0,
+        "p50_us": samples[len(samples) // 2] if samples else 0.0,
+        "p99_us": samples[int(len(samples) * 0.99)] if samples else 0.0,
+        "max_us": samples[-1] if samples else 0.0,
+    }
+
+
+def main() -> None:
+    """命令行入口：python live_converter.py 牌谱XML文件..."""
+    xml_contents = []
+    for path in sys.argv[1:]:
+        with open(path, encoding='utf-8') as f:
+            xml_contents.append(f.read())
+    if not xml_contents:
+        print("用法: python live_converter.py 牌谱XML文件...")
+        return
+    result = benchmark_latency(xml_contents)
+    print(f"事件数 {result['events']}，平均 {result['mean_us']:.1f}us，"
+          f"P50 {result['p50_us']:.1f}us，P99 {result['p99_us']:.1f}us，最大 {result['max_us']:.1f}us")
+
+
+if __name__ == "__main__":
+    main()
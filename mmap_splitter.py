@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""基于 mmap 的多牌谱拼接大文件切分与并行解析。"""
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from archive_reader import collect_result
+from xml_parser import GameFilter, parse_tenhou_xml_to_mjai
+
+
+DOC_START = b"<mjloggm"
+DOC_END = b"</mjloggm>"
+
+# 工作进程内共享的文件映射，由进程池初始化函数打开
+_worker_map: Optional[mmap.mmap] = None
+
+
+def open_map(path: str) -> mmap.mmap:
+    """以只读方式映射整个文件。"""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def iter_document_slices(buf: Any, start: int = 0) -> Iterator[Tuple[int, int]]:
+    """
+    在字节层面扫描 `<mjloggm>` 文档边界，产出 (offset, length)。
+
+    不解码任何内容，只在映射上做 find，内存占用与文件大小无关。
+    缺少结束标签的残缺文档会被跳过。
+    """
+    pos = start
+    while True:
+        begin = buf.find(DOC_START, pos)
+        if begin < 0:
+            return
+        end = buf.find(DOC_END, begin)
+        if end < 0:
+            return
+        end += len(DOC_END)
+        yield begin, end - begin
+        pos = end
+
+
+def _init_worker(path: str) -> None:
+    global _worker_map
+    _worker_map = open_map(path)
+
+
+def _convert_slice(offset: int, length: int, log_id: str,
+                   game_filter: Optional[GameFilter]) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """工作进程：直接从共享映射中取出一局并解析。"""
+    return offset, parse_tenhou_xml_to_mjai(_worker_map[offset:offset + length], log_id, game_filter)
+
+
+def convert_concatenated(path: str, max_workers: Optional[int] = None,
+                         max_pending: Optional[int] = None,
+                         game_filter: Optional[GameFilter] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    并行解析由多个 `<mjloggm>` 文档拼接而成的文件，按文件内顺序产出 (offset, logs)。
+
+    主进程只负责扫描边界并分发 (offset, length)，各工作进程自行映射同一文件，
+    牌谱内容不经过进程间管道传递。
+
+    Args:
+        path (str): 文件路径。
+        max_workers (Optional[int]): 工作进程数，默认为 CPU 核数。
+        max_pending (Optional[int]): 在途任务上限，默认为工作进程数的四倍。
+        game_filter (Optional[GameFilter]): 头部过滤条件，不满足的牌谱不会出现在结果中。
+
+    Returns:
+        Iterator[Tuple[int, Dict[str, Any]]]: 文档在文件中的偏移与解析结果。
+    """
+    workers = max_workers or os.cpu_count() or 1
+    limit = max_pending or workers * 4
+    base = os.path.basename(path)
+    buf = open_map(path)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(path,)) as executor:
+            pending: deque = deque()
+            for offset, length in iter_document_slices(buf):
+                pending.append((f"偏移 {offset}", executor.submit(_convert_slice, offset, length,
+                                                                 f"{base}@{offset}", game_filter)))
+                if len(pending) >= limit:
+                    result = collect_result(*pending.popleft())
+                    if result is not None:
+                        yield result
+            while pending:
+                result = collect_result(*pending.popleft())
+                if result is not None:
+                    yield result
+    finally:
+        buf.close()
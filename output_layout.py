@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""输出目录布局：按牌谱ID散列或按日期分片，每个分片一个清单文件，另有根目录的已写入索引。"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Iterable, Iterator, List, Set, Tuple
+
+
+FLAT = "flat"
+HASH = "hash"
+DATE = "date"
+LAYOUTS = (FLAT, HASH, DATE)
+
+MANIFEST_NAME = "manifest.jsonl"
+INDEX_NAME = "index.txt"
+# 无法从ID中取得日期时使用的分片
+UNDATED_SHARD = "undated"
+
+# 牌谱ID以 YYYYMMDDHH 开头，例如 2025120632gm-00a9-0000-8f4679af
+_DATE_PREFIX = re.compile(r"(\d{4})(\d{2})(\d{2})\d{2}gm-")
+
+
+def _index_key(log_id: str) -> int:
+    # 索引只保存 64 位摘要，数百万个ID也只占用几十 MB
+    return int.from_bytes(hashlib.blake2b(log_id.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class OutputLayout:
+    """
+    牌谱输出目录的布局。
+
+    - flat: `<root>/<log_id>/`，与原先 main() 的输出相同；
+    - hash: `<root>/ab/cd/<log_id>/`，目录名取牌谱ID的 MD5 前缀，分布均匀；
+    - date: `<root>/2025/12/06/<log_id>/`，日期取自牌谱ID。
+
+    每个分片目录下有一个只追加的 manifest.jsonl，记录写入的牌谱与文件；
+    根目录的 index.txt 按行列出所有已写入的牌谱ID，启动时读入内存，
+    批量任务用 exists 判断是否跳过，不必逐个 stat 游戏目录。
+    写入顺序为 牌谱文件 → 清单 → 索引，中途崩溃时该牌谱只会被重写而不会被误跳过。
+    """
+
+    def __init__(self, root: str, layout: str = FLAT, hash_levels: int = 2, hash_width: int = 2,
+                 manifests: bool = True):
+        if layout not in LAYOUTS:
+            raise ValueError(f"未知的目录布局: {layout}")
+        # 未指定输出目录时以当前目录为根，rebuild_index 等不会对空路径建目录
+        self.root = root or "."
+        self.layout = layout
+        self.hash_levels = hash_levels
+        self.hash_width = hash_width
+        self.manifests = manifests
+        self._written: Set[int] = set()
+        # 本进程内已确认以换行结尾的清单与索引文件
+        self._terminated: Set[str] = set()
+        self._lock = threading.Lock()
+        if manifests:
+            self._load_index()
+
+    # --- 路径 ---
+
+    def shard(self, log_id: str) -> str:
+        """牌谱所在分片相对于根目录的路径，flat 布局为空字符串。"""
+        if self.layout == HASH:
+            digest = hashlib.md5(log_id.encode('utf-8')).hexdigest()
+            width = self.hash_width
+            return os.path.join(*(digest[i * width:(i + 1) * width] for i in range(self.hash_levels)))
+        if self.layout == DATE:
+            match = _DATE_PREFIX.match(log_id)
+            return os.path.join(*match.groups()) if match else UNDATED_SHARD
+        return ""
+
+    def game_dir(self, log_id: str) -> str:
+        """牌谱的输出目录。"""
+        return os.path.join(self.root, self.shard(log_id), log_id)
+
+    # --- 已写入索引 ---
+
+    def _load_index(self) -> None:
+        path = os.path.join(self.root, INDEX_NAME)
+        if not os.path.exists(path):
+            return
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                log_id = line.strip()
+                if log_id:
+                    self._written.add(_index_key(log_id))
+
+    def exists(self, log_id: str) -> bool:
+        """牌谱是否已完整写入（以索引为准）。"""
+        return _index_key(log_id) in self._written
+
+    def missing(self, log_ids: Iterable[str]) -> Iterator[str]:
+        """过滤掉已写入的牌谱ID。"""
+        return (log_id for log_id in log_ids if not self.exists(log_id))
+
+    def __len__(self) -> int:
+        return len(self._written)
+
+    # --- 写入 ---
+
+    def write_game(self, log_id: str, full: bytes, rounds: List[Tuple[str, bytes]]) -> str:
+        """
+        写出完整牌谱 `<log_id>.json` 与各小局 `<小局名>.json`，随后登记到清单与索引。
+
+        Args:
+            log_id (str): 牌谱ID。
+            full (bytes): 完整牌谱的 JSON 字节。
+            rounds (List[Tuple[str, bytes]]): (小局文件名（不含扩展名）, JSON 字节)。
+
+        Returns:
+            str: 牌谱的输出目录。
+        """
+        folder = self.game_dir(log_id)
+        os.makedirs(folder, exist_ok=True)
+        files = [(f"{log_id}.json", full)] + [(f"{filename}.json", data) for filename, data in rounds]
+        for filename, data in files:
+            with open(os.path.join(folder, filename), 'wb') as f:
+                f.write(data)
+        if self.manifests:
+            self._record(log_id, [filename for filename, _ in files], sum(len(data) for _, data in files))
+        return folder
+
+    def _record(self, log_id: str, files: List[str], size: int) -> None:
+        entry = {"id": log_id, "files": files, "bytes": size, "ts": round(time.time(), 3)}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        manifest_path = os.path.join(self.root, self.shard(log_id), MANIFEST_NAME)
+        with self._lock:
+            self._append_line(manifest_path, line)
+            self._append_line(os.path.join(self.root, INDEX_NAME), log_id + "\n")
+            self._written.add(_index_key(log_id))
+
+    def _append_line(self, path: str, line: str) -> None:
+        # 崩溃可能在文件末尾留下半行；每个文件第一次追加前先补上换行，新记录不会与半行拼在一起
+        prefix = ""
+        if path not in self._terminated:
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        prefix = "\n"
+            except OSError:
+                # 文件不存在或为空（空文件无法 seek 到 -1）
+                pass
+            self._terminated.add(path)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(prefix + line)
+
+    # --- 维护 ---
+
+    def iter_manifest_entries(self) -> Iterator[dict]:
+        """遍历所有分片清单中的记录（重复写入的牌谱会出现多次）。"""
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if MANIFEST_NAME in filenames:
+                with open(os.path.join(dirpath, MANIFEST_NAME), encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            yield json.loads(line)
+                        except json.JSONDecodeError:
+                            # 崩溃时可能留下半行
+                            continue
+            # 牌谱目录本身不会再包含分片
+            dirnames[:] = [d for d in dirnames if not os.path.exists(os.path.join(dirpath, d, f"{d}.json"))]
+
+    def rebuild_index(self) -> int:
+        """由分片清单重建根目录索引（索引丢失或损坏时使用），返回牌谱数。"""
+        log_ids = sorted({entry["id"] for entry in self.iter_manifest_entries()})
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, INDEX_NAME)
+        tmp_path = path + ".part"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(log_id + "\n" for log_id in log_ids)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._written = {_index_key(log_id) for log_id in log_ids}
+        return len(log_ids)
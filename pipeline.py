@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""下载 → 解析 → 写入 三段流水线，各段之间用有界队列连接。"""
+import argparse
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+from archive_reader import collect_result
+from download_job import THROTTLE_STATUS, TokenBucket, normalize_log_id, retry_after
+from output_layout import FLAT, LAYOUTS, OutputLayout
+from xml_parser import (
+    DOWNLOAD_BASE_URL, EncodedLogs, get_headers, parse_tenhou_xml_to_mjai, round_filename,
+)
+
+
+# 队列结束标记
+_DONE = object()
+
+# 转换结果：(牌谱ID, 工作进程内耗时, 完整牌谱字节, [(小局文件名, 字节)])
+Converted = Tuple[str, float, bytes, List[Tuple[str, bytes]]]
+
+
+class StageStats:
+    """单个阶段的计数与忙碌时间，多个线程共享。"""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.errors = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, busy: float, ok: bool = True) -> None:
+        with self._lock:
+            self.busy += busy
+            if ok:
+                self.items += 1
+            else:
+                self.errors += 1
+
+    def report(self, wall: float) -> Dict[str, Any]:
+        """利用率 = 忙碌时间 / (总耗时 × 并发数)，接近 1 的阶段即为瓶颈。"""
+        capacity = wall * self.workers
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "errors": self.errors,
+            "busy": round(self.busy, 3),
+            "utilization": round(self.busy / capacity, 3) if capacity else 0.0,
+        }
+
+
+def fetch_xml(log_id: str, session: requests.Session, base_url: str = DOWNLOAD_BASE_URL,
+              timeout: float = 10, cache_dir: Optional[str] = None,
+              bucket: Optional[TokenBucket] = None) -> Optional[bytes]:
+    """
+    取得单个牌谱的 XML 字节，优先读取缓存目录中的 `<log_id>.xml`。
+
+    下载成功且指定了缓存目录时，同时写入缓存，与 download_job 的输出目录兼容。
+    指定 bucket 时每次请求前先取令牌；收到 429/503 时降速并重试，不视为失败。
+    """
+    cache_path = os.path.join(cache_dir, f"{log_id}.xml") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            return f.read()
+
+    referer = f"http://tenhou.net/0/?log={log_id}"
+    while True:
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            response = session.get(f"{base_url}?{log_id}", headers=get_headers(referer), timeout=timeout)
+            if response.status_code in THROTTLE_STATUS and bucket is not None:
+                bucket.slow_down(retry_after(response))
+                continue
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"下载失败 {log_id}: {str(e)}")
+            return None
+        if bucket is not None:
+            bucket.speed_up()
+        break
+    if not response.content:
+        print(f"下载失败 {log_id}: 空响应")
+        return None
+
+    if cache_path:
+        tmp_path = cache_path + ".part"
+        with open(tmp_path, 'wb') as f:
+            f.write(response.content)
+        os.replace(tmp_path, cache_path)
+    return response.content
+
+
+def convert_to_files(log_id: str, xml_content: bytes) -> Converted:
+    """工作进程：解析并把完整牌谱与各小局序列化为字节，写入阶段只做 I/O。"""
+    start = time.perf_counter()
+    logs = parse_tenhou_xml_to_mjai(xml_content, log_id)
+    encoded = EncodedLogs(logs)
+    rounds = [(round_filename(log_entry), encoded.round(i)) for i, log_entry in enumerate(logs["log"])]
+    return log_id, time.perf_counter() - start, encoded.full(), rounds
+
+
+def write_files(layout: OutputLayout, converted: Converted) -> None:
+    """按输出布局写出 `<log_id>.json` 与各小局文件，并登记到分片清单。"""
+    log_id, _, full, rounds = converted
+    layout.write_game(log_id, full, rounds)
+
+
+class Pipeline:
+    """
+    三段流水线：
+
+        输入 ─▶ 下载线程 ×N ─▶ 转换进程 ×M ─▶ 写入线程 ×K
+
+    段与段之间是容量为 queue_size 的队列，下游变慢时上游会阻塞在 put 上（背压），
+    内存占用与牌谱总数无关。稳定后的吞吐量取决于最慢的一段而不是三段之和。
+    输出目录按 layout 分片（见 OutputLayout），索引中已写入的牌谱在进入下载阶段前跳过。
+    """
+
+    def __init__(self, out_dir: str, cache_dir: Optional[str] = None,
+                 fetch_workers: int = 4, convert_workers: Optional[int] = None,
+                 write_workers: int = 1, queue_size: int = 16,
+                 base_url: str = DOWNLOAD_BASE_URL, timeout: float = 10, layout: str = FLAT,
+                 rate: float = 1.0, burst: float = 1.0):
+        self.out_dir = out_dir
+        # 所有下载线程共用一个令牌桶，总请求速率不随线程数增加
+        self.bucket = TokenBucket(rate, burst)
+        self.layout = OutputLayout(out_dir, layout)
+        self.skipped = 0
+        self.cache_dir = cache_dir
+        self.base_url = base_url
+        self.timeout = timeout
+        self.queue_size = queue_size
+        self.fetch = StageStats("fetch", fetch_workers)
+        self.convert = StageStats("convert", convert_workers or os.cpu_count() or 1)
+        self.write = StageStats("write", write_workers)
+
+    # --- 各阶段 ---
+
+    def _fetch_loop(self, inbox: queue.Queue, outbox: queue.Queue) -> None:
+        # requests.Session 不保证线程安全，每个下载线程各用一个
+        session = requests.Session()
+        while True:
+            log_id = inbox.get()
+            if log_id is _DONE:
+                return
+            start = time.perf_counter()
+            try:
+                xml_content = fetch_xml(log_id, session, self.base_url, self.timeout, self.cache_dir, self.bucket)
+            except OSError as e:
+                print(f"读取缓存失败 {log_id}: {e}")
+                xml_content = None
+            self.fetch.add(time.perf_counter() - start, xml_content is not None)
+            if xml_content is not None:
+                outbox.put((log_id, xml_content))
+
+    def _convert_loop(self, inbox: queue.Queue, outbox: queue.Queue) -> None:
+        """把队列中的牌谱分发到进程池，在途任务数有上限，结果按提交顺序送往写入阶段。"""
+        limit = self.convert.workers * 2
+        executor = ProcessPoolExecutor(max_workers=self.convert.workers)
+        try:
+            pending: deque = deque()
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    break
+                log_id, xml_content = item
+                try:
+                    future = executor.submit(convert_to_files, log_id, xml_content)
+                except BrokenProcessPool:
+                    # 工作进程异常退出后进程池不可再用：先取回在途任务（均计为失败），再换一个新池
+                    while pending:
+                        self._collect(*pending.popleft(), outbox)
+                    executor.shutdown(wait=False)
+                    executor = ProcessPoolExecutor(max_workers=self.convert.workers)
+                    future = executor.submit(convert_to_files, log_id, xml_content)
+                pending.append((log_id, future))
+                if len(pending) >= limit:
+                    self._collect(*pending.popleft(), outbox)
+            while pending:
+                self._collect(*pending.popleft(), outbox)
+        finally:
+            executor.shutdown()
+            for _ in range(self.write.workers):
+                outbox.put(_DONE)
+
+    def _collect(self, log_id: str, future, outbox: queue.Queue) -> None:
+        # 任何单个牌谱的错误（含工作进程崩溃）都只计为失败，转换线程必须继续排空队列
+        converted = collect_result(log_id, future, Exception)
+        if converted is None:
+            self.convert.add(0.0, ok=False)
+            return
+        self.convert.add(converted[1])
+        outbox.put(converted)
+
+    def _write_loop(self, inbox: queue.Queue) -> None:
+        while True:
+            converted = inbox.get()
+            if converted is _DONE:
+                return
+            start = time.perf_counter()
+            try:
+                write_files(self.layout, converted)
+                ok = True
+            except IOError as e:
+                print(f"写入文件失败 {converted[0]}: {e}")
+                ok = False
+            self.write.add(time.perf_counter() - start, ok)
+
+    # --- 运行 ---
+
+    def run(self, items: Iterable[str]) -> Dict[str, Any]:
+        """
+        处理所有牌谱URL或ID，返回各阶段的统计。
+
+        Returns:
+            Dict[str, Any]: {"wall": 总耗时, "skipped": 已写入而跳过的牌谱数,
+                "fetch"/"convert"/"write": 阶段统计}。
+        """
+        os.makedirs(self.out_dir, exist_ok=True)
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        ids: queue.Queue = queue.Queue(self.queue_size)
+        fetched: queue.Queue = queue.Queue(self.queue_size)
+        converted: queue.Queue = queue.Queue(self.queue_size)
+
+        fetchers = [threading.Thread(target=self._fetch_loop, args=(ids, fetched), daemon=True)
+                    for _ in range(self.fetch.workers)]
+        converter = threading.Thread(target=self._convert_loop, args=(fetched, converted), daemon=True)
+        writers = [threading.Thread(target=self._write_loop, args=(converted,), daemon=True)
+                   for _ in range(self.write.workers)]
+
+        start = time.perf_counter()
+        for thread in fetchers + [converter] + writers:
+            thread.start()
+        try:
+            for item in items:
+                log_id = normalize_log_id(item)
+                if not log_id:
+                    continue
+                if self.layout.exists(log_id):
+                    self.skipped += 1
+                    continue
+                ids.put(log_id)
+        finally:
+            for _ in fetchers:
+                ids.put(_DONE)
+            for thread in fetchers:
+                thread.join()
+            fetched.put(_DONE)
+            converter.join()
+            for thread in writers:
+                thread.join()
+        wall = time.perf_counter() - start
+
+        report: Dict[str, Any] = {"wall": round(wall, 3), "skipped": self.skipped}
+        for stage in (self.fetch, self.convert, self.write):
+            report[stage.name] = stage.report(wall)
+        return report
+
+
+def run_pipeline(items: Iterable[str], out_dir: str, **options: Any) -> Dict[str, Any]:
+    """用给定参数构造 Pipeline 并运行，参数见 Pipeline。"""
+    return Pipeline(out_dir, **options).run(items)
+
+
+def main() -> None:
+    """命令行入口。"""
+    parser = argparse.ArgumentParser(description="天凤牌谱 下载 → 转换 → 写入 流水线")
+    parser.add_argument("ids", help="每行一个牌谱URL或ID的文件")
+    parser.add_argument("out_dir", help="JSON 输出目录")
+    parser.add_argument("--cache", help="XML 缓存目录（可与 download_job 的输出目录共用）")
+    parser.add_argument("--fetch-workers", type=int, default=4, help="下载并发数")
+    parser.add_argument("--convert-workers", type=int, default=None, help="转换进程数，默认为 CPU 核数")
+    parser.add_argument("--write-workers", type=int, default=1, help="写入线程数")
+    parser.add_argument("--queue-size", type=int, default=16, help="阶段间队列容量")
+    parser.add_argument("--base-url", default=DOWNLOAD_BASE_URL, help="下载地址")
+    parser.add_argument("--rate", type=float, default=1.0, help="所有下载线程合计的每秒请求数上限")
+    parser.add_argument("--burst", type=float, default=1.0, help="令牌桶容量")
+    parser.add_argument("--layout", choices=LAYOUTS, default=FLAT,
+                        help="输出目录布局：flat 每个牌谱一个子目录，hash 按ID散列分片，date 按日期分片")
+    args = parser.parse_args()
+
+    with open(args.ids, encoding='utf-8') as f:
+        items = [line for line in f if line.strip()]
+    report = run_pipeline(items, args.out_dir, cache_dir=args.cache,
+                          fetch_workers=args.fetch_workers, convert_workers=args.convert_workers,
+                          write_workers=args.write_workers, queue_size=args.queue_size,
+                          base_url=args.base_url, layout=args.layout, rate=args.rate, burst=args.burst)
+    print(f"总耗时 {report['wall']:.2f}s，跳过已写入 {report['skipped']}")
+    for name in ("fetch", "convert", "write"):
+        stage = report[name]
+        print(f"{name:8s} 并发 {stage['workers']:3d}  完成 {stage['items']:6d}  失败 {stage['errors']:4d}  "
+              f"忙碌 {stage['busy']:8.2f}s  利用率 {stage['utilization']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
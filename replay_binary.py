@@ -0,0 +1,505 @@
+# -*- coding: utf-8 -*-
+"""
+tenhou.net/6 牌谱的紧凑二进制格式。
+
+单个牌谱的布局（整数均为 LEB128 varint）：
+
+    b"THR6" 版本号(1字节)
+    头部长度 头部(除 "log" 外的全部字段，按下述值编码为字典)
+    局数 N
+    N 个单局记录的字节长度（用于随机访问）
+    N 个单局记录
+
+单局记录：第 0-3 列与第 16 列（场次、点数、宝牌、里宝牌、结果）按下述值编码；
+四家的配牌、摸牌、打牌共 12 列各为 事件数 + 逐个事件记录，每个事件以一个字节开头，
+高 2 位为类型、低 6 位为常用整数的编码（牌号、0、60）：
+    00  普通的牌 / 0 / 60，只占这一个字节
+    01  立直宣言牌 "r<牌>"，只占这一个字节
+    10  鸣牌字符串：低 6 位为 字母序号*5+字母位置，其后为 3 张（吃、碰）或 4 张（杠）牌的编码
+    11  其他值：其后为一个按下述值编码的完整值
+
+紧凑 JSON 中每张牌约占 3 字节（两位数字加逗号），事件记录为 1 字节；
+完整的半庄整体约为紧凑 JSON 的 1/2.7，各局仍可按字节偏移直接随机访问。
+
+值的编码以一个标记字节开头：
+    0x00-0x3F  常用整数（牌号、0、60、小座次号等）查表
+    0x40       zigzag varint 整数
+    0x41       鸣牌 / 立直字符串：(字母序号<<4 | 字母位置) 牌数 牌号...
+    0x42       UTF-8 字符串：长度 字节
+    0x43       float64（小端）
+    0x44       列表：元素数 元素...
+    0x45/46/47 None / True / False
+    0x48       字典：键值对数 (键 值)...
+    0x49       固定词表中的字符串：词表下标
+    0x4A       役种字符串 "役名(N飜)"：役种ID 飜数
+    0x4B       和了描述模板（如 "30符2飜2000点"）：模板下标 各数值
+    0x4C       100 的整数倍（点数与点数变动）：zigzag varint(值 / 100)
+    0x4D       两位小数以内的 float（R 值、终局得点）：zigzag varint(值 * 100)
+
+多个牌谱写入同一文件时，每个牌谱前加一个 varint 长度。
+"""
+import math
+import mmap
+import re
+import struct
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
+
+from xml_parser import DAN_MAP, YAKU_MAP, parse_tenhou_xml_to_mjai
+
+
+MAGIC = b"THR6"
+VERSION = 2
+
+# 出现频率最高的整数，单字节编码
+COMMON_INTS: List[int] = (
+    [0, 60]
+    + list(range(11, 20)) + list(range(21, 30)) + list(range(31, 40))
+    + list(range(41, 48)) + [51, 52, 53]
+    + list(range(1, 11))
+)
+COMMON_CODES: Dict[int, int] = {value: code for code, value in enumerate(COMMON_INTS)}
+
+TAG_INT = 0x40
+TAG_MELD = 0x41
+TAG_STR = 0x42
+TAG_FLOAT = 0x43
+TAG_LIST = 0x44
+TAG_NONE = 0x45
+TAG_TRUE = 0x46
+TAG_FALSE = 0x47
+TAG_DICT = 0x48
+TAG_WORD = 0x49
+TAG_YAKU = 0x4A
+TAG_TEMPLATE = 0x4B
+TAG_HUNDREDS = 0x4C
+TAG_CENTS = 0x4D
+
+# 单局记录中使用事件记录的列：四家的配牌、摸牌、打牌
+EVENT_COLUMNS = frozenset(range(4, 16))
+# 事件记录首字节的类型（高 2 位）
+EVENT_TILE = 0x00
+EVENT_RIICHI = 0x40
+EVENT_CALL = 0x80
+EVENT_VALUE = 0xC0
+
+# 鸣牌与立直字符串中出现的字母
+MELD_LETTERS = "cpmakr"
+# 事件记录中各鸣牌字母对应的牌数（立直 "r" 单独编码）
+CALL_TILES = {"c": 3, "p": 3, "m": 4, "a": 4, "k": 4}
+
+_FLOAT = struct.Struct("<d")
+
+# 固定词表：头部字段名、段位、结果类型与役满名。只能在末尾追加，否则需提升版本号
+WORDS: List[str] = (
+    ["ver", "ref", "ratingc", "title", "name", "rule", "disp", "aka53", "aka52", "aka51",
+     "lobby", "dan", "rate", "sx", "sc", "log", "PF4", "", "M", "F", "C"]
+    + list(DAN_MAP)
+    + ["和了", "流局", "流し満貫", "九種九牌", "四風連打", "四家立直", "三家和了", "四槓散了", "全員聴牌", "全員不聴"]
+    + [YAKU_MAP[i] for i in sorted(YAKU_MAP)]
+)
+WORD_CODES: Dict[str, int] = {}
+for _code, _word in enumerate(WORDS):
+    WORD_CODES.setdefault(_word, _code)
+
+YAKU_CODES: Dict[str, int] = {name: yaku_id for yaku_id, name in YAKU_MAP.items()}
+YAKU_PATTERN = re.compile(r"^(.+)\((\d+)飜\)$")
+
+# 和了描述模板，与 _create_agari_description 的输出格式一一对应。只能在末尾追加
+TEMPLATES: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"^(\d+)符(\d+)飜(\d+)点$"), "{}符{}飜{}点"),
+    (re.compile(r"^(\d+)符(\d+)飜(\d+)-(\d+)点$"), "{}符{}飜{}-{}点"),
+    (re.compile(r"^(\d+)符(\d+)飜(\d+)点オール$"), "{}符{}飜{}点オール"),
+    (re.compile(r"^(\d+)符(\d+)点$"), "{}符{}点"),
+    (re.compile(r"^満貫(\d+)点$"), "満貫{}点"),
+    (re.compile(r"^跳満(\d+)点$"), "跳満{}点"),
+    (re.compile(r"^倍満(\d+)点$"), "倍満{}点"),
+    (re.compile(r"^三倍満(\d+)点$"), "三倍満{}点"),
+    (re.compile(r"^役満(\d+)点$"), "役満{}点"),
+    (re.compile(r"^(\d+)倍役満(\d+)点$"), "{}倍役満{}点"),
+]
+
+
+# --- 编码 ---
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def _split_meld(text: str) -> Union[Tuple[int, int, List[int]], None]:
+    """把 "c262425"、"15p1515"、"r60" 之类的字符串拆为 (字母序号, 位置, 牌号)，无法无损拆分时返回 None。"""
+    for i, ch in enumerate(text):
+        if not ch.isdigit():
+            letter = MELD_LETTERS.find(ch)
+            head, tail = text[:i], text[i + 1:]
+            break
+    else:
+        return None
+    if letter < 0 or len(head) % 2 or len(tail) % 2 or not tail.isdigit():
+        return None
+    tiles = [int(head[j:j + 2]) for j in range(0, len(head), 2)] + \
+            [int(tail[j:j + 2]) for j in range(0, len(tail), 2)]
+    if len(tiles) > 0xFF or len(head) // 2 > 0xF or any(t not in COMMON_CODES or t < 10 for t in tiles):
+        return None
+    return letter, len(head) // 2, tiles
+
+
+def _write_str(out: bytearray, value: str) -> None:
+    code = WORD_CODES.get(value)
+    if code is not None:
+        out.append(TAG_WORD)
+        _write_varint(out, code)
+        return
+    meld = _split_meld(value)
+    if meld is not None:
+        letter, position, tiles = meld
+        out.append(TAG_MELD)
+        out.append(letter << 4 | position)
+        out.append(len(tiles))
+        out.extend(COMMON_CODES[t] for t in tiles)
+        return
+    match = YAKU_PATTERN.match(value)
+    if match and match.group(1) in YAKU_CODES and str(int(match.group(2))) == match.group(2):
+        out.append(TAG_YAKU)
+        _write_varint(out, YAKU_CODES[match.group(1)])
+        _write_varint(out, int(match.group(2)))
+        return
+    for index, (pattern, template) in enumerate(TEMPLATES):
+        match = pattern.match(value)
+        if match is None:
+            continue
+        numbers = [int(group) for group in match.groups()]
+        # 带前导零等无法原样还原的情况退回普通字符串
+        if template.format(*numbers) == value:
+            out.append(TAG_TEMPLATE)
+            out.append(index)
+            for number in numbers:
+                _write_varint(out, number)
+            return
+        break
+    data = value.encode("utf-8")
+    out.append(TAG_STR)
+    _write_varint(out, len(data))
+    out.extend(data)
+
+
+def _write_value(out: bytearray, value: Any) -> None:
+    if value is None:
+        out.append(TAG_NONE)
+    elif value is True:
+        out.append(TAG_TRUE)
+    elif value is False:
+        out.append(TAG_FALSE)
+    elif isinstance(value, int):
+        code = COMMON_CODES.get(value)
+        if code is not None:
+            out.append(code)
+        elif value % 100 == 0:
+            out.append(TAG_HUNDREDS)
+            _write_varint(out, _zigzag(value // 100))
+        else:
+            out.append(TAG_INT)
+            _write_varint(out, _zigzag(value))
+    elif isinstance(value, str):
+        _write_str(out, value)
+    elif isinstance(value, float):
+        cents = round(value * 100) if math.isfinite(value) else None
+        # 只有 值*100 取整后能原样还原（含 -0.0 的符号）时才用定点编码
+        if cents is not None and cents / 100 == value and math.copysign(1, value) == math.copysign(1, cents or 1):
+            out.append(TAG_CENTS)
+            _write_varint(out, _zigzag(cents))
+        else:
+            out.append(TAG_FLOAT)
+            out.extend(_FLOAT.pack(value))
+    elif isinstance(value, (list, tuple)):
+        out.append(TAG_LIST)
+        _write_varint(out, len(value))
+        for item in value:
+            _write_value(out, item)
+    elif isinstance(value, dict):
+        out.append(TAG_DICT)
+        _write_varint(out, len(value))
+        for key, item in value.items():
+            _write_str(out, key)
+            _write_value(out, item)
+    else:
+        raise TypeError(f"无法编码的值类型: {type(value).__name__}")
+
+
+def _write_event(out: bytearray, value: Any) -> None:
+    """写入配牌 / 摸牌 / 打牌列中的一个元素。"""
+    if type(value) is int:
+        code = COMMON_CODES.get(value)
+        if code is not None:
+            out.append(EVENT_TILE | code)
+            return
+    elif type(value) is str:
+        meld = _split_meld(value)
+        if meld is not None:
+            letter, position, tiles = meld
+            ch = MELD_LETTERS[letter]
+            if ch == "r":
+                if position == 0 and len(tiles) == 1:
+                    out.append(EVENT_RIICHI | COMMON_CODES[tiles[0]])
+                    return
+            elif len(tiles) == CALL_TILES[ch] and position <= len(tiles):
+                out.append(EVENT_CALL | (letter * 5 + position))
+                out.extend(COMMON_CODES[t] for t in tiles)
+                return
+    out.append(EVENT_VALUE)
+    _write_value(out, value)
+
+
+def _encode_kyoku(kyoku_log: List[Any]) -> bytearray:
+    if len(kyoku_log) != 17:
+        raise ValueError(f"单局日志应有 17 列，实际为 {len(kyoku_log)}")
+    record = bytearray()
+    for index, column in enumerate(kyoku_log):
+        if index not in EVENT_COLUMNS:
+            _write_value(record, column)
+            continue
+        if not isinstance(column, list):
+            raise TypeError(f"第 {index} 列应为列表，实际为 {type(column).__name__}")
+        _write_varint(record, len(column))
+        for value in column:
+            _write_event(record, value)
+    return record
+
+
+def encode_game(logs: Dict[str, Any]) -> bytes:
+    """把 parse_tenhou_xml_to_mjai 的结果编码为二进制。"""
+    header_bytes = bytearray()
+    _write_value(header_bytes, {key: value for key, value in logs.items() if key != "log"})
+    kyoku_records = [_encode_kyoku(kyoku_log) for kyoku_log in logs.get("log") or []]
+
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    _write_varint(out, len(header_bytes))
+    out.extend(header_bytes)
+    _write_varint(out, len(kyoku_records))
+    for record in kyoku_records:
+        _write_varint(out, len(record))
+    for record in kyoku_records:
+        out.extend(record)
+    return bytes(out)
+
+
+def encode_xml(xml_content: Union[str, bytes], log_id: str = "") -> bytes:
+    """直接把天凤 XML 转换并编码为二进制。"""
+    return encode_game(parse_tenhou_xml_to_mjai(xml_content, log_id))
+
+
+# --- 解码 ---
+
+def _read_varint(buf: memoryview, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _read_value(buf: memoryview, pos: int) -> Tuple[Any, int]:
+    tag = buf[pos]
+    pos += 1
+    if tag < TAG_INT:
+        return COMMON_INTS[tag], pos
+    if tag == TAG_LIST:
+        count, pos = _read_varint(buf, pos)
+        items = []
+        for _ in range(count):
+            item, pos = _read_value(buf, pos)
+            items.append(item)
+        return items, pos
+    if tag == TAG_MELD:
+        packed = buf[pos]
+        count = buf[pos + 1]
+        pos += 2
+        tiles = [str(COMMON_INTS[code]) for code in buf[pos:pos + count]]
+        position = packed & 0xF
+        tiles.insert(position, MELD_LETTERS[packed >> 4])
+        return "".join(tiles), pos + count
+    if tag == TAG_WORD:
+        code, pos = _read_varint(buf, pos)
+        return WORDS[code], pos
+    if tag == TAG_YAKU:
+        yaku_id, pos = _read_varint(buf, pos)
+        han, pos = _read_varint(buf, pos)
+        return f"{YAKU_MAP[yaku_id]}({han}飜)", pos
+    if tag == TAG_TEMPLATE:
+        pattern, template = TEMPLATES[buf[pos]]
+        pos += 1
+        numbers = []
+        for _ in range(pattern.groups):
+            number, pos = _read_varint(buf, pos)
+            numbers.append(number)
+        return template.format(*numbers), pos
+    if tag == TAG_DICT:
+        count, pos = _read_varint(buf, pos)
+        items = {}
+        for _ in range(count):
+            key, pos = _read_value(buf, pos)
+            items[key], pos = _read_value(buf, pos)
+        return items, pos
+    if tag == TAG_CENTS:
+        raw, pos = _read_varint(buf, pos)
+        return ((raw >> 1) ^ -(raw & 1)) / 100, pos
+    if tag == TAG_HUNDREDS:
+        raw, pos = _read_varint(buf, pos)
+        return ((raw >> 1) ^ -(raw & 1)) * 100, pos
+    if tag == TAG_INT:
+        raw, pos = _read_varint(buf, pos)
+        return (raw >> 1) ^ -(raw & 1), pos
+    if tag == TAG_STR:
+        length, pos = _read_varint(buf, pos)
+        return str(buf[pos:pos + length], "utf-8"), pos + length
+    if tag == TAG_FLOAT:
+        return _FLOAT.unpack_from(buf, pos)[0], pos + 8
+    if tag == TAG_NONE:
+        return None, pos
+    if tag == TAG_TRUE:
+        return True, pos
+    if tag == TAG_FALSE:
+        return False, pos
+    raise ValueError(f"未知的标记字节 0x{tag:02x}（偏移 {pos - 1}）")
+
+
+# 事件记录首字节 → 普通牌 / 立直宣言牌的解码结果，None 表示需要继续读取
+_EVENT_VALUES: List[Any] = (
+    COMMON_INTS + [None] * (0x40 - len(COMMON_INTS))
+    + [f"r{value}" for value in COMMON_INTS] + [None] * (0xC0 - 0x40 - len(COMMON_INTS))
+)
+
+
+def _read_events(buf: memoryview, pos: int) -> Tuple[List[Any], int]:
+    count, pos = _read_varint(buf, pos)
+    end = pos + count
+    values = [_EVENT_VALUES[byte] for byte in buf[pos:end]] if count else []
+    if None not in values:
+        # 常见情形：整列都是单字节事件
+        return values, end
+    events = []
+    for _ in range(count):
+        head = buf[pos]
+        pos += 1
+        if head < EVENT_CALL:
+            events.append(_EVENT_VALUES[head])
+        elif head < EVENT_VALUE:
+            letter, position = divmod(head & 0x3F, 5)
+            ch = MELD_LETTERS[letter]
+            end = pos + CALL_TILES[ch]
+            tiles = [str(COMMON_INTS[code]) for code in buf[pos:end]]
+            tiles.insert(position, ch)
+            events.append("".join(tiles))
+            pos = end
+        else:
+            value, pos = _read_value(buf, pos)
+            events.append(value)
+    return events, pos
+
+
+class ReplayReader:
+    """
+    在 bytes / memoryview / mmap 上直接读取单个二进制牌谱，不复制底层缓冲区。
+
+    头部与各局在首次访问时才解码，可按局随机访问。
+    """
+
+    def __init__(self, data: Union[bytes, bytearray, memoryview, mmap.mmap]):
+        buf = data if isinstance(data, memoryview) else memoryview(data)
+        if bytes(buf[:4]) != MAGIC:
+            raise ValueError("不是二进制牌谱数据")
+        if buf[4] != VERSION:
+            raise ValueError(f"不支持的版本号 {buf[4]}")
+        self._buf = buf
+        header_len, pos = _read_varint(buf, 5)
+        self._header_span = (pos, pos + header_len)
+        pos += header_len
+        count, pos = _read_varint(buf, pos)
+        lengths = []
+        for _ in range(count):
+            length, pos = _read_varint(buf, pos)
+            lengths.append(length)
+        self._offsets: List[int] = []
+        for length in lengths:
+            self._offsets.append(pos)
+            pos += length
+        self.size = pos
+        self._header = None
+
+    @property
+    def header(self) -> Dict[str, Any]:
+        if self._header is None:
+            self._header = _read_value(self._buf, self._header_span[0])[0]
+        return self._header
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def kyoku(self, index: int) -> List[Any]:
+        """解码第 index 局。"""
+        pos = self._offsets[index]
+        columns = []
+        for column in range(17):
+            if column in EVENT_COLUMNS:
+                value, pos = _read_events(self._buf, pos)
+            else:
+                value, pos = _read_value(self._buf, pos)
+            columns.append(value)
+        return columns
+
+    def iter_kyoku(self) -> Iterator[List[Any]]:
+        for index in range(len(self._offsets)):
+            yield self.kyoku(index)
+
+    def to_tenhou(self) -> Dict[str, Any]:
+        """无损还原为 tenhou.net/6 JSON 结构。"""
+        logs = dict(self.header)
+        logs["log"] = list(self.iter_kyoku())
+        return logs
+
+
+def decode_game(data: Union[bytes, bytearray, memoryview]) -> Dict[str, Any]:
+    """把二进制牌谱还原为 tenhou.net/6 JSON 结构。"""
+    return ReplayReader(data).to_tenhou()
+
+
+# --- 多牌谱文件 ---
+
+def write_replay_file(path: str, games: Iterable[Dict[str, Any]]) -> int:
+    """把多个牌谱依次写入同一个文件，返回写入的牌谱数。"""
+    count = 0
+    with open(path, "wb") as f:
+        for logs in games:
+            data = encode_game(logs)
+            prefix = bytearray()
+            _write_varint(prefix, len(data))
+            f.write(prefix)
+            f.write(data)
+            count += 1
+    return count
+
+
+def iter_replay_file(path: str) -> Iterator[ReplayReader]:
+    """用 mmap 打开多牌谱文件，逐个产出零拷贝的 ReplayReader。"""
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # reader 持有映射的切片，映射随最后一个 reader 一起由垃圾回收释放
+    buf = memoryview(mapped)
+    pos = 0
+    while pos < len(buf):
+        length, pos = _read_varint(buf, pos)
+        yield ReplayReader(buf[pos:pos + length])
+        pos += length
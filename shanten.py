@@ -0,0 +1,570 @@
+# -*- coding: utf-8 -*-
+"""向听数与有效牌（受入）计算，基于按花色预计算的分解表。"""
+import sys
+import time
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from tenhou_merged import Meld, State, decode_meld, to_34_array
+
+
+# 分解表中的一项：(雀头数 p, 面子数 m, 搭子数 t)
+Option = Tuple[int, int, int]
+Table = Tuple[Option, ...]
+
+TERMINALS: Tuple[int, ...] = (0, 8, 9, 17, 18, 26, 27, 28, 29, 30, 31, 32, 33)
+IS_TERMINAL: Tuple[bool, ...] = tuple(i in TERMINALS for i in range(34))
+# 三个数牌花色与字牌在 34 种牌中的区间
+COMPONENTS: Tuple[Tuple[int, int], ...] = ((0, 9), (9, 18), (18, 27), (27, 34))
+COMPONENT_OF: Tuple[int, ...] = tuple(min(i // 9, 3) for i in range(34))
+# 摸入某张牌时，只有持有这些牌之一才可能改变一般形的分解（同花色相距 2 以内，字牌只看自身）
+NEIGHBOURS: Tuple[Tuple[int, ...], ...] = tuple(
+    (i,) if i >= 27 else tuple(range(max(i - i % 9, i - 2), min(i - i % 9 + 9, i + 3)))
+    for i in range(34)
+)
+
+
+def _prune(best: Dict[Tuple[int, int], int]) -> Table:
+    """去掉被支配的项：雀头数相同时，面子数与搭子数都不更多的项不可能更优。"""
+    options = []
+    for (p, m), t in best.items():
+        if not any(p2 == p and m2 >= m and t2 >= t and (m2, t2) != (m, t)
+                   for (p2, m2), t2 in best.items()):
+            options.append((p, m, t))
+    return tuple(sorted(options))
+
+
+def _merge(best: Dict[Tuple[int, int], int], table: Table, dp: int, dm: int, dt: int) -> None:
+    for p, m, t in table:
+        p += dp
+        m += dm
+        if p > 1 or m > 4:
+            continue
+        t += dt
+        if t > best.get((p, m), -1):
+            best[(p, m)] = t
+
+
+@lru_cache(maxsize=None)
+def suit_table(counts: Tuple[int, ...]) -> Table:
+    """
+    单一花色（数牌为 9 种，字牌每种单独为 1 种）的分解表。
+
+    对每个 (雀头数, 面子数) 记录可取得的最多搭子数，结果按牌型缓存，
+    同一牌型在整个进程中只分解一次。
+    """
+    n = len(counts)
+    i = 0
+    while i < n and counts[i] == 0:
+        i += 1
+    if i == n:
+        return ((0, 0, 0),)
+
+    c = list(counts)
+    best: Dict[Tuple[int, int], int] = {}
+
+    def sub(*tiles: int) -> Table:
+        for j in tiles:
+            c[j] -= 1
+        table = suit_table(tuple(c))
+        for j in tiles:
+            c[j] += 1
+        return table
+
+    # 孤张
+    _merge(best, sub(i), 0, 0, 0)
+    # 刻子
+    if c[i] >= 3:
+        _merge(best, sub(i, i, i), 0, 1, 0)
+    # 顺子
+    if i + 2 < n and c[i + 1] and c[i + 2]:
+        _merge(best, sub(i, i + 1, i + 2), 0, 1, 0)
+    # 雀头 / 对子搭子
+    if c[i] >= 2:
+        table = sub(i, i)
+        _merge(best, table, 1, 0, 0)
+        _merge(best, table, 0, 0, 1)
+    # 两面 / 边张、嵌张搭子
+    if i + 1 < n and c[i + 1]:
+        _merge(best, sub(i, i + 1), 0, 0, 1)
+    if i + 2 < n and c[i + 2]:
+        _merge(best, sub(i, i + 2), 0, 0, 1)
+    return _prune(best)
+
+
+@lru_cache(maxsize=1 << 16)
+def combine(a: Table, b: Table) -> Table:
+    """合并两个分解表。"""
+    best: Dict[Tuple[int, int], int] = {}
+    for p, m, t in a:
+        _merge(best, b, p, m, t)
+    return _prune(best)
+
+
+@lru_cache(maxsize=None)
+def honor_table(counts: Tuple[int, ...]) -> Table:
+    """字牌分解表，字牌之间互不相连，按排序后的张数缓存。"""
+    table: Table = ((0, 0, 0),)
+    for count in counts:
+        if count:
+            table = combine(table, suit_table((count,)))
+    return table
+
+
+def _suit_key(hand34: Sequence[int], index: int) -> Tuple[int, ...]:
+    """花色的张数元组；字牌之间互不相连，按排序后的张数表示。"""
+    start, end = COMPONENTS[index]
+    if index == 3:
+        return tuple(sorted(hand34[start:end]))
+    return tuple(hand34[start:end])
+
+
+def _component_table(hand34: Sequence[int], index: int) -> Table:
+    if index == 3:
+        return honor_table(_suit_key(hand34, index))
+    return suit_table(_suit_key(hand34, index))
+
+
+# --- 分解表编号 ---
+# 分解表是嵌套元组，每次作为缓存键都要重新求哈希。热路径上给每个不同的表分配一个整数编号，
+# 合并与求分都以编号为键。
+
+_TABLES: List[Table] = []
+_TABLE_IDS: Dict[Table, int] = {}
+_SUIT_TIDS: Tuple[Dict[Tuple[int, ...], int], Dict[Tuple[int, ...], int]] = ({}, {})
+
+
+def _table_id(table: Table) -> int:
+    tid = _TABLE_IDS.get(table)
+    if tid is None:
+        tid = _TABLE_IDS[table] = len(_TABLES)
+        _TABLES.append(table)
+    return tid
+
+
+def _suit_tid(key: Tuple[int, ...], honors: bool) -> int:
+    """花色张数元组（_suit_key）对应的分解表编号。"""
+    cache = _SUIT_TIDS[honors]
+    tid = cache.get(key)
+    if tid is None:
+        tid = cache[key] = _table_id(honor_table(key) if honors else suit_table(key))
+    return tid
+
+
+@lru_cache(maxsize=1 << 16)
+def _combine_id(a: int, b: int) -> int:
+    return _table_id(combine(_TABLES[a], _TABLES[b]))
+
+
+@lru_cache(maxsize=1 << 18)
+def _score_id(a: int, b: int, max_mentsu: int) -> int:
+    return _best_score.__wrapped__(_TABLES[a], _TABLES[b], max_mentsu)
+
+
+@lru_cache(maxsize=1 << 18)
+def _suit_improvements(others: int, key: Tuple[int, ...], component: int, max_mentsu: int) -> Tuple[int, ...]:
+    """
+    摸入该花色的哪些牌能使一般形前进一向听，others 为其余三个花色合并后的分解表编号。
+
+    数牌返回牌号（34 编码）；字牌只与自身相连，返回能前进的已有张数（1~3）。
+    只有张数不足 4 且与已有牌相距 2 以内的牌可能改变分解。
+    同一花色与同一 others 在相邻的决策之间反复出现，结果跨决策缓存。
+    """
+    honors = component == 3
+    score = _score_id(others, _suit_tid(key, honors), max_mentsu)
+    counts = list(key)
+    result = []
+    if honors:
+        for have in sorted({c for c in key if 0 < c < 4}):
+            i = counts.index(have)
+            counts[i] += 1
+            if _score_id(others, _suit_tid(tuple(sorted(counts)), True), max_mentsu) > score:
+                result.append(have)
+            counts[i] -= 1
+        return tuple(result)
+    for offset in range(len(counts)):
+        if counts[offset] >= 4 or not any(counts[max(0, offset - 2):offset + 3]):
+            continue
+        counts[offset] += 1
+        if _score_id(others, _suit_tid(tuple(counts), False), max_mentsu) > score:
+            result.append(COMPONENTS[component][0] + offset)
+        counts[offset] -= 1
+    return tuple(result)
+
+
+@lru_cache(maxsize=1 << 18)
+def _best_score(a: Table, b: Table, max_mentsu: int) -> int:
+    """合并两个分解表并直接求 2m + min(t, 剩余面子位) + p 的最大值。"""
+    best = 0
+    for pa, ma, ta in a:
+        for pb, mb, tb in b:
+            p = pa + pb
+            m = ma + mb
+            if p > 1 or m > max_mentsu:
+                continue
+            t = ta + tb
+            if t > max_mentsu - m:
+                t = max_mentsu - m
+            score = 2 * m + t + p
+            if score > best:
+                best = score
+    return best
+
+
+def _called_melds(tile_count: int) -> int:
+    """由手牌张数推算副露数。"""
+    return (14 - tile_count) // 3
+
+
+def regular_shanten(hand34: Sequence[int]) -> int:
+    """一般形（4 面子 1 雀头）的向听数，-1 表示和了形。"""
+    k = _called_melds(sum(hand34))
+    tables = [_component_table(hand34, i) for i in range(4)]
+    rest = combine(combine(tables[0], tables[1]), tables[2])
+    return 8 - 2 * k - _best_score(rest, tables[3], 4 - k)
+
+
+def chiitoi_shanten(hand34: Sequence[int]) -> int:
+    """七对子向听数，有副露时不成立（返回一个足够大的值）。"""
+    if sum(hand34) < 13:
+        return 99
+    pairs = sum(1 for c in hand34 if c >= 2)
+    kinds = sum(1 for c in hand34 if c)
+    return 6 - pairs + max(0, 7 - kinds)
+
+
+def kokushi_shanten(hand34: Sequence[int]) -> int:
+    """国士无双向听数，有副露时不成立（返回一个足够大的值）。"""
+    if sum(hand34) < 13:
+        return 99
+    kinds = sum(1 for i in TERMINALS if hand34[i])
+    has_pair = any(hand34[i] >= 2 for i in TERMINALS)
+    return 13 - kinds - (1 if has_pair else 0)
+
+
+def shanten(hand34: Sequence[int]) -> int:
+    """一般形、七对子、国士无双中最小的向听数。"""
+    return min(regular_shanten(hand34), chiitoi_shanten(hand34), kokushi_shanten(hand34))
+
+
+# 七对子 / 国士无双所需的计数：(对子数, 种类数, 幺九种类数, 幺九对子数)
+ClosedCounts = Tuple[int, int, int, int]
+
+
+def _closed_counts(hand34: Sequence[int]) -> ClosedCounts:
+    pairs = kinds = terminal_kinds = terminal_pairs = 0
+    for i in range(34):
+        c = hand34[i]
+        if c:
+            kinds += 1
+            if c >= 2:
+                pairs += 1
+            if IS_TERMINAL[i]:
+                terminal_kinds += 1
+                if c >= 2:
+                    terminal_pairs += 1
+    return pairs, kinds, terminal_kinds, terminal_pairs
+
+
+def _others(tids: Sequence[int]) -> Tuple[int, int, int, int]:
+    """各花色之外其余三个花色合并后的分解表编号。"""
+    t0, t1, t2, t3 = tids
+    c01 = _combine_id(t0, t1)
+    return (
+        _combine_id(_combine_id(t1, t2), t3),
+        _combine_id(_combine_id(t0, t2), t3),
+        _combine_id(c01, t3),
+        _combine_id(c01, t2),
+    )
+
+
+def _ukeire_tiles(hand34: List[int], keys: Sequence[Tuple[int, ...]], tids: Sequence[int], tile_count: int,
+                  visible34: Optional[Sequence[int]], closed_counts: Optional[ClosedCounts],
+                  waits_only: bool = False) -> Tuple[int, Dict[int, int]]:
+    """
+    针对 3k+1 张手牌的增量受入计算。
+
+    keys / tids 为各花色的张数元组与分解表编号。每摸一张牌，一般形、七对子、国士无双
+    各自最多前进一向听，因此有效牌是“等于当前向听数的那几种形状中能前进的牌”之并：
+    一般形按花色查 _suit_improvements（预先合并好除该花色之外的分解表），
+    七对子与国士无双由 closed_counts 直接判断。waits_only 为 True 且未听牌时只求向听数。
+    """
+    k = _called_melds(tile_count + 1)
+    max_mentsu = 4 - k
+    others = _others(tids)
+    regular = 8 - 2 * k - _score_id(others[0], tids[0], max_mentsu)
+    current = regular
+    closed = tile_count >= 13
+    if closed:
+        pairs, kinds, terminal_kinds, terminal_pairs = closed_counts or _closed_counts(hand34)
+        chiitoi = 6 - pairs + (7 - kinds if kinds < 7 else 0)
+        kokushi = 13 - terminal_kinds - (1 if terminal_pairs else 0)
+        if chiitoi < current:
+            current = chiitoi
+        if kokushi < current:
+            current = kokushi
+    if waits_only and current > 0:
+        return current, {}
+
+    improving: Sequence[int] = ()
+    if regular == current:
+        # 各花色的结果已按牌号排序，依次拼接即为整体的顺序
+        improving = (_suit_improvements(others[0], keys[0], 0, max_mentsu)
+                     + _suit_improvements(others[1], keys[1], 1, max_mentsu)
+                     + _suit_improvements(others[2], keys[2], 2, max_mentsu))
+        honor_counts = _suit_improvements(others[3], keys[3], 3, max_mentsu)
+        if honor_counts:
+            improving += tuple(tile for tile in range(27, 34) if hand34[tile] in honor_counts)
+    if closed and (chiitoi == current or kokushi == current):
+        extra = set(improving)
+        if chiitoi == current:
+            # 摸入单张成对；种类不足 7 时摸入新的一种
+            extra.update(tile for tile in range(34)
+                         if hand34[tile] == 1 or (kinds < 7 and hand34[tile] == 0))
+        if kokushi == current:
+            extra.update(tile for tile in TERMINALS
+                         if hand34[tile] == 0 or (hand34[tile] == 1 and not terminal_pairs))
+        improving = sorted(extra)
+
+    tiles: Dict[int, int] = {}
+    for tile in improving:
+        remaining = 4 - hand34[tile] - (visible34[tile] if visible34 else 0)
+        tiles[tile] = remaining if remaining > 0 else 0
+    return current, tiles
+
+
+def ukeire(hand34: Sequence[int], visible34: Optional[Sequence[int]] = None) -> Tuple[int, Dict[int, int]]:
+    """
+    计算 3k+1 张手牌的向听数与有效牌。
+
+    Args:
+        hand34 (Sequence[int]): 34 种牌的张数。
+        visible34 (Optional[Sequence[int]]): 场上可见（牌河、副露、宝牌指示牌等）的张数。
+
+    Returns:
+        Tuple[int, Dict[int, int]]: 向听数，以及 {有效牌: 剩余枚数}。
+    """
+    return HandTracker(hand34).ukeire(visible34)
+
+
+def best_discards(hand34: Sequence[int], visible34: Optional[Sequence[int]] = None) -> List[Tuple[int, int, int, Dict[int, int]]]:
+    """
+    对 3k+2 张手牌评估每种打法。
+
+    逐个决策评估同一家手牌时，用 HandTracker.best_discards 可以跨决策复用各花色的分解表。
+
+    Args:
+        hand34 (Sequence[int]): 34 种牌的张数。
+        visible34 (Optional[Sequence[int]]): 场上可见的张数（不含自己的手牌）。
+
+    Returns:
+        List[Tuple[int, int, int, Dict[int, int]]]: (打出的牌, 打出后向听数, 有效牌总枚数, 有效牌)，
+            按向听数升序、有效牌枚数降序排列。
+    """
+    return HandTracker(hand34).best_discards(visible34)
+
+
+def state_best_discards(state: State, visible34: Optional[Sequence[int]] = None) -> List[Tuple[int, int, int, Dict[int, int]]]:
+    """以 bridge 的 State 手牌（136 编码）评估打法。"""
+    return best_discards(to_34_array(state.hand), visible34)
+
+
+# --- 增量手牌 ---
+
+class HandTracker:
+    """
+    增量维护一家手牌各花色的张数元组与分解表编号。
+
+    摸打、副露只标记变动的花色，评估前只重建这些花色；一局中连续的决策之间
+    大部分花色不变，分解表与 _suit_improvements 的结果都直接复用。
+    """
+
+    def __init__(self, hand34: Sequence[int]):
+        self.hand34: List[int] = list(hand34)
+        self.keys: List[Tuple[int, ...]] = [_suit_key(self.hand34, i) for i in range(4)]
+        self.tids: List[int] = [_suit_tid(key, i == 3) for i, key in enumerate(self.keys)]
+        self._dirty: Set[int] = set()
+
+    def add(self, tile: int) -> None:
+        """摸入一张牌（34 编码）。"""
+        self.hand34[tile] += 1
+        self._dirty.add(COMPONENT_OF[tile])
+
+    def remove(self, tile: int) -> None:
+        """打出或因副露移出一张牌（34 编码）。"""
+        self.hand34[tile] -= 1
+        self._dirty.add(COMPONENT_OF[tile])
+
+    def _refresh(self) -> None:
+        for component in self._dirty:
+            self.keys[component] = _suit_key(self.hand34, component)
+            self.tids[component] = _suit_tid(self.keys[component], component == 3)
+        self._dirty.clear()
+
+    def ukeire(self, visible34: Optional[Sequence[int]] = None) -> Tuple[int, Dict[int, int]]:
+        """当前 3k+1 张手牌的向听数与有效牌，参数与返回值同 ukeire。"""
+        self._refresh()
+        return _ukeire_tiles(self.hand34, self.keys, self.tids, sum(self.hand34), visible34, None)
+
+    def best_discards(self, visible34: Optional[Sequence[int]] = None) -> List[Tuple[int, int, int, Dict[int, int]]]:
+        """当前 3k+2 张手牌的各种打法，参数与返回值同 best_discards。"""
+        self._refresh()
+        hand = self.hand34
+        visible = list(visible34) if visible34 is not None else [0] * 34
+        tile_count = sum(hand) - 1
+        pairs, kinds, terminal_kinds, terminal_pairs = _closed_counts(hand)
+        results = []
+        for tile in range(34):
+            count = hand[tile]
+            if not count:
+                continue
+            component = COMPONENT_OF[tile]
+            terminal = IS_TERMINAL[tile]
+            # 打出的牌进入牌河，同样计入可见张数
+            hand[tile] -= 1
+            visible[tile] += 1
+            keys = list(self.keys)
+            tids = list(self.tids)
+            keys[component] = _suit_key(hand, component)
+            tids[component] = _suit_tid(keys[component], component == 3)
+            closed_counts = (pairs - (count == 2), kinds - (count == 1),
+                             terminal_kinds - (terminal and count == 1),
+                             terminal_pairs - (terminal and count == 2))
+            s, tiles = _ukeire_tiles(hand, keys, tids, tile_count, visible, closed_counts)
+            visible[tile] -= 1
+            hand[tile] += 1
+            results.append((tile, s, sum(tiles.values()), tiles))
+        results.sort(key=lambda r: (r[1], -r[2], r[0]))
+        return results
+
+
+class WaitTracker(HandTracker):
+    """
+    增量维护一家手牌的待牌。
+
+    摸打、副露只记录变动的牌，手牌回到 3k+1 张时调用 settle：净变动为零（摸切）时
+    直接沿用上次的待牌；否则只重算变动花色的分解表，未听牌的手牌在求向听数后即返回。
+    """
+
+    def __init__(self, hand34: Sequence[int]):
+        super().__init__(hand34)
+        self.waits: frozenset = frozenset()
+        self._changed: Dict[int, int] = {}
+        self._evaluate()
+
+    def add(self, tile: int) -> None:
+        super().add(tile)
+        self._changed[tile] = self._changed.get(tile, 0) + 1
+
+    def remove(self, tile: int) -> None:
+        super().remove(tile)
+        self._changed[tile] = self._changed.get(tile, 0) - 1
+
+    def settle(self) -> bool:
+        """手牌回到 3k+1 张后更新待牌，返回待牌是否重新计算过。"""
+        changed = any(self._changed.values())
+        self._changed.clear()
+        if not changed:
+            # 摸切等净变动为零的情形，各花色与上次评估时相同
+            self._dirty.clear()
+            return False
+        self._evaluate()
+        return True
+
+    def _evaluate(self) -> None:
+        self._refresh()
+        tile_count = sum(self.hand34)
+        if tile_count % 3 != 1:
+            self.waits = frozenset()
+            return
+        current, tiles = _ukeire_tiles(self.hand34, self.keys, self.tids, tile_count, None, None, waits_only=True)
+        self.waits = frozenset(tiles) if current == 0 else frozenset()
+
+
+# --- 基准测试 ---
+
+def iter_decisions(xml_content: str) -> Iterator[Tuple[int, HandTracker, List[int]]]:
+    """
+    回放一个牌谱，在每个打牌决策点产出 (座位, 该家的 HandTracker, 可见34)。
+
+    每家在一局内使用同一个 HandTracker，摸打与副露只更新变动的花色，
+    调用方可以直接用 tracker.best_discards(visible34) 评估打法。
+    """
+    trackers: List[HandTracker] = [HandTracker([0] * 34) for _ in range(4)]
+    visible = [0] * 34
+    for element in ET.fromstring(xml_content):
+        tag = element.tag
+        if tag == "INIT":
+            for i in range(4):
+                hai = element.attrib.get(f"hai{i}", "")
+                trackers[i] = HandTracker(to_34_array([int(s) for s in hai.split(',')]) if hai else [0] * 34)
+            visible = [0] * 34
+            visible[int(element.attrib["seed"].split(',')[5]) // 4] += 1
+        elif tag[0] in "TUVW" and tag[1:].isdigit():
+            seat = ord(tag[0]) - ord('T')
+            trackers[seat].add(int(tag[1:]) // 4)
+            yield seat, trackers[seat], visible
+        elif tag[0] in "DEFG" and tag[1:].isdigit():
+            seat = ord(tag[0]) - ord('D')
+            tile = int(tag[1:]) // 4
+            trackers[seat].remove(tile)
+            visible[tile] += 1
+        elif tag == "DORA":
+            visible[int(element.attrib["hai"]) // 4] += 1
+        elif tag == "N":
+            seat = int(element.attrib["who"])
+            m = int(element.attrib["m"])
+            if (m & 0x3F) == 0x20:
+                continue
+            meld = decode_meld(m)
+            for index in meld.exposed:
+                trackers[seat].remove(index // 4)
+                visible[index // 4] += 1
+            if meld.meld_type in (Meld.CHI, Meld.PON):
+                # 被鸣的牌已计入可见张数，吃碰后直接进入打牌决策
+                yield seat, trackers[seat], visible
+
+
+def benchmark_decisions(xml_contents: List[str]) -> Dict[str, float]:
+    """
+    对每个牌谱的全部打牌决策评估打法并计时，返回每个半庄与每个决策的耗时。
+
+    计时包含 XML 解析与手牌回放；各花色的分解表在整个进程内缓存，
+    第一个牌谱的耗时包含建表，语料较多时每局耗时趋于稳定。
+    """
+    decisions = 0
+    games = 0
+    start = time.perf_counter()
+    for xml_content in xml_contents:
+        games += 1
+        for _, tracker, visible34 in iter_decisions(xml_content):
+            if sum(tracker.hand34) % 3 == 2:
+                tracker.best_discards(visible34)
+                decisions += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "games": games,
+        "decisions": decisions,
+        "seconds": elapsed,
+        "ms_per_game": elapsed * 1000 / max(games, 1),
+        "us_per_decision": elapsed * 1e6 / max(decisions, 1),
+    }
+
+
+def main() -> None:
+    """命令行入口：python shanten.py 牌谱XML文件..."""
+    xml_contents = []
+    for path in sys.argv[1:]:
+        with open(path, encoding='utf-8') as f:
+            xml_contents.append(f.read())
+    if not xml_contents:
+        print("用法: python shanten.py 牌谱XML文件...")
+        return
+    result = benchmark_decisions(xml_contents)
+    print(f"牌谱 {result['games']}，决策 {result['decisions']}，"
+          f"每局 {result['ms_per_game']:.1f}ms，每个决策 {result['us_per_decision']:.1f}us")
+
+
+if __name__ == "__main__":
+    main()
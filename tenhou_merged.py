@@ -7,22 +7,24 @@ from enum import Enum
 from typing import Self, Dict, List, Optional, Any, Set
 from copy import deepcopy
 from itertools import combinations, permutations
+from types import MappingProxyType
 from loguru import logger
 
 # --- converter.py ---
-tiles_mjai: list[str] = [
+# 牌表在所有线程间共享，只读
+tiles_mjai: tuple[str, ...] = (
     '1m', '2m', '3m', '4m', '5m', '6m', '7m', '8m', '9m',
     '1p', '2p', '3p', '4p', '5p', '6p', '7p', '8p', '9p',
     '1s', '2s', '3s', '4s', '5s', '6s', '7s', '8s', '9s',
     'E', 'S', 'W', 'N', 'P', 'F', 'C'
-]
+)
 
-tiles_tenhou: dict[str, int] = {
+tiles_tenhou: MappingProxyType[str, int] = MappingProxyType({
     '1m': 0, '2m': 1, '3m': 2, '4m': 3, '5m': 4, '5mr': 4, '6m': 5, '7m': 6, '8m': 7, '9m': 8,
     '1p': 9, '2p': 10, '3p': 11, '4p': 12, '5p': 13, '5pr': 13, '6p': 14, '7p': 15, '8p': 16, '9p': 17,
     '1s': 18, '2s': 19, '3s': 20, '4s': 21, '5s': 22, '5sr': 22, '6s': 23, '7s': 24, '8s': 25, '9s': 26,
     'E': 27, 'S': 28, 'W': 29, 'N': 30, 'P': 31, 'F': 32, 'C': 33
-}
+})
 
 def tenhou_to_mjai_one(index: int) -> str:
     return tenhou_to_mjai([index])[0]
@@ -233,18 +235,119 @@ class Meld:
         else:
             return Meld(target, Meld.DAIMINKAN, h)
 
-def parse_sc_tag(message: dict[str, str]) -> list[int]:
-    sc = [int(s) for s in message['sc'].split(',')]
+def parse_sc_tag(message: TenhouEvent) -> list[int]:
+    sc = message.ints('sc')
     before = sc[0::2]
     delta = sc[1::2]
     after = [(x + y) * 100 for x, y in zip(before, delta)]
     return after
 
-def parse_owari_tag(message: dict[str, str]) -> list[int]:
-    sc = [int(s) for s in message['owari'].split(',')[0::2]]
-    ret = [x * 100 for x in sc]
+def parse_owari_tag(message: TenhouEvent) -> list[int]:
+    sc = message.floats('owari')[0::2]
+    ret = [int(x) * 100 for x in sc]
     return ret
 
+# --- meld_table.py ---
+def _tenhou6_number(label: str) -> int:
+    """mjai 牌名 → tenhou.net/6 数字（11~47，赤五为 51~53）。"""
+    if label[-1] == 'r':
+        return 51 + 'mps'.index(label[1])
+    index = tiles_tenhou[label]
+    return 41 + index - 27 if index >= 27 else (index // 9 + 1) * 10 + index % 9 + 1
+
+def _chi_sort_key(n: int) -> int:
+    # 为了正确排序，将赤宝牌视为普通牌
+    return {51: 15, 52: 25, 53: 35}.get(n, n)
+
+class MeldRecord:
+    """
+    预先解码的副露：牌、mjai 牌名与 tenhou.net/6 副露字符串全部在构造时算好，之后只读。
+
+    call 为以副露者为基准的 tenhou.net/6 字符串（xml_parser 的 _append_call 直接写入单局日志），
+    无法表示时为 None。
+    """
+    __slots__ = ('meld_type', 'target', 'tiles', 'unused', 'r', 'pai', 'consumed', 'exposed', 'call')
+
+    def __init__(self, meld: Meld):
+        self.meld_type: str = meld.meld_type
+        self.target: int = meld.target
+        self.tiles: tuple[int, ...] = tuple(meld.tiles)
+        self.unused: int | None = meld.unused
+        self.r: int | None = meld.r
+        self.pai: str = meld.pai
+        self.consumed: tuple[str, ...] = tuple(meld.consumed)
+        self.exposed: tuple[int, ...] = tuple(meld.exposed)
+        self.call: str | None = self._call_string()
+
+    def _call_string(self) -> str | None:
+        pai = str(_tenhou6_number(self.pai))
+        c = [str(_tenhou6_number(label)) for label in self.consumed]
+        if self.meld_type == Meld.CHI:
+            c = [str(n) for n in sorted((_tenhou6_number(label) for label in self.consumed), key=_chi_sort_key)]
+            return f"c{pai}{c[0]}{c[1]}"
+        if self.meld_type == Meld.PON:
+            # target 为被鸣牌者相对副露者的位置：3 上家，2 对家，1 下家
+            return {3: f"p{pai}{c[0]}{c[1]}", 2: f"{c[0]}p{pai}{c[1]}", 1: f"{c[0]}{c[1]}p{pai}"}.get(self.target)
+        if self.meld_type == Meld.DAIMINKAN:
+            return {3: f"m{pai}{c[0]}{c[1]}{c[2]}", 2: f"{c[0]}m{pai}{c[1]}{c[2]}",
+                    1: f"{c[0]}{c[1]}{c[2]}m{pai}"}.get(self.target)
+        if self.meld_type == Meld.ANKAN:
+            return f"{c[0]}{c[1]}{c[2]}a{c[3]}"
+        all_tiles = c + [pai]
+        return f"{all_tiles[0]}{all_tiles[1]}k{all_tiles[2]}{all_tiles[3]}"
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if hasattr(self, 'call'):
+            raise AttributeError("MeldRecord is read-only")
+        object.__setattr__(self, name, value)
+
+# m 为 16 位整数，按需填充；同一个 m 总是得到等价的记录，多线程下重复填充无害
+_MELD_TABLE: list[MeldRecord | None] = [None] * 0x10000
+
+def decode_meld(m: int) -> MeldRecord:
+    """查表解码副露，首次遇到某个 m 时才调用 Meld.parse_meld。"""
+    record = _MELD_TABLE[m]
+    if record is None:
+        record = _MELD_TABLE[m] = MeldRecord(Meld.parse_meld(m))
+    return record
+
+# --- event.py ---
+class TenhouEvent(dict):
+    """
+    天凤事件：{"tag": 标签, 属性名: 属性字符串, ...}，可以当作普通 dict 使用。
+
+    逗号分隔的数值属性（sc、ten、seed、hai0~3、yaku、owari 等）通过 ints / floats
+    在首次访问时解码为元组，按属性字符串缓存；同一事件中相同的字符串（如 INIT 的 hai 与 hai0）
+    只解码一次，未访问的属性不会被解码。元组是共享的，调用方需要修改时自行复制为列表。
+    """
+    __slots__ = ('_ints', '_floats')
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._ints: dict[str, tuple[int, ...]] = {}
+        self._floats: dict[str, tuple[float, ...]] = {}
+
+    def ints(self, key: str, default: str = "") -> tuple[int, ...]:
+        """把属性解码为整数元组，属性不存在时解码 default。"""
+        value = self.get(key, default)
+        decoded = self._ints.get(value)
+        if decoded is None:
+            decoded = self._ints[value] = tuple(map(int, value.split(','))) if value else ()
+        return decoded
+
+    def floats(self, key: str, default: str = "") -> tuple[float, ...]:
+        """把属性解码为浮点数元组（用于 owari、rate 等含小数的属性）。"""
+        value = self.get(key, default)
+        decoded = self._floats.get(value)
+        if decoded is None:
+            decoded = self._floats[value] = tuple(map(float, value.split(','))) if value else ()
+        return decoded
+
+    def get_int(self, key: str, default: int = 0) -> int:
+        """单个整数属性，例如 who、m、oya。"""
+        value = self.get(key)
+        return int(value) if value is not None else default
+
 # --- state.py ---
 class State:
     def __init__(self, name: str = 'NoName', room: str = '0_0'):
@@ -254,7 +357,7 @@ class State:
         self.hand: list[int] = []
         self.in_riichi: bool = False
         self.live_wall: int | None = None
-        self.melds: list[Meld] = []
+        self.melds: list[MeldRecord] = []
         self.wait: set[int] = set()
         self.last_kawa_tile: str = '?'
         self.is_tsumo: bool = False
@@ -262,7 +365,11 @@ class State:
         self.is_new_round: bool = False
 
 # --- bridge.py ---
+TSUMO_TAG = re.compile(r'^[TUVW]\d*$')
+DAHAI_TAG = re.compile(r'^[DEFGdefg]\d*$')
+
 class TenhouBridge():
+    # 每个 bridge 持有自己的 State，只能在单个线程内使用；多线程转换时每个牌谱新建一个
     def __init__(self):
         self.state = State()
 
@@ -278,15 +385,18 @@ class TenhouBridge():
         except AssertionError:
             logger.warning("Invalid JSON: %s", content)
             return None
+        return self.parse_event(TenhouEvent(message))
 
+    def parse_event(self, message: TenhouEvent) -> None | list[dict]:
+        """直接处理已构造好的事件，省去 JSON 编解码；事件只读，可与其他消费者共享。"""
         tag = message.get("tag")
         if tag == "HELO": return self._convert_helo(message)
         if tag == "REJOIN": return self._convert_rejoin(message)
         if tag == "GO": return self._convert_go(message)
         if tag == "TAIKYOKU": return self._convert_start_game(message)
         if tag == "INIT": return self._convert_start_kyoku(message)
-        if re.match(r'^[TUVW]\d*$', tag): return self._convert_tsumo(message)
-        if re.match(r'^[DEFGdefg]\d*$', tag): return self._convert_dahai(message)
+        if TSUMO_TAG.match(tag): return self._convert_tsumo(message)
+        if DAHAI_TAG.match(tag): return self._convert_dahai(message)
         if tag == 'N' and 'm' in message: return self._convert_meld(message)
         if tag == 'REACH' and message['step'] == '1': return self._convert_reach(message)
         if tag == 'REACH' and message['step'] == '2': return self._convert_reach_accepted(message)
@@ -296,18 +406,18 @@ class TenhouBridge():
         if 'owari' in message: return self._convert_end_game(message)
         return None
     
-    def _convert_helo(self, message: dict) -> list[dict] | None: return None
-    def _convert_rejoin(self, message: dict) -> list[dict] | None: return None
-    def _convert_go(self, message: dict) -> list[dict] | None: return None
+    def _convert_helo(self, message: TenhouEvent) -> list[dict] | None: return None
+    def _convert_rejoin(self, message: TenhouEvent) -> list[dict] | None: return None
+    def _convert_go(self, message: TenhouEvent) -> list[dict] | None: return None
     
-    def _convert_start_game(self, message: dict) -> list[dict] | None:
+    def _convert_start_game(self, message: TenhouEvent) -> list[dict] | None:
         mjai_messages = [{'type': 'start_game', 'id': 0}]
-        self.state.seat = (4-int(message['oya'])) % 4
+        self.state.seat = (4-message.get_int('oya')) % 4
         mjai_messages[0]['id'] = self.state.seat
         return mjai_messages
     
-    def _convert_start_kyoku(self, message: dict) -> list[dict] | None:
-        self.state.hand = [int(s) for s in message['hai'].split(',')]
+    def _convert_start_kyoku(self, message: TenhouEvent) -> list[dict] | None:
+        self.state.hand = list(message.ints('hai'))
         self.state.in_riichi = False
         self.state.live_wall = 70
         self.state.melds.clear()
@@ -316,14 +426,14 @@ class TenhouBridge():
         self.state.is_tsumo = False
         self.state.is_new_round = True
         bakaze_names = ['E', 'S', 'W', 'N']
-        oya = self.rel_to_abs(int(message['oya']))
-        seed = [int(s) for s in message['seed'].split(',')]
+        oya = self.rel_to_abs(message.get_int('oya'))
+        seed = message.ints('seed')
         bakaze = bakaze_names[seed[0] // 4]
         kyoku = seed[0] % 4 + 1
         honba = seed[1]
         kyotaku = seed[2]
         dora_marker = tenhou_to_mjai_one(seed[5])
-        scores = [int(s)*100 for s in message['ten'].split(',')]
+        scores = [s * 100 for s in message.ints('ten')]
         tehais = [['?' for _ in range(13)]] * 4
         tehais[self.state.seat] = tenhou_to_mjai(self.state.hand)
         if bakaze == 'E' and kyoku == 1 and honba == 0:
@@ -337,7 +447,7 @@ class TenhouBridge():
             'kyotaku': kyotaku, 'oya': oya, 'dora_marker': dora_marker, 'scores': scores, 'tehais': tehais
         }]
     
-    def _convert_tsumo(self, message: dict) -> list[dict] | None:
+    def _convert_tsumo(self, message: TenhouEvent) -> list[dict] | None:
         self.state.live_wall -= 1
         tag = message['tag']
         actor = self.rel_to_abs(ord(tag[0]) - ord('T'))
@@ -348,7 +458,7 @@ class TenhouBridge():
         self.state.is_tsumo = True
         return mjai_messages
 
-    def _convert_dahai(self, message: dict) -> list[dict] | None:
+    def _convert_dahai(self, message: TenhouEvent) -> list[dict] | None:
         tag = message['tag']
         actor = self.rel_to_abs(ord(str.upper(tag[0])) - ord('D'))
         if len(tag) == 1:
@@ -365,9 +475,9 @@ class TenhouBridge():
             except ValueError: pass
         return mjai_messages
     
-    def _convert_meld(self, message: dict) -> list[dict] | None:
-        actor = self.rel_to_abs(int(message['who']))
-        m = int(message['m'])
+    def _convert_meld(self, message: TenhouEvent) -> list[dict] | None:
+        actor = self.rel_to_abs(message.get_int('who'))
+        m = message.get_int('m')
         if (m & 0x3F) == 0x20 :
             mjai_messages = [{'type': 'nukidora', 'actor': actor, 'pai': 'N'}]
             if actor == self.state.seat:
@@ -376,12 +486,12 @@ class TenhouBridge():
                         self.state.hand.remove(i)
                         break
             return mjai_messages
-        meld = Meld.parse_meld(m)
+        meld = decode_meld(m)
         if meld.meld_type == Meld.CHI: target = (actor - 1) % 4
         else: target = (actor + meld.target) % 4
         mjai_messages = [{
             'type': meld.meld_type, 'actor': actor, 'target': target,
-            'pai': meld.pai, 'consumed': meld.consumed
+            'pai': meld.pai, 'consumed': list(meld.consumed)
         }]
         if meld.meld_type in [Meld.KAKAN, Meld.ANKAN]: del mjai_messages[0]['target']
         if meld.meld_type == Meld.ANKAN: del mjai_messages[0]['pai']
@@ -392,33 +502,33 @@ class TenhouBridge():
             self.state.melds.append(meld)
         return mjai_messages
     
-    def _convert_reach(self, message: dict) -> list[dict] | None:
-        actor = self.rel_to_abs(int(message['who']))
+    def _convert_reach(self, message: TenhouEvent) -> list[dict] | None:
+        actor = self.rel_to_abs(message.get_int('who'))
         return [{'type': 'reach', 'actor': actor}]
         
-    def _convert_reach_accepted(self, message: dict) -> list[dict] | None:
-        actor = self.rel_to_abs(int(message['who']))
+    def _convert_reach_accepted(self, message: TenhouEvent) -> list[dict] | None:
+        actor = self.rel_to_abs(message.get_int('who'))
         if actor == self.state.seat:
             self.state.in_riichi = True
             self.state.wait = isrh(to_34_array(self.state.hand))
         deltas = [0] * 4
         deltas[actor] = -1000
-        scores = [int(s) * 100 for s in message['ten'].split(',')]
+        scores = [s * 100 for s in message.ints('ten')]
         return [{'type': 'reach_accepted', 'actor': actor, 'deltas': deltas, 'scores': scores}]
     
-    def _convert_dora(self, message: dict) -> list[dict] | None:
-        hai = int(message['hai'])
+    def _convert_dora(self, message: TenhouEvent) -> list[dict] | None:
+        hai = message.get_int('hai')
         dora_marker = tenhou_to_mjai_one(hai)
         return [{'type': 'dora', 'dora_marker': dora_marker}]
 
-    def _convert_hora(self, message: dict) -> list[dict] | None:
+    def _convert_hora(self, message: TenhouEvent) -> list[dict] | None:
         return [{'type': 'end_kyoku'}]
     
-    def _convert_ryukyoku(self, message: dict) -> list[dict] | None:
+    def _convert_ryukyoku(self, message: TenhouEvent) -> list[dict] | None:
         scores = parse_sc_tag(message)
         return [{'type': 'ryukyoku', 'scores': scores}, {'type': 'end_kyoku'}]
     
-    def _convert_end_game(self, message: dict) -> list[dict] | None:
+    def _convert_end_game(self, message: TenhouEvent) -> list[dict] | None:
         return [{'type': 'end_game'}]
 
     def rel_to_abs(self, rel: int) -> int: return (rel + self.state.seat) % 4
@@ -446,7 +556,7 @@ class TenhouBridge():
         for i in state.hand:
             for meld in state.melds:
                 if meld.meld_type == Meld.PON and i // 4 == meld.tiles[0] // 4:
-                    ret.add(tuple(tenhou_to_mjai([i] + meld.tiles)))
+                    ret.add(tuple(tenhou_to_mjai([i, *meld.tiles])))
         return ret
     
     def consumed_pon(self, state: State, index: int) -> set[tuple[str, str]]:
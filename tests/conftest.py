@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import gzip
+import os
+import sys
+import zipfile
+
+import pytest
+
+# 各模块位于仓库根目录，测试直接按模块名导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# 两局的小牌谱：第一局流局，第二局流局并结束对局
+GAME_XML = (
+    '<mjloggm ver="2.3"><GO type="9" lobby="0"/>'
+    '<UN n0="A" n1="B" n2="C" n3="D" dan="8,16,15,12" rate="2234.59,2163.88,2274.24,1786.44" sx="M,F,M,M"/>'
+    '<TAIKYOKU oya="0"/>'
+    '<INIT seed="0,0,0,2,0,108" ten="250,250,250,250" oya="0" '
+    'hai0="14,21,27,29,46,50,53,58,77,82,102,116,131" hai1="6,20,23,32,47,48,54,73,88,95,99,105,107" '
+    'hai2="3,19,22,44,68,75,76,86,91,96,109,119,125" hai3="4,5,17,25,34,43,89,97,98,106,123,124,134"/>'
+    '<T16/><D16/><U118/><E105/><V39/><F39/><W2/><G2/><T59/><D59/><N who="1" m="33223"/><E99/>'
+    '<RYUUKYOKU ba="0,0" sc="250,0,250,0,250,0,250,0"/>'
+    '<INIT seed="1,1,0,4,2,45" ten="250,250,250,250" oya="1" '
+    'hai0="2,9,14,22,23,31,50,55,58,82,99,116,135" hai1="15,18,29,32,35,37,44,52,65,87,120,127,133" '
+    'hai2="1,27,40,47,66,74,77,80,96,105,111,123,125" hai3="7,12,17,19,38,46,54,68,69,70,102,113,129"/>'
+    '<U93/><E93/><V118/><F118/>'
+    '<RYUUKYOKU ba="1,0" sc="250,0,250,0,250,0,250,0" owari="250,5.0,250,-5.0,250,-10.0,250,10.0"/>'
+    '</mjloggm>'
+)
+# 第二局配牌损坏：第一局已被接收端处理后才在解码时出错
+BAD_ATTRIBUTE_XML = GAME_XML.replace('hai0="2,9,14,', 'hai0="2,x,14,')
+
+
+@pytest.fixture
+def damaged_corpus(tmp_path):
+    """
+    含损坏牌谱的语料目录：good.mjlog 正常；bundle.zip 中依次为正常、截断的 gzip、
+    属性损坏与正常的成员；另有一个截断的 cut.mjlog。完整读出的正常牌谱共三个。
+    """
+    data = gzip.compress(GAME_XML.encode("utf-8"))
+    (tmp_path / "good.mjlog").write_bytes(data)
+    (tmp_path / "cut.mjlog").write_bytes(data[:len(data) // 2])
+    with zipfile.ZipFile(tmp_path / "bundle.zip", "w") as zf:
+        zf.writestr("zip-good-1.mjlog", data)
+        zf.writestr("zip-cut.mjlog", data[:len(data) // 2])
+        zf.writestr("zip-bad.mjlog", gzip.compress(BAD_ATTRIBUTE_XML.encode("utf-8")))
+        zf.writestr("zip-good-2.mjlog", data)
+    return tmp_path
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""archive_reader 跳过坏牌谱时的报告方式。"""
+from archive_reader import iter_corpus_results
+
+
+def _fail_with(error):
+    def func(log_id, xml_content):
+        if log_id == "zip-good-1":
+            raise error
+        return log_id
+    return func
+
+
+def test_input_errors_are_reported_without_traceback(damaged_corpus, capsys):
+    ids = [log_id for log_id, _ in iter_corpus_results([str(damaged_corpus)], _fail_with(ValueError("bad tile")))]
+    assert ids == ["zip-bad", "zip-good-2", "good"]
+    err = capsys.readouterr().err
+    assert "解析失败 zip-good-1: ValueError: bad tile" in err
+    assert "解析失败 zip-cut: EOFError" in err
+    assert "Traceback" not in err
+
+
+def test_possible_converter_bugs_print_traceback(damaged_corpus, capsys):
+    ids = [log_id for log_id, _ in iter_corpus_results([str(damaged_corpus)], _fail_with(TypeError("oops")))]
+    assert ids == ["zip-bad", "zip-good-2", "good"]
+    err = capsys.readouterr().err
+    assert "解析失败 zip-good-1: TypeError: oops" in err
+    assert "Traceback" in err and "in func" in err
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""语料工具在损坏的归档成员（截断的 gzip、属性损坏的牌谱）上只跳过该牌谱。"""
+from corpus_stats import GAMES, KYOKU, collect_corpus_stats
+from danger import analyze_corpus
+from event_index import EventIndex, build_index
+from game_results import iter_results
+
+
+def test_corpus_stats_skips_damaged_logs(damaged_corpus):
+    for workers in (1, 2):
+        stats = collect_corpus_stats([str(damaged_corpus)], max_workers=workers)
+        # 属性损坏的牌谱在第二局出错，它的第一局也不计入
+        assert {name: (c[GAMES], c[KYOKU]) for name, c in stats.players.items()} == dict.fromkeys("ABCD", (3, 6))
+
+
+def test_event_index_skips_damaged_logs(damaged_corpus, tmp_path):
+    index_path = str(tmp_path / "corpus.idx")
+    build_index([str(damaged_corpus)], index_path, max_workers=1)
+    with EventIndex(index_path) as index:
+        assert [index.game_id(i) for i in range(index.game_count)] == ["zip-good-1", "zip-good-2", "good"]
+        assert index.round_count == 6
+        # 属性损坏的牌谱第一局已流局，但不会出现在检索结果中
+        assert {log_id for log_id, _ in index.search(["ryuukyoku"])} == {"zip-good-1", "zip-good-2", "good"}
+        assert len(index.search(["player:A"])) == 6
+
+
+def test_game_results_skips_damaged_logs(damaged_corpus):
+    records = list(iter_results([str(damaged_corpus)]))
+    assert len(records) == 3
+    assert all(len(record["rounds"]) == 2 for record in records)
+
+
+def test_danger_analysis_skips_damaged_logs(damaged_corpus):
+    assert analyze_corpus([str(damaged_corpus)])["games"] == 3
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""download_job 对本地替身服务器的测试：续传、限流降速与永久失败。"""
+import collections
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import download_job
+from download_job import DONE, FAILED, PENDING, DownloadJournal, TokenBucket, run_download_job
+
+
+class StandInServer:
+    """
+    模拟天凤下载地址的本地服务器。
+
+    games 中的ID返回对应 XML，其余ID返回 404；failures[ID] 为该ID在返回正文之前
+    依次注入的状态码（如 [429, 503, 500]）。requests 记录每个ID被请求的次数。
+    """
+
+    def __init__(self, games, failures=None, retry_after="0"):
+        self.games = games
+        self.failures = {log_id: list(codes) for log_id, codes in (failures or {}).items()}
+        self.retry_after = retry_after
+        self.requests = collections.Counter()
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/0/log/"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def _handle(self, handler):
+        log_id = handler.path.partition("?")[2]
+        with self._lock:
+            self.requests[log_id] += 1
+            pending = self.failures.get(log_id)
+            status = pending.pop(0) if pending else None
+        if status is None and log_id in self.games:
+            status, body = 200, self.games[log_id].encode("utf-8")
+        else:
+            status, body = status or 404, b""
+        handler.send_response(status)
+        if status in (429, 503):
+            handler.send_header("Retry-After", self.retry_after)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _games(count):
+    return {f"2025010100gm-0009-0000-{i:08x}": f'<mjloggm ver="2.3"><GO type="9" lobby="0"/>{i}</mjloggm>'
+            for i in range(count)}
+
+
+def _journal(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_downloads_and_resumes(tmp_path):
+    games = _games(6)
+    ids = sorted(games)
+    journal_path = str(tmp_path / "job.jsonl")
+    out_dir = str(tmp_path / "xml")
+
+    # 模拟上次运行：前两个已完成，第三个失败过一次，日志末尾是崩溃留下的半行
+    with open(journal_path, "w", encoding="utf-8") as f:
+        for log_id in ids[:2]:
+            f.write(json.dumps({"id": log_id, "state": DONE, "attempts": 1, "ts": 0}) + "\n")
+        f.write(json.dumps({"id": ids[2], "state": FAILED, "attempts": 1, "ts": 0}) + "\n")
+        f.write('{"id": "' + ids[3])
+
+    with StandInServer(games, failures={ids[4]: [500]}) as server:
+        summary = run_download_job(ids, journal_path, out_dir, rate=1000, burst=10,
+                                   base_url=server.base_url)
+        assert summary == {DONE: 4, FAILED: 0, "skipped": 2}
+        assert all(server.requests[log_id] == 0 for log_id in ids[:2])
+        assert server.requests[ids[4]] == 2
+
+        # 再次运行只读日志，不再发出任何请求
+        total = sum(server.requests.values())
+        assert run_download_job(None, journal_path, out_dir, base_url=server.base_url)["skipped"] == 6
+        assert sum(server.requests.values()) == total
+
+    for log_id in ids[2:]:
+        with open(os.path.join(out_dir, f"{log_id}.xml"), encoding="utf-8") as f:
+            assert f.read() == games[log_id]
+    # 半行单独占一行，崩溃之后写入的每条记录都能读回
+    with open(journal_path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert lines[3] == '{"id": "' + ids[3]
+    after = [json.loads(line) for line in lines[4:]]
+    assert sorted(entry["id"] for entry in after if entry["state"] == PENDING) == ids[3:]
+    assert sorted(entry["id"] for entry in after if entry["state"] == DONE) == ids[2:]
+    states = DownloadJournal(journal_path).entries
+    assert {log_id: states[log_id]["state"] for log_id in ids} == dict.fromkeys(ids, DONE)
+    # 跨重启累计尝试次数
+    assert states[ids[2]]["attempts"] == 2
+    assert not [name for name in os.listdir(out_dir) if name.endswith(".part")]
+
+
+def test_throttle_slows_down_without_using_attempts(tmp_path):
+    games = _games(2)
+    ids = sorted(games)
+    journal_path = str(tmp_path / "job.jsonl")
+    # 限流次数超过 max_attempts，仍应最终完成
+    failures = {ids[0]: [429, 503, 429, 429]}
+
+    with StandInServer(games, failures=failures, retry_after="0.05") as server:
+        start = time.monotonic()
+        summary = run_download_job(ids, journal_path, str(tmp_path / "xml"), rate=1000, burst=1,
+                                   max_attempts=2, base_url=server.base_url)
+        elapsed = time.monotonic() - start
+
+    assert summary == {DONE: 2, FAILED: 0, "skipped": 0}
+    assert server.requests[ids[0]] == 5
+    # 每次限流至少暂停 Retry-After 指定的时长
+    assert elapsed >= 4 * 0.05
+    entries = [entry for entry in _journal(journal_path) if entry["id"] == ids[0]]
+    assert [(entry["state"], entry["attempts"]) for entry in entries] == [(PENDING, 0), (DONE, 1)]
+
+
+def test_permanent_404_is_not_retried(tmp_path):
+    games = _games(1)
+    missing = "2025010100gm-0009-0000-deadbeef"
+    journal_path = str(tmp_path / "job.jsonl")
+
+    with StandInServer(games) as server:
+        summary = run_download_job([missing, *games], journal_path, str(tmp_path / "xml"), rate=1000,
+                                   burst=10, max_attempts=5, base_url=server.base_url)
+        assert summary == {DONE: 1, FAILED: 1, "skipped": 0}
+        assert server.requests[missing] == 1
+
+        # 重启后永久失败的ID直接跳过
+        assert run_download_job(None, journal_path, str(tmp_path / "xml"),
+                                base_url=server.base_url)["skipped"] == 2
+        assert server.requests[missing] == 1
+
+    entry = DownloadJournal(journal_path).entries[missing]
+    assert entry["state"] == FAILED and entry["attempts"] == 5 and entry["reason"] == "HTTP 404"
+
+
+def test_token_bucket_backoff_and_recovery():
+    bucket = TokenBucket(rate=8, capacity=1, min_rate=1, backoff=0.5, recovery=0.25)
+    for expected in (4, 2, 1, 1):
+        bucket.slow_down()
+        assert bucket.rate == pytest.approx(expected)
+    for expected in (3, 5, 7, 8, 8):
+        bucket.speed_up()
+        assert bucket.rate == pytest.approx(expected)
+
+    bucket.slow_down(retry_after=0.1)
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.1
+
+
+def test_register_syncs_once(tmp_path, monkeypatch):
+    calls = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(download_job.os, "fsync", lambda fd: (calls.append(fd), real_fsync(fd)))
+
+    journal = DownloadJournal(str(tmp_path / "job.jsonl"))
+    assert journal.register(f"id-{i}" for i in range(1000)) == 1000
+    assert journal.register(["id-0", "id-1000"]) == 1
+    journal.close()
+
+    assert len(calls) == 2
+    assert len(_journal(str(tmp_path / "job.jsonl"))) == 1001
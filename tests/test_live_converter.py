@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""LiveConverter 的增量输出与 TenhouSink 的一次性转换一致。"""
+import xml.etree.ElementTree as ET
+
+from conftest import GAME_XML
+from live_converter import LiveConverter
+from xml_parser import TenhouSink, dispatch_events
+
+
+def test_live_result_matches_tenhou_sink():
+    converter = LiveConverter()
+    header = {}
+    for element in ET.fromstring(GAME_XML):
+        for delta in converter.feed_element(element):
+            if delta[0] == "header":
+                header[delta[1]] = delta[2]
+    expected = dispatch_events(GAME_XML, [TenhouSink()])[0]
+    assert converter.result() == expected
+    # 头部增量按顺序重放后与最终头部一致
+    assert header == {key: expected[key] for key in ("rule", "lobby", "name", "dan", "rate", "sx", "sc")}
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""OutputLayout 的清单追加与索引重建。"""
+import json
+import os
+
+from output_layout import HASH, INDEX_NAME, MANIFEST_NAME, OutputLayout
+
+
+LOG_ID = "2025120632gm-00a9-0000-8f4679af"
+
+
+def test_append_after_torn_manifest_line(tmp_path):
+    layout = OutputLayout(str(tmp_path), HASH)
+    shard_dir = tmp_path / layout.shard(LOG_ID)
+    shard_dir.mkdir(parents=True)
+    # 模拟上次写到一半崩溃：清单与索引都停在半行
+    (shard_dir / MANIFEST_NAME).write_text('{"id": "2025120632gm-00a9-0000-00', encoding="utf-8")
+    (tmp_path / INDEX_NAME).write_text("2025120632gm-00a9-0000-00", encoding="utf-8")
+
+    layout.write_game(LOG_ID, b"{}", [("00_东1局0本场", b"{}")])
+
+    lines = (shard_dir / MANIFEST_NAME).read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[1])["id"] == LOG_ID
+    assert (tmp_path / INDEX_NAME).read_text(encoding="utf-8").splitlines()[1] == LOG_ID
+    assert [entry["id"] for entry in layout.iter_manifest_entries()] == [LOG_ID]
+    assert OutputLayout(str(tmp_path), HASH).exists(LOG_ID)
+
+
+def test_empty_root_defaults_to_current_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    layout = OutputLayout("", HASH)
+    layout.write_game(LOG_ID, b"{}", [])
+    assert layout.rebuild_index() == 1
+    assert os.path.exists(os.path.join(str(tmp_path), INDEX_NAME))
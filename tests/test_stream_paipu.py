@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""stream_paipu_data 边下载边解析时缓存文件（.part）的处理。"""
+import pytest
+
+from test_download_job import StandInServer, _games
+from xml_parser import EventSink, stream_paipu_data
+
+
+class CountingSink(EventSink):
+    def __init__(self):
+        self.events = 0
+
+    def feed(self, tenhou_event, mjai_messages):
+        self.events += 1
+
+    def finish_game(self):
+        return self.events
+
+
+class FailingSink(EventSink):
+    def feed(self, tenhou_event, mjai_messages):
+        raise RuntimeError("sink failure")
+
+
+def _url(log_id):
+    return f"http://tenhou.net/0/?log={log_id}"
+
+
+def test_cache_is_renamed_on_success(tmp_path):
+    games = _games(1)
+    log_id = next(iter(games))
+    cache_path = str(tmp_path / f"{log_id}.xml")
+    with StandInServer(games) as server:
+        results = stream_paipu_data(_url(log_id), [CountingSink()], cache_path, base_url=server.base_url)
+    assert results is not None and results[0] > 0
+    assert (tmp_path / f"{log_id}.xml").read_text(encoding="utf-8") == games[log_id]
+    assert not (tmp_path / f"{log_id}.xml.part").exists()
+
+
+def test_part_file_removed_on_download_failure(tmp_path):
+    cache_path = str(tmp_path / "missing.xml")
+    with StandInServer({}) as server:
+        results = stream_paipu_data(_url("2025010100gm-0009-0000-deadbeef"), [CountingSink()], cache_path,
+                                    base_url=server.base_url)
+    assert results is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_part_file_removed_when_sink_raises(tmp_path):
+    games = _games(1)
+    log_id = next(iter(games))
+    cache_path = str(tmp_path / f"{log_id}.xml")
+    with StandInServer(games) as server:
+        with pytest.raises(RuntimeError):
+            stream_paipu_data(_url(log_id), [FailingSink()], cache_path, base_url=server.base_url)
+    assert list(tmp_path.iterdir()) == []
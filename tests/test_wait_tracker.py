@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""WaitTracker 的增量待牌与 isrh 逐张判定的一致性。"""
+import random
+
+from shanten import WaitTracker, best_discards
+from tenhou_merged import isrh
+
+
+STATES = 15000
+# 每次配牌后的摸打次数，与一局中一家的巡目数相当
+DRAWS_PER_DEAL = 18
+
+
+def _four_pairs(hand34):
+    # isrh 会把副露后 7 张手牌摸成的四对子当作七对子和了；WaitTracker 按规则不计，比较时跳过
+    return sum(hand34) < 13 and all(count in (0, 1, 2) for count in hand34) \
+        and sum(1 for count in hand34 if count == 1) == 1
+
+
+def test_waits_match_isrh_on_random_sequences():
+    rng = random.Random(20251019)
+    checked = 0
+    while checked < STATES:
+        wall = [tile for tile in range(34) for _ in range(4)]
+        rng.shuffle(wall)
+        hand34 = [0] * 34
+        for tile in wall[:13]:
+            hand34[tile] += 1
+        tracker = WaitTracker(hand34)
+        position = 13
+        while position < 13 + DRAWS_PER_DEAL and checked < STATES:
+            draw = wall[position]
+            position += 1
+            tracker.add(draw)
+            held = [tile for tile in range(34) if tracker.hand34[tile]]
+            if sum(tracker.hand34) > 5 and rng.random() < 0.1:
+                # 模拟副露：移出三张（不区分吃碰，WaitTracker 只看剩余手牌）后再打一张
+                for _ in range(3):
+                    tile = rng.choice([tile for tile in range(34) if tracker.hand34[tile]])
+                    tracker.remove(tile)
+                held = [tile for tile in range(34) if tracker.hand34[tile]]
+            # 多数时候按牌效打牌，使状态中有足够多的听牌手牌
+            roll = rng.random()
+            if roll < 0.6:
+                discard = best_discards(tracker.hand34)[0][0]
+            elif roll < 0.8 and tracker.hand34[draw]:
+                discard = draw
+            else:
+                discard = rng.choice(held)
+            tracker.remove(discard)
+            tracker.settle()
+            if _four_pairs(tracker.hand34):
+                continue
+            assert tracker.waits == isrh(list(tracker.hand34)), tracker.hand34
+            checked += 1
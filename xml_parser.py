@@ -1,5 +1,6 @@
 # author：madoka
 # -*- coding: utf-8 -*-
+import argparse
 import xml.etree.ElementTree as ET
 import json
 import copy
@@ -9,24 +10,28 @@ import os
 from loguru import logger
 # from logger import logger
 from urllib.parse import parse_qs, urlparse, unquote
-from typing import Dict, List, Optional, Any
+from types import MappingProxyType
+from typing import Dict, List, Optional, Any, Union, Iterable, Iterator, Mapping, Tuple
 
 # 引用合并后的单一文件
-from tenhou_merged import TenhouBridge, tenhou_to_mjai
+from output_layout import FLAT, LAYOUTS, OutputLayout
+from tenhou_merged import TenhouBridge, TenhouEvent, decode_meld, tenhou_to_mjai
 
 
+# 以下映射表在所有线程间共享，均为只读视图 / 元组
+
 # 麻将牌的字符串表示到数字ID的映射
-mahjong_to_number: Dict[str, int] = {
+mahjong_to_number: Mapping[str, int] = MappingProxyType({
     '1m': 11, '2m': 12, '3m': 13, '4m': 14, '5m': 15, '6m': 16, '7m': 17, '8m': 18, '9m': 19,
     '1p': 21, '2p': 22, '3p': 23, '4p': 24, '5p': 25, '6p': 26, '7p': 27, '8p': 28, '9p': 29,
     '1s': 31, '2s': 32, '3s': 33, '4s': 34, '5s': 35, '6s': 36, '7s': 37, '8s': 38, '9s': 39,
     "E": 41,  "S": 42,  "W": 43,  "N": 44,  "P": 45,  "F": 46,  "C": 47, # 字牌：东南西北白发中
     '5mr': 51, '5pr': 52, '5sr': 53, # 赤宝牌
-}
+})
 
 
 # 天凤役种ID到名称的映射
-YAKU_MAP: Dict[int, str] = {
+YAKU_MAP: Mapping[int, str] = MappingProxyType({
     0: "門前清自摸和", 1: "立直", 2: "一発", 3: "槍槓", 4: "嶺上開花", 5: "海底摸月", 6: "河底撈魚", 7: "平和", 8: "断幺九", 9: "一盃口",
     10: "自風 東", 11: "自風 南", 12: "自風 西", 13: "自風 北", 14: "場風 東", 15: "場風 南", 16: "場風 西", 17: "場風 北",
     18: "役牌 白", 19: "役牌 發", 20: "役牌 中", 21: "両立直", 22: "七対子", 23: "混全帯幺九", 24: "一気通貫", 25: "三色同順",
@@ -34,12 +39,12 @@ YAKU_MAP: Dict[int, str] = {
     36: "人和", 37: "天和", 38: "地和", 39: "大三元", 40: "四暗刻", 41: "四暗刻単騎", 42: "字一色", 43: "緑一色", 44: "清老頭", 45: "九蓮宝燈",
     46: "純正九蓮宝燈", 47: "国士無双", 48: "国士無双１３面", 49: "大四喜", 50: "小四喜", 51: "四槓子",
     52: "ドラ", 53: "裏ドラ", 54: "赤ドラ"
-}
+})
 
-DAN_MAP = [
+DAN_MAP: Tuple[str, ...] = (
     "新人", "９級", "８級", "７級", "６級", "５級", "４級", "３級", "２級", "１級",
     "初段", "二段", "三段", "四段", "五段", "六段", "七段", "八段", "九段", "十段", "天鳳"
-]
+)
 
 def get_rule_disp(go_type: int) -> str:
     """根据 GO type 解析规则描述字符串。"""
@@ -70,14 +75,104 @@ def get_rule_disp(go_type: int) -> str:
     
     return f"{卓}{局}{喰}{赤}{速}"
 
-def _create_agari_description(ten_str: str, yaku_str: Optional[str], yakuman_str: Optional[str], who: int, fromWho: int, oya: int) -> str:
-    """根据和牌信息生成描述字符串。"""
-    ten = [int(i) for i in ten_str.split(',')]
+# 预读牌谱头部时每次喂给解析器的字节数，GO/UN 通常位于前 1KB 内
+HEADER_CHUNK_SIZE = 1024
+
+
+class GameFilter:
+    """
+    基于牌谱头部（GO / UN）的过滤条件，在完整解析之前判断是否需要该牌谱。
+
+    Args:
+        require_bits (int): GO type 中必须为 1 的位，例如 0xA0 表示鳳凰卓。
+        exclude_bits (int): GO type 中必须为 0 的位，例如 0x10 排除三人麻将。
+        rule_disp (Optional[Iterable[str]]): 允许的 get_rule_disp 结果，如 {"鳳南喰赤"}。
+        lobbies (Optional[Iterable[int]]): 允许的大厅编号。
+        players (Optional[Iterable[str]]): 至少包含其中一名玩家（按 UN 中解码后的名字）。
+        min_dan / max_dan (Optional[int]): 所有玩家段位（DAN_MAP 下标）的范围。
+        min_rate / max_rate (Optional[float]): 所有玩家 R 值的范围。
+    """
+
+    def __init__(self, require_bits: int = 0, exclude_bits: int = 0,
+                 rule_disp: Optional[Iterable[str]] = None,
+                 lobbies: Optional[Iterable[int]] = None,
+                 players: Optional[Iterable[str]] = None,
+                 min_dan: Optional[int] = None, max_dan: Optional[int] = None,
+                 min_rate: Optional[float] = None, max_rate: Optional[float] = None):
+        self.require_bits = require_bits
+        self.exclude_bits = exclude_bits
+        self.rule_disp = set(rule_disp) if rule_disp is not None else None
+        self.lobbies = set(lobbies) if lobbies is not None else None
+        self.players = set(players) if players is not None else None
+        self.min_dan = min_dan
+        self.max_dan = max_dan
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+
+    def match_go(self, attributes: Dict[str, str]) -> bool:
+        """根据 GO 元素的属性判断规则与大厅是否符合。"""
+        go_type = int(attributes.get("type", 0))
+        if go_type & self.require_bits != self.require_bits:
+            return False
+        if go_type & self.exclude_bits:
+            return False
+        if self.rule_disp is not None and get_rule_disp(go_type) not in self.rule_disp:
+            return False
+        if self.lobbies is not None and int(attributes.get("lobby", 0)) not in self.lobbies:
+            return False
+        return True
+
+    def match_un(self, attributes: Dict[str, str]) -> bool:
+        """根据 UN 元素的属性判断玩家、段位与 R 值是否符合。"""
+        names = [unquote(attributes.get(f"n{i}", "")) for i in range(4)]
+        seated = [i for i in range(4) if names[i]]
+        if self.players is not None and not self.players.intersection(names[i] for i in seated):
+            return False
+        if self.min_dan is not None or self.max_dan is not None:
+            dans = [int(d) for d in attributes.get("dan", "0,0,0,0").split(",")]
+            for i in seated:
+                if self.min_dan is not None and dans[i] < self.min_dan:
+                    return False
+                if self.max_dan is not None and dans[i] > self.max_dan:
+                    return False
+        if self.min_rate is not None or self.max_rate is not None:
+            rates = [float(r) for r in attributes.get("rate", "0,0,0,0").split(",")]
+            for i in seated:
+                if self.min_rate is not None and rates[i] < self.min_rate:
+                    return False
+                if self.max_rate is not None and rates[i] > self.max_rate:
+                    return False
+        return True
+
+
+def match_header(xml_content: Union[str, bytes], game_filter: GameFilter) -> bool:
+    """
+    只解析牌谱开头直到 GO / UN 出现，判断是否满足过滤条件。
+
+    一旦出现不满足的头部元素（或读到第一局 INIT）就停止，不再读取后续内容。
+    """
+    parser = ET.XMLPullParser(events=("end",))
+    for pos in range(0, len(xml_content), HEADER_CHUNK_SIZE):
+        parser.feed(xml_content[pos:pos + HEADER_CHUNK_SIZE])
+        for _, element in parser.read_events():
+            tag = element.tag
+            if tag == "GO":
+                if not game_filter.match_go(element.attrib):
+                    return False
+            elif tag == "UN":
+                # UN 位于 GO 之后，读到它即可得出结论
+                return game_filter.match_un(element.attrib)
+            elif tag in ("TAIKYOKU", "INIT"):
+                return True
+    return True
+
+def _create_agari_description(ten: Tuple[int, ...], yaku_list: Tuple[int, ...], yakuman_list: Tuple[int, ...], who: int, fromWho: int, oya: int) -> str:
+    """根据和牌信息（已解码的 ten / yaku / yakuman）生成描述字符串。"""
     fu, score, mangan_level = ten[0], ten[1], ten[2]
 
     mangan_map = {1: "満貫", 2: "跳満", 3: "倍満", 4: "三倍満"}
-    if yakuman_str:
-        yakuman_count = len(yakuman_str.split(','))
+    if yakuman_list:
+        yakuman_count = len(yakuman_list)
         if yakuman_count > 1:
             return f"{yakuman_count}倍役満{score}点"
         return f"役満{score}点"
@@ -85,10 +180,9 @@ def _create_agari_description(ten_str: str, yaku_str: Optional[str], yakuman_str
     if mangan_level in mangan_map:
         return f"{mangan_map[mangan_level]}{score}点"
 
-    if not yaku_str:
+    if not yaku_list:
         return f"{fu}符{score}点"
 
-    yaku_list = [int(i) for i in yaku_str.split(',')]
     han = sum(yaku_list[1::2])
 
     if who != fromWho:  # 荣和
@@ -105,7 +199,14 @@ def _create_agari_description(ten_str: str, yaku_str: Optional[str], yakuman_str
 
 # --- mjai 消息处理函数 ---
 
-def _handle_start_kyoku(mjai_message: Dict[str, Any], tenhou_event: Dict[str, Any]) -> List[Any]:
+def kyoku_header(mjai_message: Dict[str, Any]) -> List[int]:
+    """由 `start_kyoku` 消息得到 [场次, 本场数, 场供]。"""
+    chang = mjai_message["oya"]
+    bakaze_map = {"E": 0, "S": 4, "W": 8, "N": 12}
+    chang += bakaze_map.get(mjai_message["bakaze"], 0)
+    return [chang, mjai_message["honba"], mjai_message["kyotaku"]]
+
+def _handle_start_kyoku(mjai_message: Dict[str, Any], tenhou_event: TenhouEvent) -> List[Any]:
     """处理 `start_kyoku` 消息，初始化一局的数据结构。"""
     tenhou_log = [
         [], # 场次，本场数，场供
@@ -126,20 +227,14 @@ def _handle_start_kyoku(mjai_message: Dict[str, Any], tenhou_event: Dict[str, An
         [], # 玩家3打牌
         [], # 和牌信息 16
     ]
-    chang = mjai_message["oya"]
-    bakaze_map = {"E": 0, "S": 4, "W": 8, "N": 12}
-    chang += bakaze_map.get(mjai_message["bakaze"], 0)
-
-    tenhou_log[0] = [chang, mjai_message["honba"], mjai_message["kyotaku"]]
+    tenhou_log[0] = kyoku_header(mjai_message)
     tenhou_log[1] = mjai_message["scores"]
     tenhou_log[2] = [mahjong_to_number[mjai_message["dora_marker"]]]
     tenhou_log[3] = []  # 里宝牌指示牌，初始为空
 
     # 初始化四家手牌
     for i in range(4):
-        hand_str = tenhou_event.get(f"hai{i}", "")
-        hand = [int(s) for s in hand_str.split(',')]
-        hand_mjai = tenhou_to_mjai(hand)
+        hand_mjai = tenhou_to_mjai(tenhou_event.ints(f"hai{i}"))
         tenhou_log[4 + i * 3] = [mahjong_to_number[hai] for hai in hand_mjai]
 
     return tenhou_log
@@ -197,107 +292,33 @@ def _handle_dora(mjai_message: Dict[str, Any], tenhou_log: List[Any]) -> None:
     dora_marker_num = mahjong_to_number[dora_marker]
     tenhou_log[2].append(dora_marker_num)
 
-def _handle_pon(mjai_message: Dict[str, Any], tenhou_log: List[Any]) -> None:
-    """处理 `pon` (碰) 消息。"""
-    actor = mjai_message["actor"]
-    target = mjai_message["target"]
-    pai = mjai_message["pai"]
-    consumed = mjai_message["consumed"]
-
-    pai_num = str(mahjong_to_number[pai])
-    consumed_nums = [str(mahjong_to_number[c]) for c in consumed]
-
-    relative_pos = (target - actor + 4) % 4
-    
-    pon_str = ""
-    if relative_pos == 3:  # 上家
-        pon_str = f"p{pai_num}{consumed_nums[0]}{consumed_nums[1]}"
-    elif relative_pos == 2:  # 对家
-        pon_str = f"{consumed_nums[0]}p{pai_num}{consumed_nums[1]}"
-    elif relative_pos == 1:  # 下家
-        pon_str = f"{consumed_nums[0]}{consumed_nums[1]}p{pai_num}"
-
-    if pon_str:
-        draw_log_indices = {0: 5, 1: 8, 2: 11, 3: 14}
-        if actor in draw_log_indices:
-            tenhou_log[draw_log_indices[actor]].append(pon_str)
-
-def _handle_daiminkan(mjai_message: Dict[str, Any], tenhou_log: List[Any]) -> None:
-    """处理 `daiminkan` (大明杠) 消息。"""
-    actor = mjai_message["actor"]
-    target = mjai_message["target"]
-    pai = mjai_message["pai"]
-    consumed = mjai_message["consumed"]
-
-    pai_num = str(mahjong_to_number[pai])
-    consumed_nums = [str(mahjong_to_number[c]) for c in consumed]
-
-    relative_pos = (target - actor + 4) % 4
-    kan_str = ""
-    if relative_pos == 3:  # 上家
-        kan_str = f"m{pai_num}{consumed_nums[0]}{consumed_nums[1]}{consumed_nums[2]}"
-    elif relative_pos == 2:  # 对家
-        kan_str = f"{consumed_nums[0]}m{pai_num}{consumed_nums[1]}{consumed_nums[2]}"
-    elif relative_pos == 1:  # 下家
-        kan_str = f"{consumed_nums[0]}{consumed_nums[1]}{consumed_nums[2]}m{pai_num}"
-
-    if kan_str:
-        draw_log_indices = {0: 5, 1: 8, 2: 11, 3: 14}
-        discard_log_indices = {0: 6, 1: 9, 2: 12, 3: 15}
-        if actor in draw_log_indices:
-            tenhou_log[draw_log_indices[actor]].append(kan_str)
-            tenhou_log[discard_log_indices[actor]].append(0)
-
-def _handle_ankan(mjai_message: Dict[str, Any], tenhou_log: List[Any]) -> None:
-    """处理 `ankan` (暗杠) 消息。"""
-    actor = mjai_message["actor"]
-    consumed = mjai_message["consumed"]
-    
-    consumed_nums = [str(mahjong_to_number[c]) for c in consumed]
-    ankan_str = f"{consumed_nums[0]}{consumed_nums[1]}{consumed_nums[2]}a{consumed_nums[3]}"
-
-    discard_log_indices = {0: 6, 1: 9, 2: 12, 3: 15}
-    if actor in discard_log_indices:
-        tenhou_log[discard_log_indices[actor]].append(ankan_str)
-
-def _handle_kakan(mjai_message: Dict[str, Any], tenhou_log: List[Any]) -> None:
-    """处理 `kakan` (加杠) 消息。"""
-    actor = mjai_message["actor"]
-    pai = mjai_message["pai"]
-    consumed = mjai_message["consumed"]
-
-    pai_num = str(mahjong_to_number[pai])
-    consumed_nums = [str(mahjong_to_number[c]) for c in consumed]
-    
-    all_tiles = consumed_nums + [pai_num]
-    kakan_str = f"{all_tiles[0]}{all_tiles[1]}k{all_tiles[2]}{all_tiles[3]}"
+# 副露类型 → (是否写入摸牌列, 是否写入舍牌列)
+MELD_COLUMNS = MappingProxyType({
+    "chi": (True, False),
+    "pon": (True, False),
+    "daiminkan": (True, True),
+    "ankan": (False, True),
+    "kakan": (False, True),
+})
 
-    discard_log_indices = {0: 6, 1: 9, 2: 12, 3: 15}
-    if actor in discard_log_indices:
-        tenhou_log[discard_log_indices[actor]].append(kakan_str)
+def _append_call(mjai_message: Dict[str, Any], call: Optional[str], tenhou_log: List[Any]) -> None:
+    """
+    追加预先算好的副露字符串（MeldRecord.call），所有副露都经由这里写入单局日志。
 
-def _handle_chi(mjai_message: Dict[str, Any], tenhou_log: List[Any]) -> None:
-    """处理 `chi` (吃) 消息。"""
+    大明杠在摸牌列写副露字符串、在舍牌列补 0；暗杠与加杠只写舍牌列。
+    """
     actor = mjai_message["actor"]
-    pai = mjai_message["pai"]
-    consumed = mjai_message["consumed"]
-
-    pai_num = str(mahjong_to_number[pai])
-    
-    # 为了正确排序，将赤宝牌视为普通牌
-    sort_key = lambda n: {51: 15, 52: 25, 53: 35}.get(n, n)
-    consumed_nums = sorted([mahjong_to_number[c] for c in consumed], key=sort_key)
-    
-    consumed_pai1_num = str(consumed_nums[0])
-    consumed_pai2_num = str(consumed_nums[1])
-
-    chi_str = f"c{pai_num}{consumed_pai1_num}{consumed_pai2_num}"
-
-    draw_log_indices = {0: 5, 1: 8, 2: 11, 3: 14}
-    if actor in draw_log_indices:
-        tenhou_log[draw_log_indices[actor]].append(chi_str)
-
-def _handle_agari(tenhou_event: Dict[str, Any], tenhou_log: Optional[List[Any]], tenhou_logs: List[List[Any]]) -> None:
+    if call is None or not 0 <= actor <= 3:
+        return
+    to_draw, to_discard = MELD_COLUMNS[mjai_message["type"]]
+    if to_draw:
+        tenhou_log[5 + actor * 3].append(call)
+        if to_discard:
+            tenhou_log[6 + actor * 3].append(0)
+    elif to_discard:
+        tenhou_log[6 + actor * 3].append(call)
+
+def _handle_agari(tenhou_event: TenhouEvent, tenhou_log: Optional[List[Any]], tenhou_logs: List[List[Any]]) -> None:
     """处理 `AGARI` (和牌) 事件, 包括一炮多响。"""
     
     active_log = tenhou_log
@@ -313,17 +334,19 @@ def _handle_agari(tenhou_event: Dict[str, Any], tenhou_log: Optional[List[Any]],
         # 如果仍然没有有效的日志，则忽略此事件（可能发生在文件开头或其他错误情况）
         return
 
-    sc_list = [int(s) for s in tenhou_event['sc'].split(',')]
+    sc_list = tenhou_event.ints('sc')
     score_changes = [sc_list[i] * 100 for i in range(1, 8, 2)]
 
-    who = int(tenhou_event['who'])
-    from_who = int(tenhou_event['fromWho'])
+    who = tenhou_event.get_int('who')
+    from_who = tenhou_event.get_int('fromWho')
     oya = active_log[0][0] % 4
 
+    yaku_list = tenhou_event.ints('yaku')
+    yakuman_list = tenhou_event.ints('yakuman')
     description = _create_agari_description(
-        tenhou_event['ten'],
-        tenhou_event.get('yaku'),
-        tenhou_event.get('yakuman'),
+        tenhou_event.ints('ten'),
+        yaku_list,
+        yakuman_list,
         who,
         from_who,
         oya
@@ -331,23 +354,16 @@ def _handle_agari(tenhou_event: Dict[str, Any], tenhou_log: Optional[List[Any]],
 
     agari_info = [who, from_who, who, description]
 
-    # 解析并添加役种详情
-    yaku_list_str = tenhou_event.get('yaku')
-    if yaku_list_str:
-        yaku_list = yaku_list_str.split(',')
-        for i in range(0, len(yaku_list), 2):
-            yaku_id = int(yaku_list[i])
-            han = int(yaku_list[i+1])
-            yaku_name = YAKU_MAP.get(yaku_id, f"不明な役{yaku_id}")
-            agari_info.append(f"{yaku_name}({han}飜)")
-
-    yakuman_list_str = tenhou_event.get('yakuman')
-    if yakuman_list_str:
-        yakuman_list = yakuman_list_str.split(',')
-        for y_id in yakuman_list:
-            yaku_id = int(y_id)
-            yaku_name = YAKU_MAP.get(yaku_id, f"不明な役満{yaku_id}")
-            agari_info.append(yaku_name)
+    # 添加役种详情
+    for i in range(0, len(yaku_list), 2):
+        yaku_id = yaku_list[i]
+        han = yaku_list[i+1]
+        yaku_name = YAKU_MAP.get(yaku_id, f"不明な役{yaku_id}")
+        agari_info.append(f"{yaku_name}({han}飜)")
+
+    for yaku_id in yakuman_list:
+        yaku_name = YAKU_MAP.get(yaku_id, f"不明な役満{yaku_id}")
+        agari_info.append(yaku_name)
 
     # 如果是多响情况，或当前日志已记录了和牌信息
     if is_multi_ron_case or (active_log[16] and active_log[16][0] == "和了"):
@@ -360,7 +376,7 @@ def _handle_agari(tenhou_event: Dict[str, Any], tenhou_log: Optional[List[Any]],
         # 记录第一次和牌
         active_log[16] = ["和了", score_changes, agari_info]
 
-def _handle_ryuukyoku(tenhou_event: Dict[str, Any], tenhou_log: List[Any]) -> None:
+def _handle_ryuukyoku(tenhou_event: TenhouEvent, tenhou_log: List[Any]) -> None:
     """处理 `RYUUKYOKU` (流局) 事件。"""
     if tenhou_log is None:
         return
@@ -376,13 +392,13 @@ def _handle_ryuukyoku(tenhou_event: Dict[str, Any], tenhou_log: List[Any]) -> No
             'kan4': "四槓散了",
         }
         if ryuukyoku_type == 'nm':  # 流し満貫
-            sc_list = [int(s) for s in tenhou_event['sc'].split(',')]
+            sc_list = tenhou_event.ints('sc')
             score_changes = [sc_list[i] * 100 for i in range(1, 8, 2)]
             tenhou_log[16] = ["流し満貫", score_changes]
         elif ryuukyoku_type in special_draw_map:
             tenhou_log[16] = [special_draw_map[ryuukyoku_type]]
         else: # Fallback for other types
-            sc_list = [int(s) for s in tenhou_event['sc'].split(',')]
+            sc_list = tenhou_event.ints('sc')
             score_changes = [sc_list[i] * 100 for i in range(1, 8, 2)]
             tenhou_log[16] = ["流局", score_changes]
     else:
@@ -395,167 +411,315 @@ def _handle_ryuukyoku(tenhou_event: Dict[str, Any], tenhou_log: List[Any]) -> No
         elif num_tenpai == 0:
             tenhou_log[16] = ["全員不聴"]
         else:
-            sc_list = [int(s) for s in tenhou_event['sc'].split(',')]
+            sc_list = tenhou_event.ints('sc')
             score_changes = [sc_list[i] * 100 for i in range(1, 8, 2)]
             tenhou_log[16] = ["流局", score_changes]
 
 
 # --- 主解析逻辑 ---
 
-def parse_tenhou_xml_to_mjai(xml_content: str, log_id: str = "") -> Dict[str, Any]:
+def iter_tenhou_events(root: Iterable[ET.Element], bridge: Optional[TenhouBridge] = None) -> Iterator[Tuple[TenhouEvent, List[Dict[str, Any]]]]:
     """
-    将天凤XML牌谱内容解析为Mortal/Akasaka分析器所需的JSON格式。
+    逐个遍历 XML 元素，产出天凤事件及 bridge 由其生成的 mjai 消息。
+
+    事件直接交给 bridge.parse_event，不再经过 JSON 编解码；数值属性由各消费者
+    通过 TenhouEvent.ints 等按需解码，同一事件内只解码一次。
 
     Args:
-        xml_content (str): 从天凤下载的原始XML字符串。
-        log_id (str): 牌谱ID。
+        root (Iterable[ET.Element]): 牌谱根元素（或任意元素序列）。
+        bridge (Optional[TenhouBridge]): 复用的 bridge，默认新建。
 
     Returns:
-        Dict[str, Any]: 包含牌谱标题、名称、规则和详细日志的字典。
+        Iterator[Tuple[TenhouEvent, List[Dict[str, Any]]]]: (天凤事件, mjai 消息列表)。
     """
-    logs: Dict[str, Any] = {
-        "ver": 2.3,
-        "ref": log_id,
-        "ratingc": "PF4",
-        "title": ["", ""],
-        "name": None,
-        "rule": {
-            "disp": "",    
-            "aka53": 1,
-            "aka52": 1,
-            "aka51": 1
-        },
-        "lobby": 0,
-        "dan": [],
-        "rate": [],
-        "sx": [],
-        "sc": [],
-        "log": None,
-    }
+    if bridge is None:
+        bridge = TenhouBridge()
 
-    root = ET.fromstring(xml_content)
-    
-    # 提取全局信息
-    last_settlement = None
     for element in root:
-        if element.tag == "GO":
-            go_type = int(element.attrib.get("type", 0))
-            logs["rule"]["disp"] = get_rule_disp(go_type)
-            logs["lobby"] = int(element.attrib.get("lobby", 0))
-        elif element.tag == "UN":
-            logs["name"] = [unquote(element.attrib.get(f"n{i}", "")) for i in range(4)]
-            logs["dan"] = [DAN_MAP[int(d)] for d in element.attrib.get("dan", "0,0,0,0").split(",")]
-            logs["rate"] = [float(r) for r in element.attrib.get("rate", "0,0,0,0").split(",")]
-            logs["sx"] = element.attrib.get("sx", "M,M,M,M").split(",")
-        elif element.tag in ["AGARI", "RYUUKYOKU"]:
-            last_settlement = element
-
-    if last_settlement is not None and "owari" in last_settlement.attrib:
-        owari_data = last_settlement.attrib["owari"].split(",")
+        tag = element.tag
+        tenhou_event = TenhouEvent({"tag": tag, **element.attrib})
+
+        if tag == "INIT":
+            # bridge 以 hai 作为自家手牌；与 hai0 是同一个字符串，解码结果也共用
+            tenhou_event["hai"] = tenhou_event.get("hai0", "")
+
+        mjai_messages = bridge.parse_event(tenhou_event)
+
+        # 调试日志，输出 tenhou_event 和 mjai_messages
+        # logger.debug(f"tenhou_event: {tenhou_event}")
+        # logger.debug(f"mjai_messages: {mjai_messages}")
+
+        yield tenhou_event, mjai_messages or []
+
+
+# --- 事件总线 ---
+
+class EventSink:
+    """
+    事件接收端协议：每个 XML 元素及其 mjai 消息只解析一次，依次分发给所有接收端。
+
+    子类实现 feed，按需覆盖 start_game / finish_game。
+    """
+
+    def start_game(self, log_id: str = "") -> None:
+        """开始一个新牌谱。"""
+
+    def feed(self, tenhou_event: TenhouEvent, mjai_messages: List[Dict[str, Any]]) -> None:
+        """处理一个天凤事件及其对应的 mjai 消息。接收端之间共享这两个对象，不得修改。"""
+        raise NotImplementedError
+
+    def finish_game(self) -> Any:
+        """牌谱结束，返回该接收端的结果。"""
+        return None
+
+
+def dispatch_events(xml_content: Union[str, bytes], sinks: List[EventSink], log_id: str = "",
+                    game_filter: Optional[GameFilter] = None) -> Optional[List[Any]]:
+    """
+    解析一次 XML，把事件分发给所有接收端。
+
+    Args:
+        xml_content (Union[str, bytes]): 牌谱 XML。
+        sinks (List[EventSink]): 接收端列表，按顺序收到每个事件。
+        log_id (str): 牌谱ID。
+        game_filter (Optional[GameFilter]): 头部过滤条件，不满足时不解析正文并返回 None。
+
+    Returns:
+        Optional[List[Any]]: 各接收端 finish_game 的返回值，与 sinks 顺序一致。
+    """
+    if game_filter is not None and not match_header(xml_content, game_filter):
+        return None
+    return dispatch_elements(ET.fromstring(xml_content), sinks, log_id)
+
+
+def dispatch_elements(elements: Iterable[ET.Element], sinks: List[EventSink], log_id: str = "") -> List[Any]:
+    """把元素序列（根元素或增量解析器产出的元素）分发给所有接收端，返回各自的结果。"""
+    for sink in sinks:
+        sink.start_game(log_id)
+    feeds = [sink.feed for sink in sinks]
+    for tenhou_event, mjai_messages in iter_tenhou_events(elements):
+        for feed in feeds:
+            feed(tenhou_event, mjai_messages)
+    return [sink.finish_game() for sink in sinks]
+
+
+def iter_xml_elements(chunks: Iterable[bytes]) -> Iterator[ET.Element]:
+    """
+    增量解析字节块，逐个产出根元素的直接子元素。
+
+    已产出的元素会从根元素上摘除，内存中只保留当前元素与解析器的缓冲。
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    depth = 0
+    root = None
+
+    def drain() -> Iterator[ET.Element]:
+        nonlocal depth, root
+        for event, element in parser.read_events():
+            if event == "start":
+                depth += 1
+                if depth == 1:
+                    root = element
+            else:
+                depth -= 1
+                if depth == 1:
+                    yield element
+                    root.remove(element)
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from drain()
+    parser.close()
+    yield from drain()
+
+
+def header_updates(tenhou_event: TenhouEvent, rule: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    """
+    天凤事件带来的头部字段更新，TenhouSink 与 live_converter 共用。
+
+    Args:
+        tenhou_event (TenhouEvent): 天凤事件。
+        rule (Dict[str, Any]): 当前的 "rule" 字段，GO 只改写其中的 "disp"。
+
+    Returns:
+        List[Tuple[str, Any]]: 按顺序的 (键, 新值)，与该事件无关时为空列表。
+    """
+    tag = tenhou_event["tag"]
+    if tag == "GO":
+        return [("rule", {**rule, "disp": get_rule_disp(tenhou_event.get_int("type"))}),
+                ("lobby", tenhou_event.get_int("lobby"))]
+    if tag == "UN":
+        # 断线重连时 UN 会再次出现，以最后一次为准
+        return [("name", [unquote(tenhou_event.get(f"n{i}", f'玩家{i}')) for i in range(4)]),
+                ("dan", [DAN_MAP[d] for d in tenhou_event.ints("dan", "0,0,0,0")]),
+                ("rate", list(tenhou_event.floats("rate", "0,0,0,0"))),
+                ("sx", tenhou_event.get("sx", "M,M,M,M").split(","))]
+    if tag in ("AGARI", "RYUUKYOKU") and "owari" in tenhou_event:
+        # 终局点数取自带 owari 的和了 / 流局事件
         # owari 格式为 [点数0, 变动0, 点数1, 变动1, ...]
         # 目标格式为 [终局点数0*100, 变动0, 终局点数1*100, 变动1, ...]
         sc = []
+        owari_data = tenhou_event.floats("owari")
         for i in range(0, len(owari_data), 2):
             sc.append(int(owari_data[i]) * 100)
-            sc.append(float(owari_data[i+1]))
-        logs["sc"] = sc
+            sc.append(owari_data[i+1])
+        return [("sc", sc)]
+    return []
 
-    bridge = TenhouBridge()
 
-    tenhou_logs: List[List[Any]] = []
-    tenhou_log: Optional[List[Any]] = None
+class TenhouSink(EventSink):
+    """由 _handle_* 组成的 tenhou.net/6 输出端。"""
 
     # 消息类型到处理函数的分发字典
-    message_handlers = {
+    MESSAGE_HANDLERS = MappingProxyType({
         "tsumo": _handle_tsumo,
         "dahai": _handle_dahai,
         "reach": _handle_reach,
         "dora": _handle_dora,
-        "pon": _handle_pon,
-        "daiminkan": _handle_daiminkan,
-        "ankan": _handle_ankan,
-        "kakan": _handle_kakan,
-        "chi": _handle_chi,
-    }
+    })
+
+    # 结束当前局的消息类型
+    END_TYPES = frozenset({"end_kyoku", "end_game", "ryukyoku"})
+
+    def __init__(self):
+        self.start_game()
+
+    def start_game(self, log_id: str = "") -> None:
+        self.logs: Dict[str, Any] = {
+            "ver": 2.3,
+            "ref": log_id,
+            "ratingc": "PF4",
+            "title": ["", ""],
+            "name": None,
+            "rule": {
+                "disp": "",    
+                "aka53": 1,
+                "aka52": 1,
+                "aka51": 1
+            },
+            "lobby": 0,
+            "dan": [],
+            "rate": [],
+            "sx": [],
+            "sc": [],
+            "log": None,
+        }
+        self.tenhou_logs: List[List[Any]] = []
+        self.tenhou_log: Optional[List[Any]] = None
 
-    for element in root:
-        tag = element.tag
-        attributes = element.attrib
-        tenhou_event = {"tag": tag, **attributes}
+    def feed(self, tenhou_event: TenhouEvent, mjai_messages: List[Dict[str, Any]]) -> None:
+        self._feed_event(tenhou_event)
+        if not mjai_messages:
+            return
 
-        if tag == "INIT":
-            tenhou_event["hai"] = copy.deepcopy(tenhou_event.get(f"hai0", ""))
+        tag = tenhou_event["tag"]
+        # 日志会引用消息中的列表，复制后再处理，避免与其他接收端及 bridge 共享
+        mjai_messages = copy.deepcopy(mjai_messages)
+        for mjai_message in mjai_messages:
+            if not mjai_message:
+                continue
 
-        if tag == "UN":
-            logs["name"] = [unquote(tenhou_event.get(f"n{i}", f'玩家{i}')) for i in range(4)]
+            msg_type = mjai_message.get("type")
 
+            if msg_type == "start_kyoku":
+                self.tenhou_log = _handle_start_kyoku(mjai_message, tenhou_event)
+            elif msg_type in MELD_COLUMNS and tag == "N" and self.tenhou_log is not None:
+                # 副露字符串已在解码表中按副露者视角算好，直接查表追加
+                _append_call(mjai_message, decode_meld(tenhou_event.get_int("m")).call, self.tenhou_log)
+            elif msg_type in self.MESSAGE_HANDLERS and self.tenhou_log is not None:
+                handler = self.MESSAGE_HANDLERS[msg_type]
+                handler(mjai_message, self.tenhou_log)
+            elif msg_type in self.END_TYPES and self.tenhou_log is not None:
+                self._close_kyoku()
+
+    def _close_kyoku(self) -> None:
+        if self.tenhou_log:
+            self.tenhou_logs.append(self.tenhou_log)
+            self.tenhou_log = None  # 重置当前局日志
+
+    def _feed_event(self, tenhou_event: TenhouEvent) -> None:
+        """处理头部（GO / UN / owari）与和了 / 流局这类直接取自天凤事件的字段。"""
+        for key, value in header_updates(tenhou_event, self.logs["rule"]):
+            self.logs[key] = value
+
+        tag = tenhou_event["tag"]
         if tag == "AGARI":
-            _handle_agari(tenhou_event, tenhou_log, tenhou_logs)
+            _handle_agari(tenhou_event, self.tenhou_log, self.tenhou_logs)
 
         if tag == "RYUUKYOKU":
-            _handle_ryuukyoku(tenhou_event, tenhou_log)
+            _handle_ryuukyoku(tenhou_event, self.tenhou_log)
 
-        json_event_bytes = json.dumps(tenhou_event).encode('utf-8')
-        mjai_messages = bridge.parse(json_event_bytes)
-        
-        # 调试日志，输出 tenhou_event 和 mjai_messages
-        # logger.debug(f"tenhou_event: {tenhou_event}")
-        # logger.debug(f"mjai_messages: {mjai_messages}")
+    def finish_game(self) -> Dict[str, Any]:
+        self.logs['log'] = self.tenhou_logs
+        return self.logs
 
-        if not mjai_messages:
-            continue
-        
-        mjai_messages = copy.deepcopy(mjai_messages)
-        for mjai_message in mjai_messages:
-            if not mjai_message:
-                continue
 
-            msg_type = mjai_message.get("type")
+def parse_tenhou_xml_to_mjai(xml_content: Union[str, bytes], log_id: str = "",
+                             game_filter: Optional[GameFilter] = None) -> Optional[Dict[str, Any]]:
+    """
+    将天凤XML牌谱内容解析为Mortal/Akasaka分析器所需的JSON格式。
 
-            if msg_type == "start_kyoku":
-                tenhou_log = _handle_start_kyoku(mjai_message, tenhou_event)
-            elif msg_type in message_handlers and tenhou_log is not None:
-                handler = message_handlers[msg_type]
-                handler(mjai_message, tenhou_log)
-            elif msg_type in ["end_kyoku", "end_game", "ryukyoku"] and tenhou_log is not None:
-                if tenhou_log:
-                    tenhou_logs.append(tenhou_log)
-                    tenhou_log = None  # 重置当前局日志
-
-    logs['log'] = tenhou_logs
-    return logs
+    Args:
+        xml_content (Union[str, bytes]): 从天凤下载的原始XML字符串（或UTF-8字节）。
+        log_id (str): 牌谱ID。
+        game_filter (Optional[GameFilter]): 头部过滤条件，不满足时只读取头部即返回 None。
+
+    Returns:
+        Optional[Dict[str, Any]]: 包含牌谱标题、名称、规则和详细日志的字典。
+    """
+    results = dispatch_events(xml_content, [TenhouSink()], log_id, game_filter)
+    return results[0] if results is not None else None
+
+# 逐局产出时每次送入增量解析器的字符数
+KYOKU_FEED_SIZE = 4096
+
+
+def iter_kyoku(xml_content: Union[str, bytes], log_id: str = "",
+               game_filter: Optional[GameFilter] = None) -> Iterator[Union[Dict[str, Any], List[Any]]]:
+    """
+    逐局解析牌谱：先产出头部字典，再依次产出每一局的 tenhou.net/6 日志。
+
+    一局在 end_kyoku / ryukyoku 时结束，但一炮多响的后续 AGARI 仍会追加到这一局，
+    因此每局在下一局开始（或牌谱结束）时才产出。XML 分块送入增量解析器，
+    已处理的元素与已产出的局都会被释放，消费方可以随时停止。
+
+    头部与 parse_tenhou_xml_to_mjai 的结果相同但 "log" 为 None；
+    "sc"（终局点数）来自最后的和了 / 流局，生成器结束时才会写入同一个头部字典。
+
+    Args:
+        xml_content (Union[str, bytes]): 牌谱 XML。
+        log_id (str): 牌谱ID。
+        game_filter (Optional[GameFilter]): 头部过滤条件，不满足时不产出任何内容。
+
+    Returns:
+        Iterator[Union[Dict[str, Any], List[Any]]]: 头部字典，随后为各局日志。
+    """
+    if game_filter is not None and not match_header(xml_content, game_filter):
+        return
+
+    chunks = (xml_content[i:i + KYOKU_FEED_SIZE] for i in range(0, len(xml_content), KYOKU_FEED_SIZE))
+    sink = TenhouSink()
+    sink.start_game(log_id)
+    header_sent = False
+    for tenhou_event, mjai_messages in iter_tenhou_events(iter_xml_elements(chunks)):
+        if any(message and message.get("type") == "start_kyoku" for message in mjai_messages):
+            if not header_sent:
+                header_sent = True
+                yield sink.logs
+            # 上一局不会再有一炮多响的追加，可以交出并释放
+            while sink.tenhou_logs:
+                yield sink.tenhou_logs.pop(0)
+        sink.feed(tenhou_event, mjai_messages)
+
+    if not header_sent:
+        yield sink.logs
+    while sink.tenhou_logs:
+        yield sink.tenhou_logs.pop(0)
 
 # --- 网络与文件处理 ---
 
-def save_split_rounds(logs: Dict[str, Any], folder_path: str) -> None:
-    """将整个牌谱拆分为各个小局并保存。"""
-    kaze_names = ["东", "南", "西", "北"]
-    
-    for log_entry in logs['log']:
-        round_index = log_entry[0][0]
-        honba_index = log_entry[0][1]
-        
-        kaze_idx = round_index // 4
-        kyoku_idx = (round_index % 4) + 1
-        
-        # 生成文件名：例如 "东1局" 或 "东1局1本场"
-        filename = f"{kaze_names[kaze_idx]}{kyoku_idx}局"
-        if honba_index > 0:
-            filename += f"{honba_index}本场"
-        
-        round_data = {
-            "title": logs["title"],
-            "name": logs["name"],
-            "rule": logs["rule"],
-            "log": [log_entry]
-        }
-        
-        file_path = os.path.join(folder_path, f"{filename}.json")
-        try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(round_data, f, ensure_ascii=False, separators=(',', ':'))
-        except IOError as e:
-            print(f"保存小局 {filename} 失败: {e}")
+# 牌谱下载地址，可替换为本地镜像或测试服务器
+DOWNLOAD_BASE_URL = "https://tenhou.net/0/log/"
 
 def extract_log_id(url: str) -> Optional[str]:
     """从天凤URL中提取牌谱ID。"""
@@ -563,12 +727,12 @@ def extract_log_id(url: str) -> Optional[str]:
     params = parse_qs(parsed.query)
     return params.get('log', [None])[0]
 
-def build_download_url(original_url: str) -> Optional[str]:
+def build_download_url(original_url: str, base_url: str = DOWNLOAD_BASE_URL) -> Optional[str]:
     """构建用于下载牌谱的直接URL。"""
     log_id = extract_log_id(original_url)
     if not log_id:
         return None
-    return f"https://tenhou.net/0/log/?{log_id}"
+    return f"{base_url}?{log_id}"
 
 def get_headers(referer: str) -> Dict[str, str]:
     """构造请求头，模拟浏览器行为。"""
@@ -607,68 +771,223 @@ def download_paipu_data(original_url: str) -> Optional[str]:
         print(f"下载失败 {original_url}: {str(e)}")
         return None
 
+def stream_paipu_data(original_url: str, sinks: List[EventSink], cache_path: Optional[str] = None,
+                      session: Optional[requests.Session] = None, base_url: str = DOWNLOAD_BASE_URL,
+                      timeout: float = 10, chunk_size: int = 65536) -> Optional[List[Any]]:
+    """
+    边下载边解析：把（已解除 gzip 的）响应体逐块送入增量 XML 解析器并分发给接收端。
+
+    解析与传输重叠，完整的 XML 文本不会整体驻留内存。
+
+    Args:
+        original_url (str): 天凤牌谱URL。
+        sinks (List[EventSink]): 接收端列表。
+        cache_path (Optional[str]): 同时把原始 XML 字节写入该文件（先写 .part，成功后改名）。
+        session (Optional[requests.Session]): 复用的 HTTP 会话。
+        base_url (str): 下载地址，可指向本地测试服务器。
+        timeout (float): 连接与读取超时秒数。
+        chunk_size (int): 单次交给解析器的最大字节数。
+
+    Returns:
+        Optional[List[Any]]: 各接收端 finish_game 的返回值；下载或解析失败时为 None。
+    """
+    download_url = build_download_url(original_url, base_url)
+    if not download_url:
+        print(f"无效URL: {original_url}")
+        return None
+
+    cache_file = open(cache_path + ".part", 'wb') if cache_path else None
+    results = None
+    try:
+        with (session or requests).get(download_url, headers=get_headers(original_url),
+                                       timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            chunks = _iter_body(response, chunk_size)
+            if cache_file is not None:
+                chunks = _tee_chunks(chunks, cache_file)
+            results = dispatch_elements(iter_xml_elements(chunks), sinks, extract_log_id(original_url) or "")
+    except requests.RequestException as e:
+        print(f"下载失败 {original_url}: {str(e)}")
+    except ET.ParseError as e:
+        print(f"解析失败 {original_url}: {e}")
+    finally:
+        # 接收端抛出的其他异常照常向上传播，但不能留下 .part 文件
+        if cache_file is not None:
+            cache_file.close()
+            if results is not None:
+                os.replace(cache_path + ".part", cache_path)
+            else:
+                os.remove(cache_path + ".part")
+    return results
+
+
+def _iter_body(response: requests.Response, chunk_size: int) -> Iterator[bytes]:
+    """
+    按到达顺序产出解压后的响应体。
+
+    iter_content 在有 Content-Length 时会凑满 chunk_size 才返回，无法与解析重叠；
+    urllib3 提供 read1 时改用它，有多少数据就先交出多少。
+    """
+    raw = response.raw
+    if not hasattr(raw, "read1"):
+        yield from response.iter_content(chunk_size)
+        return
+    while True:
+        chunk = raw.read1(chunk_size, decode_content=True)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _tee_chunks(chunks: Iterable[bytes], f) -> Iterator[bytes]:
+    for chunk in chunks:
+        f.write(chunk)
+        yield chunk
+
 # --- 主程序入口 ---
 
-def save_split_rounds(logs: Dict[str, Any], folder_path: str) -> None:
-    """将整个牌谱拆分为各个小局并保存。"""
-    kaze_names = ["东", "南", "西", "北"]
-    
-    for log_entry in logs['log']:
-        round_index = log_entry[0][0]
-        honba_index = log_entry[0][1]
-        
-        kaze_idx = round_index // 4
-        kyoku_idx = (round_index % 4) + 1
-        
-        # 生成文件名：例如 "东1局" 或 "东1局1本场"
-        filename = f"{kaze_names[kaze_idx]}{kyoku_idx}局"
-        if honba_index > 0:
-            filename += f"{honba_index}本场"
-        
-        round_data = {
-            "title": logs["title"],
-            "name": logs["name"],
-            "rule": logs["rule"],
-            "log": [log_entry]
+# 与 json.dump(..., ensure_ascii=False, separators=(',', ':')) 输出一致的编码器
+_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+# 小局文件只保留的头部字段
+ROUND_HEADER_KEYS = ("title", "name", "rule")
+
+
+def _encode_json(value: Any) -> bytes:
+    return _JSON_ENCODER.encode(value).encode('utf-8')
+
+
+def round_prefix(header: Dict[str, Any]) -> bytes:
+    """小局文件中 "log" 之前的部分：`{"title":..,"name":..,"rule":..,"log":[`。"""
+    return b'{' + b''.join(
+        _encode_json(key) + b':' + _encode_json(header[key]) + b',' for key in ROUND_HEADER_KEYS) + b'"log":['
+
+
+class EncodedLogs:
+    """
+    预先序列化的牌谱：头部每个字段与每一局都只编码一次。
+
+    完整牌谱与各小局文件都由这些字节片段拼接而成，输出与分别 json.dump 完全相同。
+    """
+
+    def __init__(self, logs: Dict[str, Any]):
+        self.keys = list(logs)
+        self.fields: Dict[str, bytes] = {
+            key: _encode_json(key) + b':' + _encode_json(value)
+            for key, value in logs.items() if key != "log"
         }
-        
-        file_path = os.path.join(folder_path, f"{filename}.json")
-        try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(round_data, f, ensure_ascii=False, separators=(',', ':'))
-            # print(f"已保存小局：{filename}")
-        except IOError as e:
-            print(f"保存小局 {filename} 失败: {e}")
+        self.kyoku: List[bytes] = [_encode_json(log_entry) for log_entry in logs["log"]]
+        self._round_prefix = round_prefix(logs)
+
+    def full(self) -> bytes:
+        """完整牌谱的 JSON 字节。"""
+        parts = []
+        for key in self.keys:
+            if key == "log":
+                parts.append(b'"log":[' + b','.join(self.kyoku) + b']')
+            else:
+                parts.append(self.fields[key])
+        return b'{' + b','.join(parts) + b'}'
+
+    def round(self, index: int) -> bytes:
+        """第 index 局单独保存时的 JSON 字节。"""
+        return self._round_prefix + self.kyoku[index] + b']}'
+
+
+def round_filename(log_entry: List[Any]) -> str:
+    """小局文件名（不含扩展名），例如 "东1局" 或 "东1局1本场"。"""
+    kaze_names = ["东", "南", "西", "北"]
+    round_index = log_entry[0][0]
+    honba_index = log_entry[0][1]
+
+    kaze_idx = round_index // 4
+    kyoku_idx = (round_index % 4) + 1
+
+    filename = f"{kaze_names[kaze_idx]}{kyoku_idx}局"
+    if honba_index > 0:
+        filename += f"{honba_index}本场"
+    return filename
+
+
+def save_split_rounds(logs: Dict[str, Any], folder_path: str,
+                      encoded: Optional[EncodedLogs] = None) -> None:
+    """将整个牌谱拆分为各个小局并保存；传入 encoded 时直接复用已序列化的各局。"""
+    if encoded is None:
+        encoded = EncodedLogs(logs)
+
+    for index, log_entry in enumerate(logs['log']):
+        _write_round(folder_path, round_filename(log_entry), encoded.round(index))
+
+
+def stream_split_rounds(xml_content: Union[str, bytes], folder_path: str,
+                        log_id: str = "") -> Dict[str, Any]:
+    """
+    边解析边保存小局：每局在 iter_kyoku 产出时立即写入，内存中只保留各局序列化后的字节。
+
+    断线重连时对局中途会再出现 UN 并改写玩家名等头部字段，save_split_rounds 使用的是
+    最终头部；此时已写出的小局会用最终头部重写一遍，输出与 save_split_rounds 相同。
+
+    Returns:
+        Dict[str, Any]: 牌谱头部（"log" 为 None）。
+    """
+    kyoku_iter = iter_kyoku(xml_content, log_id)
+    header = next(kyoku_iter)
+    prefix = None
+    written: List[Tuple[str, bytes]] = []
+    for log_entry in kyoku_iter:
+        if prefix is None:
+            prefix = round_prefix(header)
+        filename = round_filename(log_entry)
+        body = _encode_json(log_entry) + b']}'
+        _write_round(folder_path, filename, prefix + body)
+        written.append((filename, body))
+
+    final_prefix = round_prefix(header)
+    if prefix is not None and final_prefix != prefix:
+        for filename, body in written:
+            _write_round(folder_path, filename, final_prefix + body)
+    return header
+
+
+def _write_round(folder_path: str, filename: str, data: bytes) -> None:
+    file_path = os.path.join(folder_path, f"{filename}.json")
+    try:
+        with open(file_path, 'wb') as f:
+            f.write(data)
+        # print(f"已保存小局：{filename}")
+    except IOError as e:
+        print(f"保存小局 {filename} 失败: {e}")
 
 def main() -> None:
     """脚本主函数，处理用户输入、下载、解析和文件保存。"""
+    parser = argparse.ArgumentParser(description="天凤牌谱 XML 转 tenhou.net/6 JSON")
+    parser.add_argument("--out", default=None, help="输出根目录，默认为当前目录")
+    parser.add_argument("--layout", choices=LAYOUTS, default=FLAT,
+                        help="输出目录布局：flat 每个牌谱一个子目录，hash 按ID散列分片，date 按日期分片")
+    args = parser.parse_args()
+    # 默认输出与原先相同（当前目录下的 <log_id>/，不写清单）；指定目录或分片布局时登记清单与索引
+    layout = OutputLayout(args.out or ".", args.layout, manifests=args.out is not None or args.layout != FLAT)
+
     url = input("天凤牌谱URL格式示例：http://tenhou.net/0/?log=2025120632gm-00a9-0000-8f4679af&tw=2\n请输入天凤牌谱URL: ")
-    paipu_data = download_paipu_data(url)
+    # 边下载边解析，响应体不整体缓存在内存中
+    results = stream_paipu_data(url, [TenhouSink()])
 
-    if paipu_data:
+    if results:
         log_id = extract_log_id(url)
         if not log_id:
             print("无法从URL中提取log_id，无法生成文件名。")
             return
             
-        logs = parse_tenhou_xml_to_mjai(paipu_data, log_id)
-        
-        # 创建文件夹
-        if not os.path.exists(log_id):
-            os.makedirs(log_id)
-            print(f"已创建文件夹: {log_id}")
-
-        # 保存完整牌谱
-        output_filename = os.path.join(log_id, f"{log_id}.json")
+        logs = results[0]
+        if layout.exists(log_id):
+            print(f"牌谱 {log_id} 已保存过，将覆盖写入。")
 
         try:
-            with open(output_filename, 'w', encoding='utf-8') as f:
-                json.dump(logs, f, ensure_ascii=False, separators=(',', ':'))
-            print(f"完整牌谱已保存到 {output_filename}")
-            
-            # 拆分并保存小局
-            save_split_rounds(logs, log_id)
-            print(f"所有小局已成功拆分并保存到文件夹 {log_id} 中。")
+            # 头部与各局只序列化一次，完整牌谱和小局文件共用
+            encoded = EncodedLogs(logs)
+            rounds = [(round_filename(log_entry), encoded.round(i)) for i, log_entry in enumerate(logs['log'])]
+            folder = layout.write_game(log_id, encoded.full(), rounds)
+            print(f"完整牌谱已保存到 {os.path.join(folder, f'{log_id}.json')}")
+            print(f"所有小局已成功拆分并保存到文件夹 {folder} 中。")
             
         except IOError as e:
             print(f"写入文件失败: {e}")